@@ -0,0 +1,313 @@
+# Benchmark file
+# Times the model-level hot paths on a synthetic dataset and compares the
+# medians against the committed baseline (bench_baseline.json).
+#
+# Each benchmark is warmed up once, then timed in several rounds of `repeat`
+# runs with the garbage collector off (a collection pass over the dataset lands
+# on a random run and costs more than a fast benchmark itself). Every round is
+# divided by a calibration round timed just before it, and the median ratio is
+# kept: the machine speed drifts between rounds, not within one.
+#
+# Usage:
+#   python bench.py                     # compare against the baseline, exit 1 on regression
+#   python bench.py --update-baseline   # record the current medians as the new baseline
+#   python bench.py --tolerance 0.5     # allow 50% slowdown (per-benchmark overrides live in the JSON)
+#
+# The baseline is recorded once, when the gate is set up; a change that trips
+# the gate fixes the regression instead of re-recording it. Benchmarks added
+# after it show up as NEW and are not gated.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import model as m
+import query
+
+BASELINE_PATH      = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_CONTACTS   = 10_000
+DEFAULT_NOTES      = 10_000
+DEFAULT_REPEAT     = 9
+DEFAULT_ROUNDS     = 5    # Rounds of `repeat` timed runs, each next to a calibration round
+MIN_SAMPLE_SECONDS = 0.01 # Shorter benchmarks run several times per timed sample
+DEFAULT_TOLERANCE  = 0.30 # Allowed relative slowdown of the normalized median
+SEED               = 2024
+
+FIRST_NAMES = ["Oleksandr", "Olena", "Ivan", "Iryna", "Taras", "Mariia", "Petro", "Sofiia", "Andrii", "Yulia",
+               "Dmytro", "Natalia", "Serhii", "Kateryna", "Bohdan", "Oksana", "Roman", "Halyna", "Yurii", "Anna"]
+LAST_NAMES  = ["Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Oliinyk", "Shevchuk",
+               "Koval", "Polishchuk", "Lysenko", "Marchenko", "Moroz", "Melnyk", "Savchenko", "Rudenko"]
+WORDS       = ["plan", "meeting", "budget", "release", "call", "review", "draft", "invoice", "travel", "idea",
+               "report", "design", "deploy", "backup", "contract", "research", "launch", "hiring", "demo", "retro"]
+TAGS        = ["work", "home", "urgent", "later", "ideas", "finance", "travel", "family", "health", "books",
+               "project_a", "project_b", "q1", "q2", "q3", "q4"]
+
+# ================ Dataset ================
+def _letters_suffix(number: int) -> str:
+    """Encodes a number with letters only, so generated names stay valid for validation.NAME_PATTERN."""
+    letters = ""
+    while True:
+        number, remainder = divmod(number, 26)
+        letters += chr(ord("a") + remainder)
+        if not number:
+            return letters
+
+def build_dataset(contacts: int, notes: int, seed: int = SEED) -> tuple[m.AdressBook, m.Notebook]:
+    """Builds a deterministic address book and notebook through the public model API."""
+    rng = random.Random(seed)
+    address_book = m.AdressBook()
+    notebook = m.Notebook()
+    today = date.today()
+
+    for i in range(contacts):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {_letters_suffix(i).capitalize()}"
+        contact = m.Contact(name)
+        address_book.add_contact(contact)
+        for _ in range(rng.randint(0, 3)):
+            phone = f"0{rng.choice('5679')}{rng.randint(0, 99_999_999):08d}"
+            if phone not in contact.phones:
+                address_book.add_phone(contact, phone)
+        for _ in range(rng.randint(0, 2)):
+            email = f"{name.split()[0].lower()}.{_letters_suffix(i)}{rng.randint(0, 9)}@{rng.choice(['mail.com', 'ukr.net', 'corp.ua'])}"
+            if email.lower() not in (e.lower() for e in contact.emails):
+                address_book.add_email(contact, email)
+        if rng.random() < 0.7:
+            address_book.change_birthday(contact, today - timedelta(days=rng.randint(365 * 18, 365 * 80)))
+
+    for i in range(notes):
+        note = m.Note(f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} #{i}")
+        notebook.add_note(note)
+        notebook.change_note_content(note, " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))))
+        for tag in rng.sample(TAGS, rng.randint(0, 3)):
+            notebook.add_tag_to_note(note, tag)
+    return address_book, notebook
+
+# ================ Benchmarks ================
+def _benchmarks(address_book: m.AdressBook, notebook: m.Notebook, file_path: str) -> dict:
+    """Returns name -> zero-argument callable for every tracked hot path."""
+    contact_terms = ["shevch", "067", "ukr.net", "zzzz"]
+    note_terms    = ["budget", "release plan", "#123", "zzzz"]
+    tag_terms     = ["work", "project", "q", "zzzz"]
+    search_terms  = ["shevch", "budget", "ukr.net", "zzzz"]
+
+    def find_contacts():
+        for term in contact_terms:
+            address_book.find_contacts(term)
+
+    def find_notes():
+        for term in note_terms:
+            notebook.find_notes(term)
+
+    def find_note_by_tag():
+        for term in tag_terms:
+            notebook.find_note_by_tag(term)
+
+    shared = {} # The 'search' command's index: built once per books, then kept up to date
+
+    def search_all():
+        if not shared: # First call (the warm-up) builds it
+            shared["index"] = query.SearchIndex(address_book, notebook)
+        for term in search_terms:
+            shared["index"].search(term)
+
+    def get_birthdays_in_next_days():
+        for days in (7, 30, 365):
+            address_book.get_birthdays_in_next_days(days)
+
+    def save():
+        m.save_data_to_file(address_book, notebook, file_path)
+
+    def load():
+        m.load_data_from_file(file_path)
+        m.wait_for_index_rebuilds() # Only the warm-up load rebuilds the side file: timed loads are warm starts
+
+    session = {} # Books loaded from their own file, so every edit autosaves incrementally
+
+    def autosave_one_change():
+        if not session: # First call (the warm-up) writes and loads the session file
+            session_path = file_path + ".session"
+            m.save_data_to_file(address_book, notebook, session_path)
+            session["address_book"], _ = m.load_data_from_file(session_path)
+            m.wait_for_index_rebuilds()
+        session_book = session["address_book"]
+        contact = session_book.contacts[0]
+        new_name = contact.name[:-len(" Bench")] if contact.name.endswith(" Bench") else contact.name + " Bench"
+        session_book.rename_contact(contact, new_name) # Autosave rewrites only this record
+
+    return {
+        "find_contacts"             : find_contacts,
+        "find_notes"                : find_notes,
+        "find_note_by_tag"          : find_note_by_tag,
+        "search_all"                : search_all,
+        "get_birthdays_in_next_days": get_birthdays_in_next_days,
+        "save_data_to_file"         : save,
+        "load_data_from_file"       : load,
+        "autosave_one_change"       : autosave_one_change,
+    }
+
+def _calibration_workload():
+    """A fixed pure-Python workload: medians are expressed in its run time to compare across machines."""
+    data = [f"item{i}" for i in range(50_000)]
+    return sum(1 for s in data if "9" in s.lower())
+
+def _round_median(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def _relative_time(func, repeat: int, rounds: int = DEFAULT_ROUNDS) -> float:
+    """
+    func's median run time in calibration units. Each round times the
+    calibration workload right before func, so both see the same machine speed
+    (it drifts over seconds here); the median of the round ratios is kept.
+    """
+    func() # Warm-up
+    _calibration_workload()
+    start = time.perf_counter()
+    func()
+    # Sub-millisecond benchmarks are looped: one timed sample lasts at least MIN_SAMPLE_SECONDS
+    loops = max(1, int(MIN_SAMPLE_SECONDS / max(time.perf_counter() - start, 1e-6)))
+    def sample():
+        for _ in range(loops):
+            func()
+    ratios = []
+    gc_was_enabled = gc.isenabled()
+    gc.collect() # Start every benchmark from the same heap
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            calibration = _round_median(_calibration_workload, repeat)
+            ratios.append(_round_median(sample, repeat) / loops / calibration)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return statistics.median(ratios)
+
+def calibrate(repeat: int = DEFAULT_REPEAT, rounds: int = DEFAULT_ROUNDS) -> float:
+    """Seconds per calibration workload run (lowest round median, GC off)."""
+    _calibration_workload() # Warm-up
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return min(_round_median(_calibration_workload, repeat) for _ in range(rounds))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+def run_benchmarks(contacts: int, notes: int, repeat: int, only: list[str] | None = None,
+                   rounds: int = DEFAULT_ROUNDS) -> dict:
+    """Builds the dataset, runs every benchmark and returns the report dict."""
+    calibration = calibrate(repeat, rounds) # Before the dataset exists, so GC passes over it do not skew it
+    address_book, notebook = build_dataset(contacts, notes)
+    with tempfile.TemporaryDirectory() as directory:
+        benchmarks = _benchmarks(address_book, notebook, os.path.join(directory, "bench.pkl"))
+        benchmarks["save_data_to_file"]() # load needs an existing file
+        results = {
+            # Stored in seconds at this run's calibration, so the baseline format is unchanged
+            name: _relative_time(func, repeat, rounds) * calibration
+            for name, func in benchmarks.items()
+            if not only or name in only
+        }
+    return {
+        "meta": {
+            "contacts"   : contacts,
+            "notes"      : notes,
+            "repeat"     : repeat,
+            "rounds"     : rounds,
+            "python"     : platform.python_version(),
+            "calibration": calibration,
+        },
+        "medians": results,
+    }
+
+# ================ Comparison ================
+def compare(current: dict, baseline: dict, tolerance: float) -> tuple[list[dict], bool]:
+    """
+    Compares calibration-normalized medians. Returns the table rows and
+    whether any benchmark regressed beyond its tolerance.
+    """
+    scale = baseline["meta"]["calibration"] / current["meta"]["calibration"]
+    overrides = baseline.get("tolerances", {})
+    rows, regressed = [], False
+    for name, seconds in current["medians"].items():
+        base = baseline["medians"].get(name)
+        allowed = overrides.get(name, tolerance)
+        if base is None:
+            rows.append({"name": name, "base": None, "current": seconds * scale, "change": None, "allowed": allowed, "status": "NEW"})
+            continue
+        change = seconds * scale / base - 1
+        status = "REGRESSED" if change > allowed else ("faster" if change < -allowed else "ok")
+        regressed |= status == "REGRESSED"
+        rows.append({"name": name, "base": base, "current": seconds * scale, "change": change, "allowed": allowed, "status": status})
+    return rows, regressed
+
+def format_table(rows: list[dict]) -> str:
+    width = max(len("benchmark"), *(len(row["name"]) for row in rows))
+    lines = [f"{'benchmark':<{width}} {'baseline ms':>12} {'current ms':>12} {'change':>9} {'allowed':>8}  status",
+             "-" * (width + 58)]
+    for row in rows:
+        base = f"{row['base'] * 1000:.3f}" if row["base"] is not None else "-"
+        change = f"{row['change']:+.1%}" if row["change"] is not None else "-"
+        lines.append(f"{row['name']:<{width}} {base:>12} {row['current'] * 1000:>12.3f} {change:>9} "
+                     f"{row['allowed']:>8.0%}  {row['status']}")
+    return "\n".join(lines)
+
+# ================ Entry Point ================
+def _write_baseline(path: str, report: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the model benchmarks and compare them with the stored baseline.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON path.")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the current medians as the baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative slowdown, e.g. 0.25 for +25%% (JSON 'tolerances' override it per benchmark).")
+    parser.add_argument("--contacts", type=int, help="Contacts in the synthetic dataset (default: baseline's).")
+    parser.add_argument("--notes", type=int, help="Notes in the synthetic dataset (default: baseline's).")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per round.")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="Rounds per benchmark, each next to a calibration round (the median ratio is kept).")
+    parser.add_argument("--only", nargs="*", metavar="NAME", help="Run only these benchmarks.")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    size_source = baseline["meta"] if baseline and not args.update_baseline else {}
+    contacts = args.contacts or size_source.get("contacts", DEFAULT_CONTACTS)
+    notes = args.notes or size_source.get("notes", DEFAULT_NOTES)
+
+    current = run_benchmarks(contacts, notes, args.repeat, args.only, args.rounds)
+
+    if args.update_baseline or baseline is None:
+        if baseline and "tolerances" in baseline:
+            current["tolerances"] = baseline["tolerances"] # Keep hand-tuned overrides
+        _write_baseline(args.baseline, current)
+        print(f"Baseline written to {args.baseline} ({contacts} contacts, {notes} notes).")
+        return 0
+
+    if (baseline["meta"]["contacts"], baseline["meta"]["notes"]) != (contacts, notes):
+        print("Warning: dataset size differs from the baseline, the comparison is not meaningful.", file=sys.stderr)
+
+    rows, regressed = compare(current, baseline, args.tolerance)
+    print(format_table(rows))
+    if regressed:
+        print("\nPerformance regression detected.", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
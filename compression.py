@@ -0,0 +1,46 @@
+# Compression file
+# Keeps large note bodies zlib-compressed in memory.
+#
+# pack() turns a text into its stored form: short texts (and texts zlib cannot
+# shrink) stay plain str, the rest become compressed bytes. unpack() reverses
+# it, serving recently used bodies from a small LRU so a note being read or
+# edited is not decompressed again on every access. The LRU is keyed by the
+# compressed bytes themselves: equal bytes always mean equal text, and a key
+# can never be confused with another note's body.
+
+import zlib
+from collections import OrderedDict
+
+COMPRESS_MIN_CHARS = 1024 # Shorter bodies stay plain: scans read them without paying for decompression
+COMPRESS_LEVEL     = 6
+HOT_BODIES         = 128 # Decompressed bodies kept around
+
+_hot: OrderedDict[bytes, str] = OrderedDict() # compressed body -> text, most recently used last
+
+def pack(text: str) -> str | bytes:
+    """Stored form of a text: compressed bytes when that saves space, else the text itself."""
+    if len(text) < COMPRESS_MIN_CHARS:
+        return text
+    encoded = text.encode("utf-8")
+    packed = zlib.compress(encoded, COMPRESS_LEVEL)
+    return packed if len(packed) < len(encoded) else text
+
+def unpack(body: str | bytes, remember: bool = True) -> str:
+    """The text of a stored body. remember=False (bulk indexing) leaves the LRU untouched."""
+    if isinstance(body, str):
+        return body
+    text = _hot.get(body)
+    if text is not None:
+        _hot.move_to_end(body)
+        return text
+    text = zlib.decompress(body).decode("utf-8")
+    if not remember:
+        return text
+    _hot[body] = text
+    if len(_hot) > HOT_BODIES:
+        _hot.popitem(last=False)
+    return text
+
+def hot_bodies() -> OrderedDict[bytes, str]:
+    """The decompressed-body cache (for memory reports)."""
+    return _hot
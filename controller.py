@@ -5,23 +5,43 @@
 
 import model as m
 import view as v
+import profiler as prof
+import dedupe
+import memstats
+import mentions
+import profiles
+import query
+import validation as val
 from datetime import date, datetime
 
 # ================ Module-Level State ================
 # Store application state at the module level
 address_book: m.AdressBook | None = None
 notebook: m.Notebook | None = None
+profile_cache: profiles.ProfileCache | None = None # Loaded profiles (LRU); the current one is address_book/notebook
+current_profile: str = profiles.DEFAULT_PROFILE
 current_path: list[str] = [] # Tracks the user's location in the menu e.g., ["add", "contact"]
 is_running: bool = False
 operation_cache: dict = {} # For storing temporary data between steps (e.g., contact being edited)
+mention_links: mentions.MentionLinks | None = None # Built by the first 'notes for' of the current books
+search_index: query.SearchIndex | None = None      # Built by the first 'search' of the current books
+
+LIVE_PREVIEW_LIMIT: int = 10 # Hits rendered per keystroke in live search
+DEDUPE_PREVIEW_LIMIT: int = 20 # Planned merges listed before asking to apply them
+RECENT_NOTES_DEFAULT: int = 10 # Notes listed by 'recent' without a number
+
+# Words that may appear in a profiling label; anything else the user typed becomes "<input>"
+COMMAND_WORDS: set[str] = {"add", "find", "search", "--all", "use", "live", "birthdays", "stats", "memory", "dedupe", "notes", "for", "between", "recent", "contact", "note", "help", "menu", "exit", "quit", "q"}
 
 # ================ Initialization and State ================
 
 def initialize():
     """Loads data and sets initial state."""
-    global address_book, notebook, is_running, current_path, operation_cache
+    global address_book, notebook, is_running, current_path, operation_cache, profile_cache, current_profile
     # Load data, which now also sets up autosave in the model's load function
-    address_book, notebook = m.load_data_from_file()
+    profile_cache = profiles.ProfileCache()
+    current_profile = profiles.DEFAULT_PROFILE
+    address_book, notebook = profile_cache.get(current_profile)
     current_path = []
     operation_cache = {} # Clear cache on init
     is_running = True
@@ -29,9 +49,18 @@ def initialize():
 
 def get_path_string() -> str:
     """Returns the current menu path as a string for display."""
-    global current_path
-    # Use view's separator for consistency
-    return v.MESSAGES["input_path_separator"].join(current_path) if current_path else ""
+    global current_path, current_profile
+    # Use view's separator for consistency; a non-default profile is shown first
+    parts = current_path if current_profile == profiles.DEFAULT_PROFILE else [f"[{current_profile}]", *current_path]
+    return v.MESSAGES["input_path_separator"].join(parts) if parts else ""
+
+def refresh_data():
+    """Merges changes another session saved to the data file since the last command."""
+    global address_book, notebook, current_profile
+    m.poll_background_saves() # Reports a failed background save, starts the next one
+    changed = m.refresh_data_from_file(address_book, notebook, profiles.profile_path(current_profile))
+    if changed:
+        v.display_info("data_reloaded", count=changed)
 
 def parse_input(user_input: str) -> tuple[str, list[str]]:
     """Parses user input into a command and arguments."""
@@ -40,10 +69,19 @@ def parse_input(user_input: str) -> tuple[str, list[str]]:
     args = parts[1:]
     return command, args
 
+def get_command_label(command: str, args: list[str]) -> str:
+    """Returns a stable per-command label (menu path + command) for profiling reports."""
+    if command in ("menu", "help", "exit", "quit", "q"): # Universal commands ignore the menu path
+        return command
+    words = [*current_path, command, *args[:1]]
+    return " ".join(w if w in COMMAND_WORDS else "<input>" for w in words if w) or "<empty>"
+
 def quit_application():
     """Sets the flag to stop the main loop. Autosave handles saving."""
-    global is_running
-    # No explicit save call needed here due to autosave in model
+    global is_running, profile_cache
+    # Autosave already wrote every change; this only retries saves that failed
+    if profile_cache is not None:
+        profile_cache.close_all()
     v.display_success("goodbye") # Use success for goodbye
     is_running = False
 
@@ -102,12 +140,159 @@ def handle_find_base(args: list[str]):
         current_path.append("find")
         # The run loop will now prompt with "prompt_find_type"
 
+def handle_search_base(args: list[str]):
+    """Searches contacts and notes at once ('search <term>', 'search --all <term>' or prompts for the term)."""
+    global address_book, notebook, profile_cache
+    every_profile = bool(args) and args[0] == "--all"
+    term = " ".join(args[every_profile:]) or v.get_input("prompt_search_term", path_info=get_path_string())
+    if not term:
+        v.display_warning("input_cancelled")
+        return
+    try:
+        if not every_profile:
+            v.display_search_results(get_search_index().search(term))
+            return
+        found = False
+        for name, hits in profiles.search_profiles(profile_cache, term): # One profile in memory at a time
+            v.display_info("profile_results_title", profile=name)
+            v.display_search_results(hits)
+            found = True
+        if not found:
+            v.display_info("no_search_results")
+    except m.QueryError as e:
+        v.display_error(str(e), **e.kwargs)
+
+def handle_use_base(args: list[str]):
+    """Switches to another profile ('use <profile>'), or lists the profiles ('use')."""
+    global address_book, notebook, profile_cache, current_profile
+    if not args:
+        v.display_profiles(profiles.list_profiles(), current_profile, profile_cache.loaded())
+        return
+    name = args[0]
+    address_book, notebook = profile_cache.get(name) # Loads it on first use
+    current_profile = name
+    v.display_success("profile_switched", profile=name, contacts=len(address_book.contacts), notes=len(notebook.notes))
+
+def handle_live_base(args: list[str]):
+    """Starts a search-as-you-type session over contacts or notes."""
+    global current_path
+    choice = args[0].lower() if args else ""
+    if choice not in ["contact", "note"]:
+        v.display_error("invalid_type")
+        return
+    current_path.extend(["live", choice])
+    handle_live_search_input(choice)
+
 def handle_birthdays_base(args: list[str]):
     """Sets state for birthday search."""
     global current_path
     current_path.append("birthdays")
     # The run loop will now expect the number of days via handle_birthdays_input
 
+def handle_dedupe_base(args: list[str]):
+    """Finds contacts sharing a phone, email or name, previews their merges and applies them after confirmation."""
+    global address_book
+    # Hash buckets + union-find: no pairwise comparison; clusters with different birthdays are never merged
+    merges, conflicts = dedupe.plan_merges(address_book.contacts)
+    if conflicts:
+        v.display_merge_conflicts(conflicts, DEDUPE_PREVIEW_LIMIT)
+    if not merges:
+        v.display_info("no_mergeable_duplicates" if conflicts else "no_duplicates")
+        return
+    v.display_merge_preview(merges, DEDUPE_PREVIEW_LIMIT)
+    if not v.get_confirmation("confirm_dedupe", path_info=get_path_string(),
+                              merges=len(merges), contacts=sum(len(merge.drop) for merge in merges)):
+        v.display_warning("input_cancelled")
+        return
+    with m.batch_changes(): # Every merge goes into one save
+        removed = address_book.merge_contacts(merges)
+    v.display_success("contacts_merged", merges=len(merges), contacts=removed)
+
+def get_search_index() -> query.SearchIndex:
+    """Shared term index of the current books (built once per books, then kept up to date)."""
+    global address_book, notebook, search_index
+    if search_index is None or (search_index.address_book, search_index.notebook) != (address_book, notebook):
+        if search_index is not None:
+            search_index.close() # Another profile: its books may be evicted
+        search_index = query.SearchIndex(address_book, notebook)
+    return search_index
+
+def get_mention_links() -> mentions.MentionLinks:
+    """Contact <-> note links of the current books (built once per books, then kept up to date)."""
+    global address_book, notebook, mention_links
+    if mention_links is None or (mention_links.address_book, mention_links.notebook) != (address_book, notebook):
+        if mention_links is not None:
+            mention_links.close() # Another profile: its books may be evicted
+        mention_links = mentions.MentionLinks(address_book, notebook)
+    return mention_links
+
+def handle_notes_base(args: list[str]):
+    """Lists notes by contact ('notes for <contact>') or by date ('notes between <date> <date>')."""
+    choice = args[0].lower() if args else ""
+    if choice == "for":
+        handle_notes_for(args[1:])
+    elif choice == "between":
+        handle_notes_between(args[1:])
+    else:
+        v.display_error("invalid_notes_query")
+
+def handle_notes_for(args: list[str]):
+    """Shows a contact and the notes mentioning them."""
+    global address_book
+    name = " ".join(args) or v.get_input("prompt_enter_name", path_info=get_path_string())
+    if not name:
+        v.display_warning("input_cancelled")
+        return
+    found = address_book.find_contact_by_name(name)
+    contacts = [contact for contact in found if contact.name.lower() == name.lower()] or found # Exact name first
+    if len(contacts) != 1:
+        if contacts:
+            v.display_warning("ambiguous_contact", count=len(contacts))
+        v.display_contacts(contacts, show_indices=False)
+        return
+    notes = get_mention_links().notes_for(contacts[0])
+    v.display_contacts(contacts, show_indices=False)
+    v.display_info("mentions_title", name=contacts[0].name, count=len(notes))
+    v.display_notes(notes, show_indices=False)
+
+def handle_notes_between(args: list[str]):
+    """Lists the notes written or edited from one day to another (DD.MM.YYYY, both included), oldest first."""
+    global notebook
+    if len(args) != 2:
+        v.display_error("invalid_notes_query")
+        return
+    try:
+        first_day, last_day = (datetime.strptime(arg, "%d.%m.%Y").date() for arg in args)
+    except ValueError:
+        v.display_error("invalid_date")
+        return
+    if first_day > last_day:
+        first_day, last_day = last_day, first_day
+    notes = notebook.notes_between(first_day, last_day)
+    v.display_info("notes_between_title", first=first_day.strftime("%d.%m.%Y"), last=last_day.strftime("%d.%m.%Y"),
+                   count=len(notes))
+    v.display_notes(notes, show_indices=False, show_times=True)
+
+def handle_recent_base(args: list[str]):
+    """Lists the most recently written or edited notes ('recent [N]'), newest first."""
+    global notebook
+    if args and not (args[0].isdigit() and int(args[0]) > 0):
+        v.display_error("invalid_number")
+        return
+    notes = notebook.recent_notes(int(args[0]) if args else RECENT_NOTES_DEFAULT)
+    v.display_info("recent_notes_title", count=len(notes))
+    v.display_notes(notes, show_indices=False, show_times=True)
+
+def handle_stats_base(args: list[str]):
+    """Runs the requested report ('stats' for the data, 'stats memory')."""
+    choice = args[0].lower() if args else ""
+    if not choice:
+        handle_stats_data()
+    elif choice == "memory":
+        handle_stats_memory()
+    else:
+        v.display_error("invalid_stats_type")
+
 # TODO: Implement handle_change_base, handle_remove_base similarly if needed
 # For now, let's focus on making add, find, birthdays work.
 
@@ -136,56 +321,29 @@ def handle_add_contact_input():
 
         # --- Get Phones (Optional) ---
         phones_input = v.get_input("prompt_enter_phones", path_info=path_str)
-        phones = phones_input.split()
-        valid_phones = []
-        invalid_phones = []
-        temp_contact_for_validation = m.Contact("temp") # Use a dummy for validation context
-        for p in phones:
-            try:
-                # Use model's validation method (or regex directly if preferred)
-                address_book._validate_phone(temp_contact_for_validation, p) # Validate format
-                if p in valid_phones: # Check for duplicates within input
-                    raise m.PhoneError("duplicate_phone") # Reuse error
-                valid_phones.append(p)
-            except m.PhoneError as phone_err: # Catch specific validation error
-                v.display_error(str(phone_err)) # Show specific error
-                invalid_phones.append(p)
-            except Exception: # Catch other unexpected errors
-                invalid_phones.append(p)
+        valid_phones, invalid_phones = val.validate_phones(phones_input.split()) # Format and repeats, in one pass
+        for _, error_key in invalid_phones:
+            v.display_error(error_key) # Show specific error
         # Display general warning about skipped invalid phones if any
         if invalid_phones:
-             v.display_warning("invalid_phone_format", invalid_list=", ".join(invalid_phones)) # Adjust message key if needed
+             v.display_warning("invalid_phone_format", invalid_list=", ".join(p for p, _ in invalid_phones)) # Adjust message key if needed
 
         # --- Get Emails (Optional) ---
         emails_input = v.get_input("prompt_enter_emails", path_info=path_str)
-        emails = emails_input.split()
-        valid_emails = []
-        invalid_emails = []
-        for e in emails:
-             try:
-                 # Use model's validation method
-                 address_book._validate_email(temp_contact_for_validation, e) # Validate format
-                 e_lower = e.lower()
-                 if e_lower in [ve.lower() for ve in valid_emails]: # Check duplicates in input
-                     raise m.EmailError("duplicate_email")
-                 valid_emails.append(e) # Store original case
-             except m.EmailError as email_err:
-                 v.display_error(str(email_err)) # Show specific error
-                 invalid_emails.append(e)
-             except Exception: # Catch other unexpected errors
-                 invalid_emails.append(e)
+        valid_emails, invalid_emails = val.validate_emails(emails_input.split()) # Original case is kept
+        for _, error_key in invalid_emails:
+            v.display_error(error_key)
         if invalid_emails:
-             v.display_warning("invalid_email_format", invalid_list=", ".join(invalid_emails)) # Adjust message key if needed
+             v.display_warning("invalid_email_format", invalid_list=", ".join(e for e, _ in invalid_emails)) # Adjust message key if needed
 
         # --- Get Birthday (Optional) ---
         birthday_str = v.get_input("prompt_enter_birthday", path_info=path_str)
         birthday = None
         if birthday_str:
-            birthday = validate_and_parse_birthday(birthday_str) # Raises BirthdayError on failure (format/logic)
-            # Use model's validation method for range check
-            address_book.change_birthday(temp_contact_for_validation, birthday) # Raises BirthdayError on range issue
+            birthday = validate_and_parse_birthday(birthday_str) # Raises BirthdayError on failure (format/range)
 
         # --- Assign validated data and Add Contact ---
+        # The contact is not in the book yet, so direct assignment is safe: add_contact publishes it whole
         new_contact.phones = valid_phones # Add only valid phones
         new_contact.emails = valid_emails # Add only valid emails
         new_contact.birthday = birthday
@@ -237,30 +395,10 @@ def handle_add_note_input():
 
         # --- Get Tags (Optional) ---
         tags_input = v.get_input("prompt_enter_tags", path_info=path_str)
-        tags = tags_input.split()
-        added_tags = []
-        # Add tags one by one using the model's method which includes validation
-        for t in tags:
-             try:
-                 # Temporarily add to the note's list for validation context within add_tag_to_note
-                 # This isn't ideal as the note isn't in the notebook yet.
-                 # A better approach might be a separate validation function.
-                 # Let's simulate validation using model logic directly here before adding to notebook.
-                 tag_clean = t.strip()
-                 if not (m.Note.MIN_TAG_LEN <= len(tag_clean) <= m.Note.MAX_TAG_LEN):
-                     raise m.TagError("invalid_tag_length", min=m.Note.MIN_TAG_LEN, max=m.Note.MAX_TAG_LEN)
-                 if not m.Note.TAG_PATTERN.match(tag_clean):
-                     raise m.TagError("invalid_tag_format")
-
-                 tag_lower = tag_clean.lower()
-                 if tag_lower in added_tags: # Check against already added tags in this input session
-                     raise m.TagError("duplicate_tag_in_note", tag=tag_lower, title=title)
-
-                 added_tags.append(tag_lower) # Add validated, lowercased tag
-
-             except m.TagError as tag_e:
-                  v.display_error(str(tag_e), **getattr(tag_e, 'kwargs', {})) # Show specific error immediately
-             # Continue processing other tags even if one is invalid
+        # The note is not in the notebook yet: the same rules as add_tag_to_note, checked in one pass
+        added_tags, invalid_tags = val.validate_tags(tags_input.split()) # Validated, lowercased tags
+        for tag, error_key in invalid_tags: # Invalid tags are reported, the others are kept
+            v.display_error(error_key, tag=tag.strip().lower(), title=title, **val.ERROR_KWARGS.get(error_key, {}))
 
         new_note.tags = sorted(added_tags) # Assign validated tags
 
@@ -290,11 +428,25 @@ def handle_find_contact_input():
             handle_menu_back()
             return
 
-        results = address_book.find_contacts(term) # Use the general find method
+        # "~name" tolerates typos; "067*" finds numbers by area code, "*4567" by their last digits (caller ID);
+        # "@corp.ua" finds everyone with an email at corp.ua or one of its subdomains
+        if term.startswith("~") and term[1:].strip():
+            results = [contact for contact, _ in address_book.find_contacts_fuzzy(term[1:])] # Ranked by distance
+        elif term.endswith("*") and term[:-1].isdigit():
+            results = address_book.find_contact_by_phone_prefix(term[:-1])
+        elif term.startswith("*") and term[1:].isdigit():
+            results = address_book.find_contact_by_phone_suffix(term[1:])
+        elif term.startswith("@") and term[1:].strip(". "):
+            v.display_domain_counts(address_book.email_domain_counts(term[1:]))
+            results = address_book.find_contacts_by_domain(term[1:])
+        else:
+            results = query.search_contacts(address_book, term) # name:, phone:, email:, birthday: or plain text
         v.display_info("contacts_found_title", count=len(results))
         # display_contacts handles the case where results is empty
         v.display_contacts(results, show_indices=False) # Don't show indices for search results
 
+    except m.QueryError as e:
+        v.display_error(str(e), **e.kwargs)
     except Exception as e:
         v.display_error("generic_error", error_message=str(e))
     finally:
@@ -312,24 +464,48 @@ def handle_find_note_input():
             handle_menu_back()
             return
 
-        # Search across title, content, and tags
-        results_title_content = notebook.find_notes(term) # Searches title and content
-        results_tag = notebook.find_note_by_tag(term)
-
-        # Combine results and remove duplicates using Note's hash implementation
-        combined_results_map = {note.id: note for note in results_title_content + results_tag}
-        combined_results = list(combined_results_map.values())
+        # Plain words search title, content and tags; tag:, title:, content: and -term narrow it.
+        # The planner starts from the most selective index instead of merging several scans.
+        # "/pattern/" is a regular expression (a full scan, parallel on large notebooks).
+        if len(term) > 2 and term.startswith("/") and term.endswith("/"):
+            results = notebook.find_notes_regex(term[1:-1])
+        else:
+            results = query.search_notes(notebook, term)
 
-        v.display_info("notes_found_title", count=len(combined_results))
-        # display_notes handles the case where combined_results is empty
-        v.display_notes(combined_results, show_indices=False) # Don't show indices for search results
+        v.display_info("notes_found_title", count=len(results))
+        # display_notes handles the case where results is empty
+        v.display_notes(results, show_indices=False) # Don't show indices for search results
 
+    except m.QueryError as e:
+        v.display_error(str(e), **e.kwargs)
     except Exception as e:
         v.display_error("generic_error", error_message=str(e))
     finally:
         # Always go back after search attempt
         handle_menu_back()
 
+def handle_live_search_input(choice: str):
+    """
+    Each entered term refines the previous one; hits of a longer term are
+    filtered from the previous hits. An empty line ends the session.
+    """
+    global address_book, notebook, current_path
+    path_str = get_path_string()
+    session = address_book.search_session() if choice == "contact" else notebook.search_session()
+    display = v.display_contacts if choice == "contact" else v.display_notes
+    try:
+        while True:
+            term = v.get_input("prompt_live_search_term", path_info=path_str)
+            if not term or term.lower() in ["menu", "exit", "quit", "q"]:
+                break
+            results = session.refine(term)
+            v.display_info("live_results_title", count=len(results), shown=min(len(results), LIVE_PREVIEW_LIMIT))
+            display(results[:LIVE_PREVIEW_LIMIT], show_indices=False)
+    except Exception as e:
+        v.display_error("generic_error", error_message=str(e))
+    finally:
+        current_path = [] # Leave the live session completely
+
 def handle_birthdays_input():
     """Gets number of days, finds birthdays, displays them."""
     global address_book
@@ -370,6 +546,18 @@ def handle_birthdays_input():
         handle_menu_back()
 
 
+def handle_stats_data():
+    """Displays the tag cloud, birth months and incomplete contacts (maintained counters, no scan)."""
+    global address_book, notebook
+    v.display_data_stats(address_book.stats(), notebook.stats())
+
+def handle_stats_memory():
+    """Displays the memory footprint per data structure (and tracemalloc peaks if tracing)."""
+    global address_book, notebook
+    footprint = memstats.component_footprint(address_book, notebook)
+    v.display_memory_report(footprint, memstats.tracing_report())
+
+
 # ================ Help Handler ================
 
 def handle_help():
@@ -383,7 +571,25 @@ def handle_help():
          commands = { # Main menu commands
               "add [contact|note]": "Add a new contact or note.",
               "find [contact|note]": "Search contacts or notes.",
+              "search [--all] <term>": {
+                  "description": "Search contacts and notes together, best matches first. '--all' searches every profile.",
+                  "example": 'search budget "Kyiv office"',
+              },
+              "use [profile]": {
+                  "description": "Switch to another profile (a separate address book and notebook), or list them.",
+                  "example": "use team_kyiv",
+              },
+              "live [contact|note]": "Search as you type: each longer term narrows the previous hits.",
               "birthdays": "Show upcoming birthdays.",
+              "stats": "Show the tag cloud, contacts per birth month and contacts missing a phone, email or birthday.",
+              "stats memory": "Show the memory footprint of contacts, notes and indexes.",
+              "dedupe": "Find contacts sharing a phone, email or name and merge them (asks first).",
+              "notes for <contact>": "Show a contact and every note mentioning their full name.",
+              "notes between <date> <date>": {
+                  "description": "List the notes written or edited between two days (DD.MM.YYYY, both included).",
+                  "example": "notes between 01.03.2025 07.03.2025",
+              },
+              "recent [N]": f"List the N most recently written or edited notes (default {RECENT_NOTES_DEFAULT}).",
               "change [contact|note]": "Modify an existing contact or note (Not fully implemented).",
               "remove [contact|note]": "Delete a contact or note (Not fully implemented).",
               "help": "Show this help message.",
@@ -399,8 +605,15 @@ def handle_help():
             }
     elif state == ("find",):
         commands = {
-            "contact": "Search for contacts.",
-            "note": "Search for notes.",
+            "contact": {
+                "description": "Search contacts: words, \"phrases\", name:, phone:067* / phone:*4567, email:, birthday:<30d, -term. "
+                               "'~name' tolerates typos, '@domain' lists a company's contacts.",
+                "example": "name:ivan phone:067* birthday:<30d",
+            },
+            "note": {
+                "description": "Search notes: words, \"phrases\", tag:, title:, content:, -term. '/regex/' matches a pattern.",
+                "example": 'tag:work title:plan "exact phrase" -tag:old',
+            },
             "menu": "Go back to the main menu.",
             "help": "Show this help message."
             }
@@ -427,16 +640,15 @@ def validate_and_parse_birthday(date_str: str) -> date:
     """ Tries to parse DD.MM.YYYY and validates the date logic. Returns date or raises BirthdayError."""
     try:
         # strptime checks format and basic date validity (e.g., day/month ranges)
-        dt_obj = datetime.strptime(date_str, "%d.%m.%Y")
-        # Additional check: Don't allow future dates (relative to today)
-        if dt_obj.date() > date.today():
-            # Reuse range error key? Or create a new one? Let's reuse range.
-            raise m.BirthdayError("invalid_birthday_range")
-        return dt_obj.date()
+        birthday = datetime.strptime(date_str, "%d.%m.%Y").date()
     except ValueError:
         # Use a specific key for format/logic errors from strptime
         raise m.BirthdayError("invalid_date_logic")
-    # BirthdayError("invalid_birthday_range") is raised above if needed
+    # The same range rules as the model (1900 to today)
+    error = val.birthday_error(birthday)
+    if error:
+        raise m.BirthdayError(error)
+    return birthday
 
 
 # ================ Main Loop ================
@@ -463,99 +675,115 @@ def run():
         # Note: Specific input handlers might override this with their own prompts
         user_input = v.get_input(current_prompt_key, path_info=path_str)
         command, args = parse_input(user_input)
+        refresh_data() # A stat() call unless another session saved meanwhile
 
-        # --- Universal command handling (works in any state) ---
-        if command == "menu":
-            handle_menu_back()
-            continue
-        if command in ["exit", "quit", "q"]:
-            quit_application()
-            continue # is_running will be False, loop terminates
-        if command == "help":
-            handle_help()
-            continue
-
-        # --- State-based command/input handling ---
-        try:
-            state = tuple(current_path) # Re-evaluate state after potential navigation commands
-
-            # --- Top Level (No current path) ---
-            if not state:
-                if command == "add": handle_add_base(args)
-                elif command == "find": handle_find_base(args)
-                elif command == "birthdays": handle_birthdays_base(args); handle_birthdays_input() # Directly ask for days
-                # elif command == "change": handle_change_base(args) # TODO
-                # elif command == "remove": handle_remove_base(args) # TODO
-                elif command == "": pass # Ignore empty input at top level
-                else: v.display_error("invalid_command")
-
-            # --- 'add' Menu ---
-            elif state == ("add",):
-                if command == "contact":
-                    current_path.append("contact") # Change state first
-                    handle_add_contact_input() # Then call handler to get data
-                elif command == "note":
-                    current_path.append("note") # Change state first
-                    handle_add_note_input() # Then call handler to get data
-                elif command == "": pass # Ignore empty input
-                else: v.display_error("invalid_type") # Expecting 'contact' or 'note'
-
-            # --- 'find' Menu ---
-            elif state == ("find",):
-                if command == "contact":
-                    current_path.append("contact") # Change state first
-                    handle_find_contact_input() # Call handler to get search term
-                elif command == "note":
-                    current_path.append("note") # Change state first
-                    handle_find_note_input() # Call handler to get search term
-                elif command == "": pass # Ignore empty input
-                else: v.display_error("invalid_type") # Expecting 'contact' or 'note'
-
-            # --- 'birthdays' state ---
-            elif state == ("birthdays",):
-                # This state is now mostly handled by handle_birthdays_input called from top level
-                # If user types something other than 'menu' or 'help', treat it as days input attempt
-                 if command not in ["", "menu", "help"]: # Check if it's not handled universally
-                    # Re-parse the input in case it was the number
-                    handle_birthdays_input() # Let the handler process user_input again
-                 elif command == "": pass # Ignore empty input here too
-                 # Menu/Help are handled globally
-
-            # --- Add handlers for other states like 'change', 'remove' ---
-            # Note: States like ('add', 'contact') are transient; the input handlers
-            #       are called directly and manage their own input prompts, then call handle_menu_back().
-            #       So, we don't typically need explicit state checks for them in the main loop.
-
-            else:
-                # If somehow in an unhandled state, display error
-                 if command: # If the user typed something
-                     v.display_error("invalid_command_for_state")
-                 # If user just pressed Enter (empty command), do nothing
-
-        # --- Error Handling ---
-        except (m.ContactError, m.PhoneError, m.EmailError, m.BirthdayError,
-                m.TitleError, m.TagError, m.NotFoundError, m.NoteError, IndexError) as e:
-            # Model validation errors or logical errors like NotFoundError, IndexError
-            error_key = str(e)
-            # Attempt to pass kwargs if the exception holds them
-            error_kwargs = getattr(e, 'kwargs', {})
-            v.display_error(error_key, **error_kwargs)
-            # Decide whether to go back after error. Let's generally NOT go back
-            # on validation errors to allow user retry without full navigation.
-            # handle_menu_back() # Optional: go back after specific errors if desired
-
-        except ValueError as e:
-             # Catch errors specifically from controller logic (e.g., int conversion in handle_birthdays_input)
-             # These are often displayed within the handler itself now. Re-displaying might be redundant.
-             # Check if it's a message key we know.
-             error_key = str(e) if str(e) in v.MESSAGES else "invalid_number" # Fallback
-             v.display_error(error_key)
-             # handle_menu_back() # Optional: go back after error
-
-        except Exception as e: # Catch-all for unexpected errors
-             v.display_error("generic_error", error_message=f"{type(e).__name__}: {e}")
-             # Go back after an unexpected error to reset state
-             handle_menu_back()
+        # Profiling wraps the whole dispatch; when disabled this is a shared no-op context
+        with prof.command(get_command_label(command, args) if prof.enabled else None):
+            dispatch_command(command, args)
+
+def dispatch_command(command: str, args: list[str]):
+    """Routes one parsed command to its handler based on the current state."""
+    global current_path
+
+    # --- Universal command handling (works in any state) ---
+    if command == "menu":
+        handle_menu_back()
+        return
+    if command in ["exit", "quit", "q"]:
+        quit_application()
+        return # is_running will be False, loop terminates
+    if command == "help":
+        handle_help()
+        return
+
+    # --- State-based command/input handling ---
+    try:
+        state = tuple(current_path) # Re-evaluate state after potential navigation commands
+
+        # --- Top Level (No current path) ---
+        if not state:
+            if command == "add": handle_add_base(args)
+            elif command == "find": handle_find_base(args)
+            elif command == "search": handle_search_base(args)
+            elif command == "use": handle_use_base(args)
+            elif command == "birthdays": handle_birthdays_base(args); handle_birthdays_input() # Directly ask for days
+            elif command == "stats": handle_stats_base(args)
+            elif command == "dedupe": handle_dedupe_base(args)
+            elif command == "notes": handle_notes_base(args)
+            elif command == "recent": handle_recent_base(args)
+            elif command == "live": handle_live_base(args)
+            # elif command == "change": handle_change_base(args) # TODO
+            # elif command == "remove": handle_remove_base(args) # TODO
+            elif command == "": pass # Ignore empty input at top level
+            else: v.display_error("invalid_command")
+
+        # --- 'add' Menu ---
+        elif state == ("add",):
+            if command == "contact":
+                current_path.append("contact") # Change state first
+                handle_add_contact_input() # Then call handler to get data
+            elif command == "note":
+                current_path.append("note") # Change state first
+                handle_add_note_input() # Then call handler to get data
+            elif command == "": pass # Ignore empty input
+            else: v.display_error("invalid_type") # Expecting 'contact' or 'note'
+
+        # --- 'find' Menu ---
+        elif state == ("find",):
+            if command == "contact":
+                current_path.append("contact") # Change state first
+                handle_find_contact_input() # Call handler to get search term
+            elif command == "note":
+                current_path.append("note") # Change state first
+                handle_find_note_input() # Call handler to get search term
+            elif command == "": pass # Ignore empty input
+            else: v.display_error("invalid_type") # Expecting 'contact' or 'note'
+
+        # --- 'birthdays' state ---
+        elif state == ("birthdays",):
+            # This state is now mostly handled by handle_birthdays_input called from top level
+            # If user types something other than 'menu' or 'help', treat it as days input attempt
+             if command not in ["", "menu", "help"]: # Check if it's not handled universally
+                # Re-parse the input in case it was the number
+                handle_birthdays_input() # Let the handler process user_input again
+             elif command == "": pass # Ignore empty input here too
+             # Menu/Help are handled globally
+
+        # --- Add handlers for other states like 'change', 'remove' ---
+        # Note: States like ('add', 'contact') are transient; the input handlers
+        #       are called directly and manage their own input prompts, then call handle_menu_back().
+        #       So, we don't typically need explicit state checks for them in the main loop.
+
+        else:
+            # If somehow in an unhandled state, display error
+             if command: # If the user typed something
+                 v.display_error("invalid_command_for_state")
+             # If user just pressed Enter (empty command), do nothing
+
+    # --- Error Handling ---
+    except (m.ContactError, m.PhoneError, m.EmailError, m.BirthdayError,
+            m.TitleError, m.TagError, m.NotFoundError, m.NoteError, m.ProfileError, IndexError) as e:
+        # Model validation errors or logical errors like NotFoundError, IndexError
+        error_key = str(e)
+        # Attempt to pass kwargs if the exception holds them
+        error_kwargs = getattr(e, 'kwargs', {})
+        v.display_error(error_key, **error_kwargs)
+        # Decide whether to go back after error. Let's generally NOT go back
+        # on validation errors to allow user retry without full navigation.
+        # handle_menu_back() # Optional: go back after specific errors if desired
+
+    except ValueError as e:
+         # Catch errors specifically from controller logic (e.g., int conversion in handle_birthdays_input)
+         # These are often displayed within the handler itself now. Re-displaying might be redundant.
+         # Check if it's a message key we know.
+         error_key = str(e) if str(e) in v.MESSAGES else "invalid_number" # Fallback
+         v.display_error(error_key)
+         # handle_menu_back() # Optional: go back after error
+
+    except Exception as e: # Catch-all for unexpected errors
+         v.display_error("generic_error", error_message=f"{type(e).__name__}: {e}")
+         # Go back after an unexpected error to reset state
+         handle_menu_back()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+# Dedupe file
+# Finds contacts that are probably the same person and plans their merges.
+#
+# Every contact is hashed into buckets keyed by its normalized phones,
+# casefolded emails and normalized name; contacts that share a bucket are
+# joined with union-find. One pass over the contacts and their fields builds the
+# clusters (near-linear), instead of comparing every pair. A merge keeps the
+# oldest contact of a cluster (the lowest id), gives it every phone and email of
+# the others and their birthday, and removes the others
+# (AdressBook.merge_contacts applies a plan). A cluster whose contacts have
+# different birthdays is two people sharing a phone or email (a household
+# number), not a duplicate: it is reported as a conflict and never merged.
+
+from collections import namedtuple
+from datetime import date
+
+import validation as val
+
+# One planned merge: `keep` takes the merged fields, `drop` are removed
+Merge = namedtuple("Merge", ["keep", "drop", "phones", "emails", "birthday"])
+
+# ================ Normalized Keys ================
+def phone_key(phone: str) -> str:
+    """The last 10 digits: "+380 50 123 4567" and "0501234567" are the same number."""
+    if len(phone) == val.PHONE_DIGITS and phone.isdecimal(): # Stored phones: already normalized
+        return phone
+    return "".join(filter(str.isdigit, phone))[-val.PHONE_DIGITS:]
+
+def email_key(email: str) -> str:
+    return email.casefold()
+
+def name_key(name: str) -> str:
+    """Casefolded words in sorted order, without apostrophes or hyphens ("O'Neil-Smith Ann" = "ann oneil smith")."""
+    words = name.casefold().replace("ʼ", "").replace("'", "").replace("-", " ").split()
+    return " ".join(sorted(words))
+
+# ================ Clusters ================
+def find_duplicates(contacts) -> list[list]:
+    """
+    Groups of contacts linked by a shared phone, email or name key, each in the
+    input order (contacts are kept in id order, so the oldest comes first).
+    Contacts without duplicates are left out.
+    """
+    contacts = list(contacts)
+    parent = list(range(len(contacts))) # Union-find forest over positions; a root is its cluster's first position
+
+    def find(position: int) -> int:
+        while parent[position] != position:
+            parent[position] = parent[parent[position]] # Path halving
+            position = parent[position]
+        return position
+
+    def link(bucket: dict[str, int], key: str, position: int):
+        first = bucket.setdefault(key, position) # The first position seen with this key
+        if first != position:
+            a, b = find(first), find(position)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    phones, emails, names = {}, {}, {}
+    for position, contact in enumerate(contacts):
+        for phone in contact.phones:
+            key = phone_key(phone)
+            if key: # Never bucket every digit-less phone together
+                link(phones, key, position)
+        for email in contact.emails:
+            link(emails, email_key(email), position)
+        link(names, name_key(contact.name), position)
+
+    clusters = {}
+    for position in range(len(contacts)):
+        root = find(position)
+        if root != position:
+            clusters.setdefault(root, [contacts[root]]).append(contacts[position])
+    return list(clusters.values())
+
+def has_birthday_conflict(cluster: list) -> bool:
+    return len({contact.birthday for contact in cluster if contact.birthday is not None}) > 1
+
+def plan_merge(cluster: list) -> Merge:
+    """
+    Merge of one cluster into its first contact: phones and emails in
+    first-seen order, and the birthday of whichever contact knows it (the
+    cluster must not have a birthday conflict).
+    """
+    keep, drop = cluster[0], cluster[1:]
+    phones, seen_phones = [], set()
+    emails, seen_emails = [], set()
+    birthday: date | None = None
+    for contact in cluster:
+        for phone in contact.phones:
+            if phone_key(phone) not in seen_phones:
+                seen_phones.add(phone_key(phone))
+                phones.append(phone)
+        for email in contact.emails:
+            if email_key(email) not in seen_emails:
+                seen_emails.add(email_key(email))
+                emails.append(email)
+        birthday = birthday or contact.birthday
+    return Merge(keep, drop, phones, emails, birthday)
+
+def plan_merges(contacts) -> tuple[list[Merge], list[list]]:
+    """Merges of the clusters that agree on the birthday, and the clusters left out because they do not."""
+    merges, conflicts = [], []
+    for cluster in find_duplicates(contacts):
+        if has_birthday_conflict(cluster):
+            conflicts.append(cluster)
+        else:
+            merges.append(plan_merge(cluster))
+    return merges, conflicts
@@ -0,0 +1,152 @@
+# Events file
+# Change feed of the model: every mutation of a stored contact or note is
+# published as a typed event on the book's EventBus. Derived data (indexes,
+# caches), autosave and the optional journal subscribe to it, so each of them
+# sees the exact change instead of re-reading the whole book.
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import date
+
+JOURNAL_ENV = "CLI_P_JOURNAL" # Path of the JSON-lines journal (empty: no journal)
+
+journal: "Journal | None" = None # Attached to the books by load_data_from_file when set
+
+# ================ Event Types ================
+class Event:
+    """Base event. Subclasses list their payload in __slots__."""
+    __slots__ = ()
+
+    def to_record(self) -> dict:
+        """JSON-friendly form: contacts/notes become their ids, dates ISO strings."""
+        record = {"event": type(self).__name__}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if hasattr(value, "id"):
+                record[f"{name}_id"] = value.id
+            else:
+                record[name] = value.isoformat() if isinstance(value, date) else value
+        return record
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{n}={getattr(self, n)!r}' for n in self.__slots__)})"
+
+# --- Contacts ---
+class ContactAdded(Event):
+    __slots__ = ("contact",)
+
+    def __init__(self, contact):
+        self.contact = contact
+
+class ContactRemoved(Event):
+    __slots__ = ("contact",)
+
+    def __init__(self, contact):
+        self.contact = contact
+
+class ContactChanged(Event):
+    """One field ("name", "phones", "emails" or "birthday") changed; old/new are its values."""
+    __slots__ = ("contact", "field", "old", "new")
+
+    def __init__(self, contact, field: str, old, new):
+        self.contact = contact
+        self.field   = field
+        self.old     = old
+        self.new     = new
+
+# --- Notes ---
+class NoteAdded(Event):
+    __slots__ = ("note",)
+
+    def __init__(self, note):
+        self.note = note
+
+class NoteRemoved(Event):
+    __slots__ = ("note",)
+
+    def __init__(self, note):
+        self.note = note
+
+class NoteRetitled(Event):
+    __slots__ = ("note", "old", "new")
+
+    def __init__(self, note, old: str, new: str):
+        self.note = note
+        self.old  = old
+        self.new  = new
+
+class NoteContentChanged(Event):
+    __slots__ = ("note", "old", "new")
+
+    def __init__(self, note, old: str, new: str):
+        self.note = note
+        self.old  = old
+        self.new  = new
+
+class NoteTagged(Event):
+    __slots__ = ("note", "tag")
+
+    def __init__(self, note, tag: str):
+        self.note = note
+        self.tag  = tag
+
+class NoteUntagged(Event):
+    __slots__ = ("note", "tag")
+
+    def __init__(self, note, tag: str):
+        self.note = note
+        self.tag  = tag
+
+# ================ Event Bus ================
+class EventBus:
+    """
+    Synchronous publish/subscribe. Subscribers run in subscription order.
+    Changes merged from another session are emitted inside replay(): derived
+    data still follows them, but local_only subscribers (autosave, journal, the
+    storage dirty set) skip them because they are not this session's edits.
+    """
+    def __init__(self):
+        self._subscribers : list[tuple[callable, tuple[type, ...], bool]] = []
+        self.replaying    : bool = False
+
+    def subscribe(self, callback: callable, *event_types: type, local_only: bool = False) -> callable:
+        """Calls callback(event) for the given types (all events if none). Returns an unsubscribe function."""
+        entry = (callback, event_types or (Event,), local_only)
+        self._subscribers.append(entry)
+        return lambda: self._subscribers.remove(entry)
+
+    def emit(self, event: Event):
+        for callback, event_types, local_only in list(self._subscribers):
+            if isinstance(event, event_types) and not (local_only and self.replaying):
+                callback(event)
+
+    @contextmanager
+    def replay(self):
+        """Marks the events emitted inside the block as replayed from elsewhere."""
+        previous, self.replaying = self.replaying, True
+        try:
+            yield self
+        finally:
+            self.replaying = previous
+
+# ================ Journal ================
+class Journal:
+    """Subscriber that appends every event as one JSON line (time plus the event payload)."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, event: Event):
+        record = {"time": round(time.time(), 3), **event.to_record()}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+def journal_path_from_env(environ=os.environ) -> str | None:
+    return environ.get(JOURNAL_ENV) or None
+
+def start_journal(path: str) -> Journal:
+    """Enables the journal for the books loaded from now on."""
+    global journal
+    journal = Journal(path)
+    return journal
@@ -0,0 +1,810 @@
+# Indexes file
+# Derived lookup structures kept in sync by the model (never the source of truth)
+
+from bisect import bisect_left
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError: # Optional: without NumPy the model keeps its pure-Python birthday loop
+    np = None
+
+LAYOUT = 4 # Pickled form of the indexes below: bump it when one changes, so persisted copies are rebuilt
+
+# ================ Digit Trie ================
+class _Node(dict):
+    """Inner trie node: one character -> child node or bucket."""
+    __slots__ = ("count", "terminal")
+
+    def __init__(self):
+        super().__init__()
+        self.count    : int = 0          # (key, item) pairs stored below this node
+        self.terminal : set | None = None # Items whose key ends exactly at this node
+
+class _Bucket(dict):
+    """Leaf bucket: remaining key tail -> set of items. Burst into a node when it grows."""
+    __slots__ = ("count",)
+
+    def __init__(self):
+        super().__init__()
+        self.count : int = 0
+
+class DigitTrie:
+    """
+    Burst trie mapping short keys (phone digits) to sets of items (contact ids).
+    The top levels are real nodes, while sparse subtrees stay in small buckets of
+    key tails, so a 10-digit number costs a handful of nodes instead of ten.
+    Lookups walk at most len(key) nodes; prefix queries cost O(len(prefix) + k).
+    """
+    BURST_LIMIT = 32 # Max distinct tails in a bucket before it becomes a node
+
+    def __init__(self):
+        self._root = _Node()
+
+    def __len__(self) -> int:
+        return self._root.count
+
+    def add(self, key: str, item):
+        path, node, depth = [], self._root, 0
+        while depth < len(key):
+            child = node.get(key[depth])
+            if not isinstance(child, _Node):
+                break
+            path.append(node)
+            node, depth = child, depth + 1
+        # node is the deepest real node on the key; the rest goes to its terminal or a bucket
+        if depth == len(key):
+            if node.terminal is None:
+                node.terminal = set()
+            elif item in node.terminal:
+                return
+            node.terminal.add(item)
+        else:
+            bucket = node.get(key[depth])
+            if bucket is None:
+                bucket = node[key[depth]] = _Bucket()
+            items = bucket.get(key[depth + 1:])
+            if items is None:
+                items = bucket[key[depth + 1:]] = set()
+            elif item in items:
+                return
+            items.add(item)
+            bucket.count += 1
+            if len(bucket) > self.BURST_LIMIT:
+                node[key[depth]] = self._burst(bucket)
+        for parent in path:
+            parent.count += 1
+        node.count += 1
+
+    def _burst(self, bucket: _Bucket) -> _Node:
+        node = _Node()
+        for tail, items in bucket.items():
+            for item in items:
+                self._add_below(node, tail, item)
+        return node
+
+    def _add_below(self, node: _Node, tail: str, item):
+        """Inserts into a fresh subtree without the duplicate check of add()."""
+        node.count += 1
+        if not tail:
+            if node.terminal is None:
+                node.terminal = set()
+            node.terminal.add(item)
+            return
+        child = node.get(tail[0])
+        if child is None:
+            child = node[tail[0]] = _Bucket()
+        if isinstance(child, _Node):
+            self._add_below(child, tail[1:], item)
+            return
+        child.setdefault(tail[1:], set()).add(item)
+        child.count += 1
+
+    def _contains(self, key: str, item) -> bool:
+        return item in self._items(key)
+
+    def remove(self, key: str, item):
+        if not self._contains(key, item):
+            return
+        path = []
+        node, depth = self._root, 0
+        while True:
+            node.count -= 1
+            path.append((node, key[depth] if depth < len(key) else None))
+            if depth == len(key):
+                node.terminal.discard(item)
+                if not node.terminal:
+                    node.terminal = None
+                break
+            child = node[key[depth]]
+            if isinstance(child, _Node):
+                node, depth = child, depth + 1
+                continue
+            tail = key[depth + 1:]
+            child[tail].discard(item)
+            child.count -= 1
+            if not child[tail]:
+                del child[tail]
+            if not child:
+                del node[key[depth]]
+            break
+        # Drop nodes that became empty, bottom-up (the root always stays)
+        for (parent, char), (node, _) in zip(reversed(path[:-1]), reversed(path[1:])):
+            if node.count == 0:
+                del parent[char]
+
+    def _items(self, key: str):
+        """Returns the stored set for key (not a copy), or an empty tuple."""
+        node, depth = self._root, 0
+        while depth < len(key):
+            child = node.get(key[depth])
+            if child is None:
+                return ()
+            if isinstance(child, _Bucket):
+                return child.get(key[depth + 1:], ())
+            node, depth = child, depth + 1
+        return node.terminal or ()
+
+    def exact(self, key: str) -> set:
+        """Returns the items stored under exactly this key."""
+        return set(self._items(key))
+
+    def prefix(self, prefix: str) -> set:
+        """Returns the items of every key starting with prefix."""
+        result: set = set()
+        node, depth = self._root, 0
+        while depth < len(prefix):
+            child = node.get(prefix[depth])
+            if child is None:
+                return result
+            if isinstance(child, _Bucket):
+                rest = prefix[depth + 1:]
+                for tail, items in child.items():
+                    if tail.startswith(rest):
+                        result.update(items)
+                return result
+            node, depth = child, depth + 1
+        self._collect(node, result)
+        return result
+
+    def count_prefix(self, prefix: str) -> int:
+        """Returns how many (key, item) pairs start with prefix, without collecting them."""
+        node, depth = self._root, 0
+        while depth < len(prefix):
+            child = node.get(prefix[depth])
+            if child is None:
+                return 0
+            if isinstance(child, _Bucket):
+                rest = prefix[depth + 1:]
+                return sum(len(items) for tail, items in child.items() if tail.startswith(rest))
+            node, depth = child, depth + 1
+        return node.count
+
+    def _collect(self, node: _Node, result: set):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.terminal:
+                result.update(current.terminal)
+            for child in current.values():
+                if isinstance(child, _Node):
+                    stack.append(child)
+                else:
+                    for items in child.values():
+                        result.update(items)
+
+# ================ Domain Trie ================
+class _DomainNode(dict):
+    """One domain label -> child node (labels from the top-level domain down)."""
+    __slots__ = ("owners", "count")
+
+    def __init__(self):
+        super().__init__()
+        self.owners : dict = {} # item -> number of its emails at exactly this domain
+        self.count  : int = 0  # Distinct (domain, item) pairs stored at or below this node
+
+class DomainTrie:
+    """
+    Email domains -> items (contact ids), keyed by reversed labels
+    ("mail.corp.ua" is stored as ua -> corp -> mail), so a domain's node holds
+    every subdomain below it. An item may have several emails at one domain:
+    each node counts them and keeps the item until the last one is removed.
+    Queries cost O(labels + size of the result).
+    """
+    def __init__(self):
+        self._root = _DomainNode()
+
+    def __len__(self) -> int:
+        return self._root.count
+
+    @staticmethod
+    def domain_of(email: str) -> str:
+        return email.rpartition("@")[2].lower()
+
+    @staticmethod
+    def _labels(domain: str) -> list[str]:
+        return [label for label in reversed(domain.lower().strip(".@ ").split(".")) if label]
+
+    def add(self, domain: str, item):
+        path, node = [self._root], self._root
+        for label in self._labels(domain):
+            child = node.get(label)
+            if child is None:
+                child = node[label] = _DomainNode()
+            node = child
+            path.append(node)
+        node.owners[item] = node.owners.get(item, 0) + 1
+        if node.owners[item] == 1: # A new (domain, item) pair
+            for parent in path:
+                parent.count += 1
+
+    def remove(self, domain: str, item):
+        path, node = [(self._root, None)], self._root
+        for label in self._labels(domain):
+            node = node.get(label)
+            if node is None:
+                return
+            path.append((node, label))
+        left = node.owners.get(item, 0) - 1
+        if left > 0:
+            node.owners[item] = left
+            return
+        if left < 0: # Not stored
+            return
+        del node.owners[item]
+        for parent, _ in path:
+            parent.count -= 1
+        # Drop nodes that became empty, bottom-up (the root always stays)
+        for (parent, _), (node, label) in zip(reversed(path[:-1]), reversed(path[1:])):
+            if node.count == 0:
+                del parent[label]
+
+    def _node(self, domain: str) -> tuple[_DomainNode | None, list[str]]:
+        node, labels = self._root, self._labels(domain)
+        for label in labels:
+            node = node.get(label)
+            if node is None:
+                return None, labels
+        return node, labels
+
+    def domains(self, domain: str) -> dict[str, set]:
+        """Returns every stored domain equal to or under domain -> its items."""
+        node, labels = self._node(domain)
+        result: dict[str, set] = {}
+        if node is None or not labels:
+            return result
+        stack = [(node, labels)]
+        while stack:
+            current, path = stack.pop()
+            if current.owners:
+                result[".".join(reversed(path))] = set(current.owners)
+            for label, child in current.items():
+                stack.append((child, [*path, label]))
+        return result
+
+    def count(self, domain: str) -> int:
+        """Returns how many (domain, item) pairs are at or under domain, without collecting them."""
+        node, labels = self._node(domain)
+        return node.count if node is not None and labels else 0
+
+# ================ Phrase Automaton ================
+class PhraseAutomaton:
+    """
+    Aho-Corasick automaton over words: finds every stored phrase (a tuple of
+    words, e.g. a tokenized name) in a token stream in one pass, whatever the
+    number of phrases. Matching whole words means phrases only match at word
+    boundaries ("ann lee" is not found in "joann leeds"). Immutable: build a
+    new automaton when the phrases change.
+    """
+    def __init__(self, phrases):
+        self._goto   : list[dict[str, int]] = [{}]         # node -> word -> next node
+        self._fail   : list[int] = [0]                      # Longest proper suffix that is also a path
+        self._phrase : list[tuple | None] = [None]          # Phrase ending exactly at the node
+        self._output : list[int] = [0]                      # Nearest node on the fail chain with a phrase (0: none)
+        for phrase in phrases:
+            node = 0
+            for word in phrase:
+                child = self._goto[node].get(word)
+                if child is None:
+                    child = self._goto[node][word] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._phrase.append(None)
+                    self._output.append(0)
+                node = child
+            self._phrase[node] = tuple(phrase)
+        self._link()
+
+    def _link(self):
+        # Breadth-first: a node's fail target is always shallower, so it is final when needed
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for word, child in self._goto[node].items():
+                target = self._fail[node]
+                while target and word not in self._goto[target]:
+                    target = self._fail[target]
+                fail = self._goto[target].get(word, 0)
+                self._fail[child] = fail if fail != child else 0
+                self._output[child] = fail if self._phrase[fail] is not None else self._output[fail]
+                queue.append(child)
+
+    def __len__(self) -> int:
+        return len(self._goto) - 1 # Nodes besides the root
+
+    def find(self, words) -> set[tuple]:
+        """Returns the stored phrases occurring in words (any iterable of tokens)."""
+        goto, fail, phrase, output = self._goto, self._fail, self._phrase, self._output
+        found, node = set(), 0
+        for word in words:
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            hit = node if phrase[node] is not None else output[node]
+            while hit:
+                found.add(phrase[hit])
+                hit = output[hit]
+        return found
+
+# ================ Edit Distance ================
+def levenshtein(a: str, b: str) -> int:
+    """
+    Returns the Levenshtein (insert/delete/substitute) distance between a and b.
+    Uses the bit-parallel algorithm of Myers/Hyyro: one column of the DP table
+    is a pair of bit vectors (Python ints), so the cost is O(len(b)) int operations.
+    """
+    if a == b:
+        return 0
+    if len(a) > len(b):
+        a, b = b, a # The shorter string is the bit-vector pattern
+    if not a:
+        return len(b)
+    match_masks: dict[str, int] = {}
+    for i, char in enumerate(a):
+        match_masks[char] = match_masks.get(char, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    positive, negative, score = full, 0, len(a) # Vertical +1/-1 deltas of the current column
+    for char in b:
+        eq = match_masks.get(char, 0)
+        xv = eq | negative
+        xh = (((eq & positive) + positive) ^ positive) | eq
+        horizontal_pos = negative | ~(xh | positive)
+        horizontal_neg = positive & xh
+        if horizontal_pos & last:
+            score += 1
+        elif horizontal_neg & last:
+            score -= 1
+        horizontal_pos = (horizontal_pos << 1) | 1
+        horizontal_neg <<= 1
+        positive = (horizontal_neg | ~(xv | horizontal_pos)) & full
+        negative = horizontal_pos & xv & full
+    return score
+
+# ================ BK-Tree ================
+class _BKNode:
+    __slots__ = ("word", "items", "children")
+
+    def __init__(self, word: str):
+        self.word     : str = word
+        self.items    : set = set()
+        self.children : dict[int, "_BKNode"] = {} # distance to this word -> subtree
+
+class BKTree:
+    """
+    Burkhard-Keller tree over words for typo-tolerant lookup.
+    A query with tolerance k only descends into children whose edge distance is
+    within [d - k, d + k] of the node distance d, so most of the tree is skipped.
+    New words wait in a pending map and are inserted by the next search, so
+    loading a book does not pay for edit distances until a fuzzy query needs them.
+    Removing an item leaves its node as a routing node; the tree is rebuilt once
+    more than half of its nodes are empty.
+    """
+    def __init__(self):
+        self._root    : _BKNode | None = None
+        self._words   : dict[str, _BKNode] = {} # Shortcut for words already in the tree
+        self._pending : dict[str, set] = {}     # Words not inserted yet -> items
+        self._nodes   : int = 0
+        self._empty   : int = 0
+
+    def add(self, word: str, item):
+        node = self._words.get(word)
+        if node is None:
+            self._pending.setdefault(word, set()).add(item)
+            return
+        if not node.items:
+            self._empty -= 1
+        node.items.add(item)
+
+    def remove(self, word: str, item):
+        pending = self._pending.get(word)
+        if pending is not None:
+            pending.discard(item)
+            if not pending:
+                del self._pending[word]
+            return
+        node = self._words.get(word)
+        if node is not None and item in node.items:
+            node.items.discard(item)
+            if not node.items:
+                self._empty += 1
+                if self._empty * 2 > self._nodes:
+                    self._rebuild()
+
+    def _insert(self, word: str, items: set):
+        """Places a new word into the tree (word must not be in it yet)."""
+        new = self._words[word] = _BKNode(word)
+        new.items = items
+        self._nodes += 1
+        if self._root is None:
+            self._root = new
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(word, node.word)
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = new
+                return
+            node = child
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        for word, items in pending.items():
+            self._insert(word, items)
+
+    def _rebuild(self):
+        for node in self._iter_nodes():
+            if node.items:
+                self._pending.setdefault(node.word, set()).update(node.items)
+        self._root, self._words, self._nodes, self._empty = None, {}, 0, 0
+
+    def _iter_nodes(self):
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children.values())
+
+    # --- Pickled as flat (word, items, parent row, edge) rows: much cheaper than nested node objects ---
+    def __getstate__(self) -> dict:
+        rows, stack = [], [(self._root, -1, 0)] if self._root else []
+        while stack:
+            node, parent, edge = stack.pop()
+            rows.append((node.word, node.items, parent, edge))
+            row = len(rows) - 1
+            stack.extend((child, row, distance) for distance, child in node.children.items())
+        return {"rows": rows, "pending": self._pending}
+
+    def __setstate__(self, state: dict):
+        nodes = []
+        for word, items, parent, edge in state["rows"]:
+            node = _BKNode(word)
+            node.items = items
+            if parent >= 0:
+                nodes[parent].children[edge] = node
+            nodes.append(node)
+        self._root    = nodes[0] if nodes else None
+        self._words   = {node.word: node for node in nodes}
+        self._pending = state["pending"]
+        self._nodes   = len(nodes)
+        self._empty   = sum(1 for node in nodes if not node.items)
+
+    def search(self, word: str, max_distance: int) -> dict:
+        """Returns {item: smallest distance} for every item whose word is within max_distance."""
+        self._flush()
+        found: dict = {}
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            distance = levenshtein(word, node.word)
+            if distance <= max_distance:
+                for item in node.items:
+                    if distance < found.get(item, max_distance + 1):
+                        found[item] = distance
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for edge, child in node.children.items() if low <= edge <= high)
+        return found
+
+# ================ Trigram Index ================
+class TrigramIndex:
+    """
+    Substring index: every 3-character gram of an item's (lowercased) text maps
+    to the items containing it. Any text containing a query also contains all of
+    its grams, so intersecting their postings gives a candidate superset that the
+    caller verifies. Queries shorter than a gram cannot use the index (None).
+    Added texts wait in a pending map until the next query (one text per item),
+    so loading a book does not pay for splitting every text into grams. A text
+    may also be given as a zero-argument callable, called only at that point.
+    """
+    GRAM = 3
+
+    def __init__(self):
+        self._postings : dict[str, set] = {}
+        self._pending  : dict = {} # item -> text (or callable returning it) not split into grams yet
+
+    @classmethod
+    def grams(cls, text: str) -> set[str]:
+        return {text[i:i + cls.GRAM] for i in range(len(text) - cls.GRAM + 1)}
+
+    def add(self, item, text: "str | callable"):
+        if item in self._pending:
+            self._flush() # Keep at most one pending text per item
+        self._pending[item] = text
+
+    def remove(self, item, text: str):
+        pending = self._pending.get(item)
+        if pending is not None and (callable(pending) or pending == text):
+            del self._pending[item] # A pending source is the item's latest text
+            return
+        for gram in self.grams(text):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(item)
+                if not postings:
+                    del self._postings[gram]
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        postings_map = self._postings
+        for item, text in pending.items():
+            for gram in self.grams(text() if callable(text) else text):
+                postings = postings_map.get(gram)
+                if postings is None:
+                    postings = postings_map[gram] = set()
+                postings.add(item)
+
+    # Pending callables cannot be pickled: they are stored as the texts they return
+    def __getstate__(self) -> dict:
+        pending = {item: text() if callable(text) else text for item, text in self._pending.items()}
+        return {"_postings": self._postings, "_pending": pending}
+
+    def estimate(self, part: str) -> int | None:
+        """Upper bound of the candidates for part (size of its rarest gram), None if unusable."""
+        if len(part) < self.GRAM:
+            return None
+        self._flush()
+        return min(len(self._postings.get(gram, ())) for gram in self.grams(part))
+
+    def candidates(self, part: str) -> set | None:
+        """Returns the items that contain every gram of part, None if part is too short."""
+        if len(part) < self.GRAM:
+            return None
+        self._flush()
+        postings = sorted((self._postings.get(gram, set()) for gram in self.grams(part)), key=len)
+        result = set(postings[0])
+        for other in postings[1:]:
+            if not result:
+                break
+            result &= other
+        return result
+
+# ================ Term Index ================
+class TermIndex:
+    """
+    Ranked token index over the weighted text fields of items of several kinds.
+    Every token (run of non-space characters) of a lowercased field maps to its
+    items, each with the best rank a query gets there when it is the token,
+    starts it, starts a word inside it or is found inside a word. A rank is
+    weight x quality (4 the whole field, 3 the field start, 2 a word start,
+    1 inside a word) times TIE, plus the field's tie code: one max() picks the
+    best match and, on equal scores, the preferred field. A query without
+    spaces always falls inside one token, so it only reads the postings of the
+    tokens containing it, found through a trigram index over the vocabulary.
+    """
+    TIE = 8 # Field tie codes are 0 .. TIE - 1
+
+    def __init__(self):
+        self._postings   : dict[str, dict] = {}          # token -> {item: (is, starts, word, inside) ranks}
+        self._tokens_of  : dict = {}                     # item -> the tokens it is indexed under
+        self._vocabulary : TrigramIndex = TrigramIndex() # token -> itself, to find the tokens containing a query
+        self._ranks      : dict[tuple, tuple] = {}       # Shared rank tuples (a few distinct ones)
+
+    def _field_ranks(self, weight: int, code: int, at_start: bool) -> tuple[int, int, int, int]:
+        tie = self.TIE
+        starts = weight * (3 if at_start else 2) * tie + code
+        ranks = (starts, starts, weight * 2 * tie + code, weight * tie + code)
+        return self._ranks.setdefault(ranks, ranks)
+
+    def add(self, item, fields: list[tuple[int, int, str]]):
+        """Indexes item under the tokens of its (weight, tie code, lowercased text) fields."""
+        best = {}
+        for weight, code, text in fields:
+            tokens = text.split()
+            if not tokens:
+                continue
+            first = self._field_ranks(weight, code, not text[0].isspace())
+            if tokens[0] == text: # The whole field is one token
+                first = (weight * 4 * self.TIE + code,) + first[1:]
+                first = self._ranks.setdefault(first, first)
+            rest = self._field_ranks(weight, code, False)
+            for position, token in enumerate(tokens):
+                rank, old = first if position == 0 else rest, best.get(token)
+                if old is None or old is rank:
+                    best[token] = rank
+                else:
+                    merged = tuple(map(max, old, rank))
+                    best[token] = self._ranks.setdefault(merged, merged)
+        for token, rank in best.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                self._vocabulary.add(token, token)
+            postings[item] = rank
+        self._tokens_of[item] = tuple(best)
+
+    def remove(self, item):
+        for token in self._tokens_of.pop(item, ()):
+            postings = self._postings[token]
+            del postings[item]
+            if not postings:
+                del self._postings[token]
+                self._vocabulary.remove(token, token)
+
+    @staticmethod
+    def serves(part: str) -> bool:
+        """True when part has no space, so it falls inside one token and ranks() scores it exactly."""
+        return len(part.split()) == 1 and not part[0].isspace() and not part[-1].isspace()
+
+    def _tokens_containing(self, part: str):
+        candidates = self._vocabulary.candidates(part)
+        return self._postings if candidates is None else candidates
+
+    def ranks(self, part: str) -> dict:
+        """item -> best rank of part (see serves()) across the item's fields; items without it are left out."""
+        best = {}
+        for token in self._tokens_containing(part):
+            position = token.find(part)
+            if position < 0:
+                continue # A trigram candidate without part
+            # The rank part gets: 0 it is the token, 1 starts it, 2 starts a word inside it, 3 inside a word
+            if position == 0:
+                slot = 0 if token == part else 1
+            else:
+                slot = 3
+                while position > 0:
+                    if not token[position - 1].isalnum():
+                        slot = 2
+                        break
+                    position = token.find(part, position + 1)
+            for item, rank in self._postings[token].items():
+                if rank[slot] > best.get(item, 0):
+                    best[item] = rank[slot]
+        return best
+
+    def items(self, part: str) -> set:
+        """Items with a token containing part (a space-free piece of a longer phrase)."""
+        return set().union(*(self._postings[token].keys() for token in self._tokens_containing(part) if part in token))
+
+# ================ Time Index ================
+class TimeIndex:
+    """
+    Items ordered by a timestamp: a sorted list of (time, item) pairs, so the
+    latest k items or a time range cost O(log n + k) (bisect). Added pairs wait
+    in a pending list and are merged by one sort at the next query: loading a
+    book appends instead of inserting into the middle n times.
+    """
+    def __init__(self):
+        self._pairs   : list[tuple[float, int]] = [] # Sorted by (time, item)
+        self._pending : list[tuple[float, int]] = []
+        self._times   : dict = {}                    # item -> its current time
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def add(self, item, time: float):
+        """Stores item at time (moving it if it was stored before)."""
+        if item in self._times:
+            self.remove(item)
+        self._times[item] = time
+        self._pending.append((time, item))
+
+    def remove(self, item):
+        time = self._times.pop(item, None)
+        if time is None:
+            return
+        self._flush()
+        position = bisect_left(self._pairs, (time, item))
+        del self._pairs[position]
+
+    def _flush(self):
+        if self._pending:
+            self._pairs.extend(self._pending) # Mostly appended in time order: the sort is near-linear
+            self._pairs.sort()
+            self._pending = []
+
+    def latest(self, count: int) -> list:
+        """The count most recent items, newest first."""
+        self._flush()
+        return [item for _, item in reversed(self._pairs[-count:])] if count > 0 else []
+
+    def between(self, start: float, end: float) -> list:
+        """Items with start <= time < end, oldest first."""
+        self._flush()
+        low = bisect_left(self._pairs, (start,))
+        high = bisect_left(self._pairs, (end,), low)
+        return [item for _, item in self._pairs[low:high]]
+
+# ================ Birthday Columns ================
+class BirthdayColumns:
+    """
+    Birth month/day of every contact with a birthday as NumPy columns, so the
+    upcoming-birthdays window is a handful of whole-array operations instead of
+    a Python loop. Rows are appended in batches (pending until the next query)
+    and removed by moving the last row into the hole. Requires NumPy.
+    """
+    def __init__(self):
+        self._ids     = np.empty(0, dtype=np.int64)
+        self._months  = np.empty(0, dtype=np.int64)
+        self._days    = np.empty(0, dtype=np.int64)
+        self._size    : int = 0
+        self._rows    : dict[int, int] = {}              # contact id -> row
+        self._pending : dict[int, tuple[int, int]] = {}  # contact id -> (month, day) not in the columns yet
+
+    def __len__(self) -> int:
+        return self._size + len(self._pending)
+
+    def add(self, item: int, birthday: date):
+        self.remove(item)
+        self._pending[item] = (birthday.month, birthday.day)
+
+    def remove(self, item: int):
+        if self._pending.pop(item, None) is not None:
+            return
+        row = self._rows.pop(item, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            for column in (self._ids, self._months, self._days):
+                column[row] = column[last]
+            self._rows[int(self._ids[row])] = row
+        self._size = last
+
+    def _flush(self):
+        if not self._pending:
+            return
+        needed = self._size + len(self._pending)
+        if needed > len(self._ids):
+            capacity = max(needed, 2 * len(self._ids))
+            self._ids, self._months, self._days = (np.resize(column, capacity)
+                                                   for column in (self._ids, self._months, self._days))
+        rows = slice(self._size, needed)
+        self._ids[rows] = np.fromiter(self._pending.keys(), dtype=np.int64, count=len(self._pending))
+        month_days = np.array(list(self._pending.values()), dtype=np.int64).reshape(-1, 2)
+        self._months[rows], self._days[rows] = month_days[:, 0], month_days[:, 1]
+        self._rows.update(zip(self._pending.keys(), range(self._size, needed)))
+        self._size = needed
+        self._pending.clear()
+
+    @staticmethod
+    def _dates_in_year(year: int, months, days):
+        """Builds datetime64[D] dates for one year; Feb 29 of a common year comes out invalid (mask)."""
+        month_starts = np.datetime64(f"{year}-01", "M") + (months - 1)
+        dates = month_starts.astype("datetime64[D]") + (days - 1)
+        leap = year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+        valid = np.ones(len(months), dtype=bool) if leap else ~((months == 2) & (days == 29))
+        return dates, valid
+
+    def window(self, today: date, days: int):
+        """
+        Returns (ids, birthdays, shifts) for the birthdays within [today, today + days]:
+        contact ids in ascending order, the next birthday (datetime64[D]) and the
+        days its celebration moves (Saturday +2, Sunday +1, else 0).
+        """
+        self._flush()
+        ids, months, day_of_month = self._ids[:self._size], self._months[:self._size], self._days[:self._size]
+        today64 = np.datetime64(today, "D")
+
+        this_year, valid_this = self._dates_in_year(today.year, months, day_of_month)
+        next_year, valid_next = self._dates_in_year(today.year + 1, months, day_of_month)
+        passed = this_year < today64
+        upcoming = np.where(passed, next_year, this_year)
+        # Same rule as the pure-Python path: a date that does not exist in the year it is moved to is skipped
+        valid = valid_this & (~passed | valid_next)
+        mask = valid & ((upcoming - today64).astype(np.int64) <= days)
+
+        order = np.argsort(ids[mask], kind="stable")
+        upcoming = upcoming[mask][order]
+        weekday = (upcoming.astype(np.int64) + 3) % 7 # 1970-01-01 was a Thursday (Monday = 0)
+        shifts = np.where(weekday == 5, 2, np.where(weekday == 6, 1, 0))
+        return ids[mask][order], upcoming, shifts
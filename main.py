@@ -1,9 +1,48 @@
 # Main file to launch the application
 
+import argparse
 import controller as c
+import events as ev
+import memstats
+import model as m
+import profiler as prof
+import replay
+import view as v
 import sys # Needed for clearing screen based on OS, but for simplicity using ANSI escape code
 
-def main():
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parses the optional startup flags (environment variables are used as defaults)."""
+    env_profile = prof.configure_from_env()
+    parser = argparse.ArgumentParser(description="CLI-P Assistant: address book and notes in the console.")
+    parser.add_argument("--profile", action="store_true", default=env_profile["enable"],
+                        help=f"Record per-command latency and print p50/p95/p99 on exit (or set {prof.PROFILE_ENV}=1).")
+    parser.add_argument("--profile-out", metavar="PATH", default=env_profile["out_path"],
+                        help="Also dump the latency report as JSON to PATH.")
+    parser.add_argument("--profile-cprofile", metavar="N", type=int, default=env_profile["cprofile_top"],
+                        help="Keep cProfile stats for the N slowest commands (written as .prof files).")
+    parser.add_argument("--trace-memory", action="store_true", default=memstats.tracing_requested(),
+                        help=f"Trace allocations with tracemalloc for 'stats memory' (or set {memstats.TRACE_MEMORY_ENV}=1).")
+    parser.add_argument("--journal", metavar="PATH", default=ev.journal_path_from_env(),
+                        help=f"Append every contact/note change as a JSON line to PATH (or set {ev.JOURNAL_ENV}=PATH).")
+    parser.add_argument("--record", metavar="PATH", default=replay.record_path_from_env(),
+                        help=f"Record every answer typed at a prompt to PATH for replay.py (or set {replay.RECORD_ENV}=PATH).")
+    parser.add_argument("--background-save", action="store_true", default=m.background_saves_from_env(),
+                        help=f"Autosave from a forked child so large saves never block the prompt (or set {m.BACKGROUND_SAVE_ENV}=1).")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    if args.profile or args.profile_out or args.profile_cprofile:
+        prof.enable(m, v, out=args.profile_out, cprofile_n=args.profile_cprofile)
+    if args.trace_memory:
+        memstats.start_tracing(m) # Before c.run() so the initial load is traced
+    if args.journal:
+        ev.start_journal(args.journal) # Subscribed to the books when they are loaded
+    if args.record:
+        replay.start_recording(v, args.record) # After profiling: the recorder wraps the timed get_input
+    if args.background_save and not m.enable_background_saves():
+        print("[Warning] Background saves need fork(); saving in the foreground.")
+
     # Clear screen at the beginning
     print("\033[H\033[J", end="")
 
@@ -14,6 +53,8 @@ def main():
         # Handle graceful exit on Ctrl+C
         # The controller's quit_application should handle saving data if needed
         pass # Exit gracefully
+    finally:
+        prof.finish(v) # No-op unless profiling was enabled
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,146 @@
+# Memory accounting file
+# Per-structure footprint of the loaded books plus tracemalloc peaks of load/save
+
+import os
+import sys
+import tracemalloc
+from functools import wraps
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+
+import compression as cz
+
+TRACE_MEMORY_ENV = "CLI_P_TRACE_MEMORY" # Any non-empty value enables tracing at startup
+TRACE_FRAMES     = 1                    # Frames kept per allocation; 1 keeps the overhead low
+
+# Objects that are shared with the interpreter and never belong to a data structure
+_SKIP_TYPES = (type, ModuleType, FunctionType, MethodType, BuiltinFunctionType)
+
+# Peak traced memory above the starting point, per operation: name -> {"last": bytes, "max": bytes}
+operation_peaks: dict[str, dict[str, int]] = {}
+_global_peak: int = 0
+
+# ================ Deep Size ================
+def deep_sizeof(obj, seen: set[int]) -> int:
+    """
+    Returns the size of obj and everything reachable from it, in bytes.
+    Objects whose id is already in `seen` are skipped, so sharing one `seen`
+    set between calls counts every object once.
+    """
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if current is None or id(current) in seen or isinstance(current, _SKIP_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif isinstance(current, (str, bytes, int, float)):
+            continue
+        if hasattr(current, "__dict__"):
+            stack.append(vars(current))
+        for cls in type(current).__mro__:
+            for slot in getattr(cls, "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+def _split_records(records, buckets: dict[str, str], default: str, sizes: dict[str, int], seen: set[int]):
+    """Charges every attribute of every record to the bucket named after it (or to default)."""
+    for record in records:
+        sizes[default] += sys.getsizeof(record)
+        seen.add(id(record))
+        attributes = vars(record)
+        sizes[default] += sys.getsizeof(attributes)
+        seen.add(id(attributes))
+        for name, value in attributes.items():
+            sizes[buckets.get(name, default)] += deep_sizeof(value, seen)
+
+# ================ Footprint Report ================
+def component_footprint(address_book, notebook) -> dict:
+    """
+    Breaks the memory of both books down per component.
+    Every attribute of the books other than the record lists (indexes, caches)
+    is reported on its own row, so new derived structures show up automatically.
+    """
+    seen: set[int] = set()
+    sizes = dict.fromkeys(["contacts list", "contact records", "phones", "emails",
+                           "notes list", "note records", "note content", "tag lists"], 0)
+
+    sizes["contacts list"] = sys.getsizeof(address_book.contacts)
+    _split_records(address_book.contacts, {"phones": "phones", "emails": "emails"},
+                   "contact records", sizes, seen)
+    sizes["notes list"] = sys.getsizeof(notebook.notes)
+    _split_records(notebook.notes, {"_body": "note content", "_preview": "note content", "tags": "tag lists"},
+                   "note records", sizes, seen)
+    sizes["decompressed bodies"] = deep_sizeof(cz.hot_bodies(), seen) # Shared LRU of hot note bodies
+
+    for owner, skip in ((address_book, "contacts"), (notebook, "notes")):
+        for name, value in vars(owner).items():
+            if name == skip or isinstance(value, _SKIP_TYPES) or callable(value):
+                continue
+            size = deep_sizeof(value, seen)
+            if size:
+                sizes[f"{type(owner).__name__}.{name}"] = size
+
+    contacts_count, notes_count = len(address_book.contacts), len(notebook.notes)
+    contact_bytes = sum(sizes[k] for k in ("contact records", "phones", "emails"))
+    note_bytes = sum(sizes[k] for k in ("note records", "note content", "tag lists"))
+    return {
+        "components"       : sizes,
+        "total"            : sum(sizes.values()),
+        "contacts"         : contacts_count,
+        "notes"            : notes_count,
+        "bytes_per_contact": contact_bytes / contacts_count if contacts_count else 0,
+        "bytes_per_note"   : note_bytes / notes_count if notes_count else 0,
+    }
+
+def tracing_report() -> dict | None:
+    """Returns the tracemalloc counters, or None when tracing is off."""
+    if not tracemalloc.is_tracing():
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "current"   : current,
+        "peak"      : max(peak, _global_peak),
+        "operations": {name: dict(values) for name, values in operation_peaks.items()},
+    }
+
+# ================ Tracing ================
+def _traced_operation(name: str, func):
+    """Wraps func to record the tracemalloc peak it causes above the memory in use before it."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        global _global_peak
+        if not tracemalloc.is_tracing():
+            return func(*args, **kwargs)
+        before, peak = tracemalloc.get_traced_memory()
+        _global_peak = max(_global_peak, peak)
+        tracemalloc.reset_peak()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            _global_peak = max(_global_peak, peak)
+            values = operation_peaks.setdefault(name, {"last": 0, "max": 0})
+            values["last"] = max(peak - before, 0)
+            values["max"] = max(values["max"], values["last"])
+    wrapper.__memory_traced__ = True
+    return wrapper
+
+def tracing_requested(environ=os.environ) -> bool:
+    return bool(environ.get(TRACE_MEMORY_ENV))
+
+def start_tracing(model_module):
+    """Starts tracemalloc and wraps the load/save functions of the model to record their peaks."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+    for name in ("load_data_from_file", "save_data_to_file"):
+        func = getattr(model_module, name)
+        if not getattr(func, "__memory_traced__", False):
+            setattr(model_module, name, _traced_operation(name, func))
@@ -0,0 +1,149 @@
+# Mentions file
+# Links notes to the contacts they mention by full name, in both directions.
+#
+# The contact names (casefolded words) are compiled into one Aho-Corasick
+# automaton (indexes.PhraseAutomaton), so a note's title and content are
+# scanned once, whatever the number of contacts, when the note is added or
+# edited. The links follow both books' change feeds: a new, renamed or
+# removed contact only re-checks the notes the trigram indexes say may contain
+# its name, never every note. The automaton is not rebuilt per name change:
+# names added since the last build are checked word by word, removed ones are
+# skipped, and the next note scan after REBUILD_AFTER changes rebuilds it.
+#
+# Mentions match whole words at any case ("ivan petrenko's call" mentions
+# Ivan Petrenko); a bare first name is not a mention, it is too ambiguous.
+
+import re
+
+import events as ev
+import indexes as ix
+import model as m
+
+REBUILD_AFTER = 64 # Name changes tolerated before the automaton is rebuilt
+
+# Words keep inner apostrophes and hyphens (O'Neil, Anna-Maria) but not a possessive "'s"
+WORD_PATTERN = re.compile(r"\w+(?:-\w+|'(?!s\b)\w+)*")
+
+def words(text: str) -> tuple[str, ...]:
+    """Casefolded words of text (names and notes are split alike)."""
+    return tuple(WORD_PATTERN.findall(text.casefold().replace("ʼ", "'")))
+
+def _candidate_terms(name: str) -> set[str]:
+    """
+    The longest run of letters of the name as the trigram indexes store text
+    (str.lower()), and its casefolded spelling when that differs ("weiß" and
+    "weiss"): notes mentioning the name contain one of them.
+    """
+    longest = max(re.findall(r"\w+", name.lower()), key=len, default="")
+    return {longest, longest.casefold()} - {""}
+
+def _contains(tokens: tuple[str, ...], phrase: tuple[str, ...]) -> bool:
+    size = len(phrase)
+    return any(tokens[i:i + size] == phrase for i in range(len(tokens) - size + 1) if tokens[i] == phrase[0])
+
+# ================ Mention Links ================
+class MentionLinks:
+    """Bidirectional contact <-> note link index of one address book + notebook pair."""
+    def __init__(self, address_book: m.AdressBook, notebook: m.Notebook):
+        self.address_book = address_book
+        self.notebook     = notebook
+        self._phrases     : dict[tuple[str, ...], set[int]] = {} # name words -> contact ids
+        self._notes_of    : dict[int, set[int]] = {}             # contact id -> mentioning note ids
+        self._contacts_of : dict[int, set[int]] = {}             # note id -> mentioned contact ids
+        self._automaton   : ix.PhraseAutomaton | None = None     # None: to be built by the next note scan
+        self._added       : set[tuple[str, ...]] = set()         # Names added since the automaton was built
+        self._changes     : int = 0                              # Names added or removed since then
+        for contact in address_book.contacts:
+            self._phrases.setdefault(words(contact.name), set()).add(contact.id)
+        for note in notebook.notes:
+            self._link_note(note)
+        self._unsubscribe = [address_book.events.subscribe(self._on_contact_event),
+                             notebook.events.subscribe(self._on_note_event)]
+
+    def close(self):
+        """Stops following the books (the links are not updated any more)."""
+        for unsubscribe in self._unsubscribe:
+            unsubscribe()
+        self._unsubscribe = []
+
+    # ================ Queries ================
+    def notes_for(self, contact: m.Contact) -> list[m.Note]:
+        """Notes mentioning the contact, in note order."""
+        return self.notebook._notes_from_ids(self._notes_of.get(contact.id, ()))
+
+    def contacts_in(self, note: m.Note) -> list[m.Contact]:
+        """Contacts the note mentions, in contact order."""
+        return self.address_book._contacts_from_ids(self._contacts_of.get(note.id, ()))
+
+    # ================ Notes ================
+    @staticmethod
+    def _note_words(note: m.Note) -> tuple[str, ...]:
+        return words(f"{note.title}\n{m.Notebook._content_text(note)}")
+
+    def _link(self, contact_id: int, note_id: int):
+        self._notes_of.setdefault(contact_id, set()).add(note_id)
+        self._contacts_of.setdefault(note_id, set()).add(contact_id)
+
+    def _link_note(self, note: m.Note):
+        if self._automaton is None or self._changes > REBUILD_AFTER:
+            self._automaton, self._added, self._changes = ix.PhraseAutomaton(self._phrases), set(), 0
+        tokens = self._note_words(note)
+        found = self._automaton.find(tokens)
+        found.update(phrase for phrase in self._added if _contains(tokens, phrase))
+        for phrase in found:
+            for contact_id in self._phrases.get(phrase, ()): # Removed names stay in the automaton until a rebuild
+                self._link(contact_id, note.id)
+
+    def _unlink_note(self, note_id: int):
+        for contact_id in self._contacts_of.pop(note_id, ()):
+            notes = self._notes_of[contact_id]
+            notes.discard(note_id)
+            if not notes:
+                del self._notes_of[contact_id]
+
+    def _on_note_event(self, event: ev.Event):
+        if isinstance(event, (ev.NoteAdded, ev.NoteRetitled, ev.NoteContentChanged)):
+            self._unlink_note(event.note.id)
+            self._link_note(event.note)
+        elif isinstance(event, ev.NoteRemoved):
+            self._unlink_note(event.note.id)
+
+    # ================ Contacts ================
+    def _add_name(self, contact_id: int, name: str):
+        phrase = words(name)
+        if not phrase:
+            return
+        self._phrases.setdefault(phrase, set()).add(contact_id)
+        self._added.add(phrase)
+        self._changes += 1
+        # Any note mentioning the name contains its longest word: the trigram indexes narrow the check,
+        # the casefolded phrase decides
+        candidates = {note.id: note for term in _candidate_terms(name) for note in self.notebook.find_note_candidates(term)}
+        for note_id, note in candidates.items():
+            if _contains(self._note_words(note), phrase):
+                self._link(contact_id, note_id)
+
+    def _remove_name(self, contact_id: int, name: str):
+        phrase = words(name)
+        ids = self._phrases.get(phrase)
+        if ids is not None:
+            ids.discard(contact_id)
+            if not ids:
+                del self._phrases[phrase]
+                self._added.discard(phrase)
+                self._changes += 1
+        for note_id in self._notes_of.pop(contact_id, ()):
+            contacts = self._contacts_of[note_id]
+            contacts.discard(contact_id)
+            if not contacts:
+                del self._contacts_of[note_id]
+
+    def _on_contact_event(self, event: ev.Event):
+        contact = event.contact
+        if isinstance(event, ev.ContactAdded):
+            self._add_name(contact.id, contact.name)
+        elif isinstance(event, ev.ContactRemoved):
+            self._remove_name(contact.id, contact.name)
+        elif isinstance(event, ev.ContactChanged) and event.field == "name":
+            self._remove_name(contact.id, event.old)
+            self._add_name(contact.id, event.new)
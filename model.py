@@ -2,58 +2,115 @@
 # This file contains the model of the app
 # It contains the data and the logic of the app
 
+import gc
+import os
 import pickle
-from datetime import date,timedelta
+from bisect import insort
+from datetime import date, datetime, timedelta
+from operator import attrgetter
 import re
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+import compression as cz
+import events as ev
+import indexes as ix
+import parallel
+import snapshots as snap
+import storage
+import validation as val
 import view as v
 
 FILE_PATH = "data.pkl"  # Path to the data file
-NAME_REGEX = re.compile(r"^[a-zA-Zа-яА-ЯіІїЇєЄґҐʼ'-]+( [a-zA-Zа-яА-ЯіІїЇєЄґҐʼ'-]+)*$")
-EMAIL_REGEX = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
-PHONE_REGEX = re.compile(r"\d{10}")
+BACKGROUND_SAVE_ENV = "CLI_P_BGSAVE" # 1: autosave from a forked child (POSIX) instead of the REPL process
+FUZZY_MAX_DISTANCE = 2 # Default typo tolerance (edits) for fuzzy name search
+STATS_FIELDS = ("phones", "emails", "birthday") # Contact fields whose absence stats() counts
+
+_data_files: dict[str, storage.DataFile] = {} # file path -> the DataFile the current books were loaded from
+_index_rebuilds: dict[str, threading.Thread] = {} # file path -> background rebuild of its index side file
+background_saves: bool = False # Set by enable_background_saves()
+_batch_depth: int = 0 # Nesting of batch_changes() blocks: autosave waits while it is above 0
+_pending_saves: dict[str, callable] = {} # file path -> its autosave, run once when the batch ends
+_by_id = attrgetter("id")
 
 # ================ Custom Exceptions ================
 class ContactError(Exception):
     """Base exception for contact related errors."""
-    pass
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        super().__init__(key)
 
 class PhoneError(ValueError):
     """Exception for phone validation errors."""
-    pass
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        super().__init__(key)
 
 class EmailError(ValueError):
     """Exception for email validation errors."""
-    pass
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        super().__init__(key)
 
 class BirthdayError(ValueError):
     """Exception for birthday validation errors."""
-    pass
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        super().__init__(key)
 
 class TitleError(ValueError):
     """Exception for note title validation errors."""
-    pass
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        super().__init__(key)
 
 class TagError(ValueError):
     """Exception for tag validation errors."""
-    pass
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        super().__init__(key)
 
 class NotFoundError(Exception):
     """Exception when an item is not found."""
-    pass
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        super().__init__(key)
+
+class ProfileError(ValueError):
+    """Exception for invalid profile names."""
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        super().__init__(key)
+
+class QueryError(ValueError):
+    """Exception for malformed search queries."""
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        super().__init__(key)
 
 class NoteError(Exception):
     """Base exception class for Note and Notebook errors."""
     def __init__(self, key, **kwargs):
         self.key = key
         self.kwargs = kwargs
-        super().__init__(key, **kwargs)  # For internal logging/debugging
+        super().__init__(key)  # str(error) is the message key
 
 # ================ Contact Class ================
 class Contact:
     id_counter = 0 # Consider loading/saving this counter as well
 
     def __init__(self, name: str):
-        if not NAME_REGEX.match(name):
+        if val.name_error(name):
             raise ContactError("invalid_name_format")
         self.__id     : int = Contact.id_counter
         self.name     : str = name
@@ -66,6 +123,11 @@ class Contact:
     def id(self) -> int:
         return self.__id
 
+    def _take_next_id(self):
+        # Only for storage merges: another session saved a contact under this (unsaved) id
+        self.__id = Contact.id_counter
+        Contact.id_counter += 1
+
     def __str__(self) -> str:
         # Basic string representation, View will handle detailed formatting
         return f"Contact(ID: {self.__id}, Name: {self.name})"
@@ -76,56 +138,326 @@ class Contact:
 
 # ================ AdressBook Class ================
 class AdressBook:
-    def __init__(self):
-        self.contacts : list[Contact] = []
+    KIND   = "contacts" # Record list attribute and section name in the data file
+    RECORD = Contact
+    # Indexes saved in the side file of the data file (the rest is rebuilt cheaply on load)
+    PERSISTED_INDEXES = ("_names", "_name_tree", "_phone_prefix", "_phone_suffix", "_email_domains",
+                         "_text_grams", "_birthdays", "_birth_months", "_missing_fields")
+
+    def __init__(self, contacts: list[Contact] | None = None, indexes: dict[str, bytes] | None = None):
+        self.contacts : list[Contact] = contacts if contacts is not None else [] # In id order
+        self._setup(indexes)
+
+    def __getattr__(self, name: str):
+        # Only reached for missing attributes: persisted indexes not unpickled yet
+        return _thaw_index(self, name)
+
+    # --- Indexes and the change feed are derived/runtime state: not pickled, rebuilt on load ---
+    def __getstate__(self) -> dict:
+        return {"contacts": self.contacts}
+
+    def __setstate__(self, state: dict):
+        self.contacts = state["contacts"]
+        self._setup()
+
+    def _setup(self, indexes: dict[str, bytes] | None = None):
+        self.events : ev.EventBus = ev.EventBus() # Every change of a stored contact is published here
+        self.events.subscribe(self._apply_event)  # The book's own indexes always update first
+        self.events.subscribe(self._publish_snapshot)
+        self._snapshots : snap.SnapshotCell | None = None # Built by the first snapshot() call
+        if indexes is not None and indexes.keys() >= set(self.PERSISTED_INDEXES):
+            self._restore_indexes(indexes)
+        else:
+            self._rebuild_indexes()
+
+    # ================ Snapshots ================
+    # self.contacts is the writers' list; readers (the find methods, query and
+    # search, the index rebuild) read snapshot() instead, which never changes under them.
+    def snapshot(self) -> snap.Snapshot:
+        """Returns the current immutable version of the contacts (O(1) once built)."""
+        if self._snapshots is None:
+            records = snap.PersistentList.from_records(map(snap.contact_view, self.contacts))
+            self._snapshots = snap.SnapshotCell(snap.Snapshot(self._version, records))
+        return self._snapshots.current()
+
+    def _publish_snapshot(self, event: ev.Event):
+        if self._snapshots is None:
+            return # Nobody has asked for a snapshot yet
+        records = self._snapshots.current().records
+        if isinstance(event, ev.ContactRemoved):
+            records = records.remove(event.contact.id)
+        else:
+            records = records.replace(snap.contact_view(event.contact))
+        self._snapshots.publish(self._version, records)
+
+    # ================ Index maintenance ================
+    def _rebuild_indexes(self):
+        self._version        : int = 0 # Bumped by every event (invalidates search sessions)
+        self._contacts_by_id : dict[int, Contact] = {}
+        self._names          : dict[str, int] = {}       # lowercased name -> contact id (uniqueness)
+        self._name_tree      : ix.BKTree = ix.BKTree()   # casefolded name words -> contact ids (fuzzy)
+        self._phone_prefix   : ix.DigitTrie = ix.DigitTrie() # phone digits -> contact ids
+        self._phone_suffix   : ix.DigitTrie = ix.DigitTrie() # reversed phone digits -> contact ids
+        self._email_domains  : ix.DomainTrie = ix.DomainTrie() # email domains (and parents) -> contact ids
+        self._text_grams     : ix.TrigramIndex = ix.TrigramIndex() # name/phones/emails substrings
+        self._birthdays      : dict[tuple[int, int], set[int]] = {} # (month, day) -> contact ids
+        # Aggregates of stats(): contacts per birth month (index 0 = January) and without a field
+        self._birth_months   : list[int] = [0] * 12
+        self._missing_fields : dict[str, int] = dict.fromkeys(STATS_FIELDS, 0)
+        # Month/day columns for the vectorized upcoming-birthdays window, None without NumPy
+        self._birthday_columns : ix.BirthdayColumns | None = ix.BirthdayColumns() if ix.np is not None else None
+        self._frozen         : dict[str, bytes] = {} # Persisted indexes not unpickled yet (see _restore_indexes)
+        for contact in self.contacts:
+            self._index_contact(contact)
+
+    def _restore_indexes(self, indexes: dict[str, bytes]):
+        """Same state as _rebuild_indexes, but the persisted indexes are unpickled by their first use."""
+        self._version          = 0
+        self._contacts_by_id   = {contact.id: contact for contact in self.contacts}
+        self._birthday_columns = ix.BirthdayColumns() if ix.np is not None else None # Depends on NumPy: never persisted
+        self._frozen           = {name: indexes[name] for name in self.PERSISTED_INDEXES}
+        if self._birthday_columns is not None:
+            for contact in self.contacts:
+                if contact.birthday is not None:
+                    self._birthday_columns.add(contact.id, contact.birthday)
+
+    def _apply_event(self, event: ev.Event):
+        # Updates only what the event touched, then invalidates cached searches
+        if isinstance(event, ev.ContactAdded):
+            self._index_contact(event.contact)
+        elif isinstance(event, ev.ContactRemoved):
+            self._unindex_contact(event.contact)
+        elif isinstance(event, ev.ContactChanged):
+            self._reindex_field(event)
+        self._version += 1
+
+    def _is_stored(self, contact: Contact) -> bool:
+        # Contacts that are not (yet) in this book are validated and edited without events
+        return self._contacts_by_id.get(contact.id) is contact
+
+    def _emit_change(self, contact: Contact, field: str, old, new):
+        if self._is_stored(contact):
+            self.events.emit(ev.ContactChanged(contact, field, old, new))
+
+    def _index_contact(self, contact: Contact):
+        self._contacts_by_id[contact.id] = contact
+        self._index_name(contact, contact.name)
+        for phone in contact.phones:
+            self._index_phone(contact, phone)
+        for email in contact.emails:
+            self._email_domains.add(ix.DomainTrie.domain_of(email), contact.id)
+        self._text_grams.add(contact.id, self._contact_text(contact.name, contact.phones, contact.emails))
+        self._index_birthday(contact, contact.birthday)
+        self._count_fields(contact.phones, contact.emails, contact.birthday, 1)
+
+    def _unindex_contact(self, contact: Contact):
+        self._count_fields(contact.phones, contact.emails, contact.birthday, -1)
+        self._unindex_birthday(contact, contact.birthday)
+        self._text_grams.remove(contact.id, self._contact_text(contact.name, contact.phones, contact.emails))
+        for email in contact.emails:
+            self._email_domains.remove(ix.DomainTrie.domain_of(email), contact.id)
+        for phone in contact.phones:
+            self._unindex_phone(contact, phone)
+        self._unindex_name(contact, contact.name)
+        self._contacts_by_id.pop(contact.id, None)
+
+    def _reindex_field(self, event: ev.ContactChanged):
+        contact, old, new = event.contact, event.old, event.new
+        if event.field != "name": # Swap the contact's old aggregate contribution for the new one
+            before = {"phones": contact.phones, "emails": contact.emails, "birthday": contact.birthday, event.field: old}
+            self._count_fields(before["phones"], before["emails"], before["birthday"], -1)
+            self._count_fields(contact.phones, contact.emails, contact.birthday, 1)
+        if event.field == "birthday":
+            self._unindex_birthday(contact, old)
+            self._index_birthday(contact, new)
+            return
+        # Name, phones and emails all feed the searchable text: swap the old text for the new one
+        before = {"name": contact.name, "phones": contact.phones, "emails": contact.emails, event.field: old}
+        self._text_grams.remove(contact.id, self._contact_text(before["name"], before["phones"], before["emails"]))
+        self._text_grams.add(contact.id, self._contact_text(contact.name, contact.phones, contact.emails))
+        if event.field == "name":
+            self._unindex_name(contact, old)
+            self._index_name(contact, new)
+        elif event.field == "phones":
+            for phone in old:
+                if phone not in new:
+                    self._unindex_phone(contact, phone)
+            for phone in new:
+                if phone not in old:
+                    self._index_phone(contact, phone)
+        elif event.field == "emails":
+            # The domain trie counts emails per domain, so the old list goes out whole
+            for email in old:
+                self._email_domains.remove(ix.DomainTrie.domain_of(email), contact.id)
+            for email in new:
+                self._email_domains.add(ix.DomainTrie.domain_of(email), contact.id)
+
+    @staticmethod
+    def _contact_text(name: str, phones: list[str], emails: list[str]) -> str:
+        return "\n".join([name.lower(), *phones, *(email.lower() for email in emails)])
+
+    def _index_birthday(self, contact: Contact, birthday: date | None):
+        if birthday is not None:
+            self._birthdays.setdefault((birthday.month, birthday.day), set()).add(contact.id)
+            if self._birthday_columns is not None:
+                self._birthday_columns.add(contact.id, birthday)
+
+    def _unindex_birthday(self, contact: Contact, birthday: date | None):
+        if birthday is not None:
+            key = (birthday.month, birthday.day)
+            ids = self._birthdays.get(key)
+            if ids is not None:
+                ids.discard(contact.id)
+                if not ids:
+                    del self._birthdays[key]
+            if self._birthday_columns is not None:
+                self._birthday_columns.remove(contact.id)
+
+    def _count_fields(self, phones: list[str], emails: list[str], birthday: date | None, delta: int):
+        missing = self._missing_fields
+        if not phones:
+            missing["phones"] += delta
+        if not emails:
+            missing["emails"] += delta
+        if birthday is None:
+            missing["birthday"] += delta
+        else:
+            self._birth_months[birthday.month - 1] += delta
+
+    @staticmethod
+    def _fuzzy_words(name: str) -> set[str]:
+        # Each word and the full name, casefolded (Cyrillic-safe) with one apostrophe form
+        key = name.casefold().replace("ʼ", "'")
+        return {key, *key.split()}
+
+    def _index_name(self, contact: Contact, name: str):
+        self._names[name.lower()] = contact.id
+        for word in self._fuzzy_words(name):
+            self._name_tree.add(word, contact.id)
+
+    def _unindex_name(self, contact: Contact, name: str):
+        if self._names.get(name.lower()) == contact.id:
+            del self._names[name.lower()]
+        for word in self._fuzzy_words(name):
+            self._name_tree.remove(word, contact.id)
+
+    def _index_phone(self, contact: Contact, phone: str):
+        self._phone_prefix.add(phone, contact.id)
+        self._phone_suffix.add(phone[::-1], contact.id)
+
+    def _unindex_phone(self, contact: Contact, phone: str):
+        self._phone_prefix.remove(phone, contact.id)
+        self._phone_suffix.remove(phone[::-1], contact.id)
+
+    def _contacts_from_ids(self, ids) -> list[Contact]:
+        # Ids grow with insertion order, so sorting keeps the order of self.contacts
+        return [self._contacts_by_id[i] for i in sorted(ids)]
 
     # ================ Contact CRUD methods ================
     # Add contact to address book
     def add_contact(self, contact: Contact):
-        if any(c.name.lower() == contact.name.lower() for c in self.contacts):
+        if contact.name.lower() in self._names:
             raise ContactError("duplicate_contact")
         self.contacts.append(contact)
+        self.events.emit(ev.ContactAdded(contact))
+
+    # Rename a contact, keeping names unique (case-insensitive)
+    def rename_contact(self, contact: Contact, new_name: str):
+        if val.name_error(new_name):
+            raise ContactError("invalid_name_format")
+        if self._names.get(new_name.lower(), contact.id) != contact.id:
+            raise ContactError("duplicate_contact")
+        old_name, contact.name = contact.name, new_name
+        self._emit_change(contact, "name", old_name, new_name)
 
     # Remove contact by the contact object itself (found previously)
     def remove_contact(self, contact: Contact):
-        if contact not in self.contacts:
+        if not self._is_stored(contact):
             raise NotFoundError("contact_not_found_in_list")
         self.contacts.remove(contact)
+        self.events.emit(ev.ContactRemoved(contact))
 
     # ================ Find methods ================
     # Find contact by partial data: name, phone or email
-    def _contact_search_fields(self, contact: Contact) -> list[str]:
+    @staticmethod
+    def _contact_search_fields(contact: Contact) -> list[str]:
         return [
             contact.name.lower(),
             *[phone.lower() for phone in contact.phones],
             *[email.lower() for email in contact.emails]
     ]
 
-    def _search_contacts(self, part: str, field_getter: callable) -> list[Contact]:
+    def _search_contacts(self, part: str, field_getter: callable) -> list[snap.ContactView]:
         part = part.lower() # Search case-insensitively
-        return [
-            contact for contact in self.contacts
-            if any(part in field for field in field_getter(contact))
-        ]
+        # Every searched field is part of the indexed text, so its trigrams narrow the scan
+        contacts = self.snapshot().select(self._text_grams.candidates(part))
+        return parallel.scan(contacts, lambda contact: any(part in field for field in field_getter(contact)))
 
-    def find_contacts(self, part: str) -> list[Contact]:
+    def search_session(self) -> "SearchSession":
+        """Returns an incremental search over name, phones and emails (see SearchSession)."""
+        return SearchSession(self, self.find_contacts,
+                             lambda contact, part: any(part in field for field in self._contact_search_fields(contact)))
+
+    def find_contacts(self, part: str) -> list[snap.ContactView]:
         part = part.lower() # Search case-insensitively
         return self._search_contacts(part, self._contact_search_fields)
 
-    def find_contact_by_name(self, name_part: str) -> list[Contact]:
+    def find_contact_by_name(self, name_part: str) -> list[snap.ContactView]:
         name_part = name_part.lower() # Search case-insensitively
         return self._search_contacts(name_part, lambda c: [c.name.lower()])
 
-    def find_contact_by_phone(self, phone_part: str) -> list[Contact]:
+    def find_contacts_fuzzy(self, term: str, max_distance: int = FUZZY_MAX_DISTANCE) -> list[tuple[snap.ContactView, int]]:
+        """
+        Typo-tolerant name search ("Olexandr" finds "Oleksandr").
+        Returns (Contact, distance) pairs ranked by edit distance, then by insertion order.
+        Short terms get a lower tolerance so that every 3-letter name does not match.
+        """
+        # One word matches any word of a name, several words match the full name
+        key = " ".join(term.casefold().replace("ʼ", "'").split())
+        max_distance = min(max_distance, len(key) // 2)
+        found = self._name_tree.search(key, max_distance)
+        ranked = sorted(found.items(), key=lambda pair: (pair[1], pair[0]))
+        contacts = self.snapshot().by_id(found)
+        return [(contacts[contact_id], distance) for contact_id, distance in ranked]
+
+    def find_contact_by_phone(self, phone_part: str) -> list[snap.ContactView]:
+        if not val.phone_error(phone_part): # Full number: O(10) trie lookup
+            return self.snapshot().select(self._phone_prefix.exact(phone_part))
         return self._search_contacts(phone_part, lambda c: [p for p in c.phones])
 
-    def find_contact_by_email(self, email_part: str) -> list[Contact]:
+    # "Caller ID" lookups: area-code prefix or the last digits of a number
+    def find_contact_by_phone_prefix(self, prefix: str) -> list[snap.ContactView]:
+        return self.snapshot().select(self._phone_prefix.prefix(prefix))
+
+    def find_contact_by_phone_suffix(self, suffix: str) -> list[snap.ContactView]:
+        return self.snapshot().select(self._phone_suffix.prefix(suffix[::-1]))
+
+    def find_contact_by_email(self, email_part: str) -> list[snap.ContactView]:
         email_part = email_part.lower() # Search case-insensitively
         return self._search_contacts(email_part, lambda c: [e.lower() for e in c.emails])
 
+    # Organization-wide lookups: "corp.ua" also finds mail.corp.ua, not corp.ua.com
+    def find_contacts_by_domain(self, domain: str) -> list[snap.ContactView]:
+        ids = set().union(*self._email_domains.domains(domain).values())
+        return self.snapshot().select(ids)
+
+    def email_domain_counts(self, domain: str) -> dict[str, int]:
+        """Contacts per email domain at or under domain, most contacts first."""
+        counts = {name: len(ids) for name, ids in self._email_domains.domains(domain).items()}
+        return dict(sorted(counts.items(), key=lambda pair: (-pair[1], pair[0])))
+
+    # ================ Stats ================
+    def stats(self) -> dict:
+        """Contact totals from the maintained aggregates: O(12 months + 3 fields), whatever the book size."""
+        return {
+            "contacts"    : len(self.contacts),
+            "birth_months": {month: count for month, count in enumerate(self._birth_months, start=1)},
+            "missing"     : dict(self._missing_fields),
+        }
+
     # Get contacts with birthdays in the next N days
 
-    def get_birthdays_in_next_days(self, days: int) -> list[tuple[Contact, date | None]]:
+    def get_birthdays_in_next_days(self, days: int) -> list[tuple[snap.ContactView, date | None]]:
         """
         Finds contacts whose birthdays fall within the next 'days' days.
         Calculates the celebration date (next Monday if birthday is on Sat/Sun).
@@ -133,9 +465,15 @@ class AdressBook:
         None for celebration_date means celebrate on the actual birthday.
         """
         today = date.today()
-        result: list[tuple[Contact, date | None]] = []
+        if self._birthday_columns is not None:
+            return self._birthdays_in_window_vectorized(today, days)
+        return self._birthdays_in_window_loop(today, days)
 
-        for contact in self.contacts:
+    def _birthdays_in_window_loop(self, today: date, days: int) -> list[tuple[snap.ContactView, date | None]]:
+        # Pure-Python path of get_birthdays_in_next_days (used when NumPy is not installed)
+        result: list[tuple[snap.ContactView, date | None]] = []
+
+        for contact in self.snapshot():
             if contact.birthday is None:
                 continue
 
@@ -166,18 +504,31 @@ class AdressBook:
                 continue # Skip this contact
         return result
 
+    def _birthdays_in_window_vectorized(self, today: date, days: int) -> list[tuple[snap.ContactView, date | None]]:
+        # NumPy path of get_birthdays_in_next_days: same rules, computed on whole columns
+        ids, birthdays, shifts = self._birthday_columns.window(today, days)
+        celebrations = (birthdays + shifts).tolist() # datetime64[D] -> datetime.date
+        ids = ids.tolist()
+        contacts = self.snapshot().by_id(ids)
+        return [
+            (contacts[contact_id], celebration if shift else None)
+            for contact_id, celebration, shift in zip(ids, celebrations, shifts.tolist())
+        ]
+
 
     # ================ Phone methods ================
     # Add contact phone number
     def _validate_phone(self, contact: Contact, phone_number: str) -> None | PhoneError:
-        if not PHONE_REGEX.fullmatch(phone_number):
-            raise PhoneError("invalid_phone_format")
-        if phone_number in contact.phones:
-            raise PhoneError("duplicate_phone")
+        error = val.phone_error(phone_number) or ("duplicate_phone" if phone_number in contact.phones else None)
+        if error:
+            raise PhoneError(error)
 
     def add_phone(self, contact: Contact, phone_number: str):
         self._validate_phone(contact, phone_number)
-        contact.phones.append(phone_number)
+        # Lists are replaced, never changed in place, so readers holding the old one are unaffected
+        old_phones = contact.phones
+        contact.phones = [*old_phones, phone_number]
+        self._emit_change(contact, "phones", old_phones, contact.phones)
 
     # Change contact phone number by index (1-based for user input, converted to 0-based internally)
     def change_phone(self, contact: Contact, phone_index: int, new_phone_number: str):
@@ -186,30 +537,33 @@ class AdressBook:
             raise IndexError("invalid_phone_index")
         # Validate the new number *before* changing
         self._validate_phone(contact, new_phone_number)
-        contact.phones[internal_index] = new_phone_number
+        old_phones = contact.phones
+        contact.phones = [*old_phones[:internal_index], new_phone_number, *old_phones[internal_index + 1:]]
+        self._emit_change(contact, "phones", old_phones, contact.phones)
 
     # Remove contact phone number by index (1-based for user input, converted to 0-based internally)
     def remove_phone(self, contact: Contact, phone_index: int):
         internal_index = phone_index - 1 # Convert to 0-based index
         if not 0 <= internal_index < len(contact.phones):
             raise IndexError("invalid_phone_index")
-        contact.phones.pop(internal_index)
+        old_phones = contact.phones
+        contact.phones = old_phones[:internal_index] + old_phones[internal_index + 1:]
+        self._emit_change(contact, "phones", old_phones, contact.phones)
 
 
     # ================ Email methods ================
     # Add contact email
     def _validate_email(self, contact: Contact, email: str) -> None | EmailError:
-        # Made this an instance method by adding self
-        email_lower = email.lower() # Store and compare emails case-insensitively
-        if not EMAIL_REGEX.fullmatch(email_lower):
-            raise EmailError("invalid_email_format")
-        # Check against lowercased existing emails
-        if email_lower in [e.lower() for e in contact.emails]:
-            raise EmailError("duplicate_email")
+        # Emails are stored as typed but compared case-insensitively
+        _, rejected = val.validate_emails((email,), contact.emails)
+        if rejected:
+            raise EmailError(rejected[0][1])
 
     def add_email(self, contact: Contact, email: str):
         self._validate_email(contact, email)
-        contact.emails.append(email) # Store original case, but validation is case-insensitive
+        old_emails = contact.emails
+        contact.emails = [*old_emails, email] # Store original case, but validation is case-insensitive
+        self._emit_change(contact, "emails", old_emails, contact.emails)
 
     # Change contact email by index (1-based for user input, converted to 0-based internally)
     def change_email(self, contact: Contact, email_index: int, new_email: str):
@@ -218,39 +572,97 @@ class AdressBook:
             raise IndexError("invalid_email_index")
         # Validate the new email *before* changing
         self._validate_email(contact, new_email)
-        contact.emails[internal_index] = new_email
+        old_emails = contact.emails
+        contact.emails = [*old_emails[:internal_index], new_email, *old_emails[internal_index + 1:]]
+        self._emit_change(contact, "emails", old_emails, contact.emails)
 
     # Remove contact email by index (1-based for user input, converted to 0-based internally)
     def remove_email(self, contact: Contact, email_index: int):
        internal_index = email_index - 1 # Convert to 0-based index
        if not 0 <= internal_index < len(contact.emails):
            raise IndexError("invalid_email_index")
-       contact.emails.pop(internal_index)
+       old_emails = contact.emails
+       contact.emails = old_emails[:internal_index] + old_emails[internal_index + 1:]
+       self._emit_change(contact, "emails", old_emails, contact.emails)
 
 
     # ================ Birthday methods ================
-    # Change contact birthday (pass None to remove)
-    def change_birthday(self, contact: Contact, new_birthday: date | None):
+    def _validate_birthday(self, new_birthday: date | None) -> None | BirthdayError:
         # Input validation (format DD.MM.YYYY) happens in Controller before conversion.
         # Model validates the date object itself.
-        if new_birthday is not None:
-            # Ensure it's a valid date object before range check
-            if not isinstance(new_birthday, date):
-                 # This case should ideally not happen if controller parses correctly
-                 raise BirthdayError("invalid_birthday_object") # Add message key
-            if new_birthday.year < 1900 or new_birthday > date.today():
-                raise BirthdayError("invalid_birthday_range")
-        contact.birthday = new_birthday
+        error = val.birthday_error(new_birthday)
+        if error:
+            raise BirthdayError(error)
+
+    def change_birthday(self, contact: Contact, new_birthday: date | None):
+        self._validate_birthday(new_birthday)
+        old_birthday, contact.birthday = contact.birthday, new_birthday
+        self._emit_change(contact, "birthday", old_birthday, new_birthday)
+
+    # ================ Merging duplicates ================
+    def merge_contacts(self, merges: list) -> int:
+        """
+        Applies dedupe.Merge plans: each kept contact takes the merged phones,
+        emails and birthday, the others are removed (one pass over the list
+        instead of a list.remove() each). Returns the number of contacts removed.
+        """
+        merges = [merge for merge in merges if self._is_stored(merge.keep)]
+        dropped = [contact for merge in merges for contact in merge.drop if self._is_stored(contact)]
+        dropped_ids = {contact.id for contact in dropped}
+        self.contacts[:] = [contact for contact in self.contacts if contact.id not in dropped_ids]
+        for contact in dropped:
+            self.events.emit(ev.ContactRemoved(contact))
+        for merge in merges:
+            keep = merge.keep
+            for field in ("phones", "emails", "birthday"):
+                old, new = getattr(keep, field), getattr(merge, field)
+                if new != old:
+                    setattr(keep, field, new)
+                    self._emit_change(keep, field, old, new)
+        return len(dropped)
+
+    # ================ Merging saved changes ================
+    # Called by storage inside events.replay(): indexes and snapshots follow, autosave does not
+    def apply_saved(self, saved: list[Contact], removed_ids: list[int]):
+        """Applies contacts another session saved (ascending ids): changed ones are updated in place."""
+        for contact_id in removed_ids:
+            contact = self._contacts_by_id.get(contact_id)
+            if contact is not None:
+                self.remove_contact(contact)
+        for remote in saved:
+            contact = self._contacts_by_id.get(remote.id)
+            if contact is None:
+                if self.contacts and self.contacts[-1].id > remote.id:
+                    insort(self.contacts, remote, key=_by_id) # Keeps self.contacts in id order
+                else:
+                    self.contacts.append(remote)
+                self.events.emit(ev.ContactAdded(remote))
+                continue
+            for field in ("name", "phones", "emails", "birthday"):
+                old, new = getattr(contact, field), getattr(remote, field)
+                if old != new:
+                    setattr(contact, field, new)
+                    self._emit_change(contact, field, old, new)
+
+    def reassign_id(self, contact: Contact):
+        """Moves a stored contact to the next free id."""
+        self.remove_contact(contact)
+        contact._take_next_id()
+        self.contacts.append(contact) # The newest id sorts last
+        self.events.emit(ev.ContactAdded(contact))
 
 
 # ================ Note Class ================
+_restamped_notes: list["Note"] = [] # Notes given load-time timestamps by the last load
+
 class Note:
     #Constants
-    MIN_TITLE_LEN = 2
-    MAX_TITLE_LEN = 128
-    MIN_TAG_LEN = 2
-    MAX_TAG_LEN = 16
-    TAG_PATTERN = re.compile(r"^[a-zA-Z0-9_]+$") #validation for letters and numbers only.
+    MIN_TITLE_LEN = val.MIN_TITLE_LEN
+    MAX_TITLE_LEN = val.MAX_TITLE_LEN
+    MIN_TAG_LEN = val.MIN_TAG_LEN
+    MAX_TAG_LEN = val.MAX_TAG_LEN
+    TAG_PATTERN = val.TAG_PATTERN #validation for letters and numbers only.
+    PREVIEW_CHARS = 100 # Kept uncompressed for listings (view shows this many characters)
 
     #Id_counter - IMPORTANT:
     # Its value should be set by the load_data_from_file function
@@ -260,22 +672,56 @@ class Note:
 
     def __init__(self, title: str):
         # --- Implementing title validation ---
-        if not (Note.MIN_TITLE_LEN <= len(title) <= Note.MAX_TITLE_LEN):
+        if val.title_error(title):
             # Error key with parameters
-            raise TitleError("invalid_title_length", min=Note.MIN_TITLE_LEN, max=Note.MAX_TITLE_LEN)
+            raise TitleError("invalid_title_length", **val.ERROR_KWARGS["invalid_title_length"])
         self.__id    : int = Note.id_counter
         self.title   : str = title
-        self.content : str = ""
+        self.content : str = "" # Stored packed in self._body (see compression.py)
         self.tags    : list[str] = [] # Tags are stored in lowercase
+        self.created : float = time.time() # Unix times: restamped by Notebook.add_note,
+        self.modified : float = self.created # then by every title, content and tag change
         Note.id_counter += 1
 
+    # Notes pickled before compression carry a plain "content" attribute,
+    # notes pickled before timestamps get the time they were first loaded
+    def __setstate__(self, state: dict):
+        content = state.pop("content", None)
+        if "created" not in state:
+            state["created"] = state["modified"] = time.time()
+            _restamped_notes.append(self) # load_data_from_file saves the new times once
+        self.__dict__.update(state)
+        if content is not None:
+            self.content = content
+
     @property
     def id(self) -> int:
         return self.__id
 
+    # --- Content: large bodies stay compressed, the preview never needs decompression ---
+    @property
+    def content(self) -> str:
+        return cz.unpack(self._body)
+
+    @content.setter
+    def content(self, text: str):
+        self._body          : str | bytes = cz.pack(text)
+        self._preview       : str | None = text[:Note.PREVIEW_CHARS] if isinstance(self._body, bytes) else None
+        self.content_length : int = len(text)
+
+    @property
+    def preview(self) -> str:
+        """First PREVIEW_CHARS characters of the content."""
+        return self._body[:Note.PREVIEW_CHARS] if self._preview is None else self._preview
+
+    def _take_next_id(self):
+        # Only for storage merges: another session saved a note under this (unsaved) id
+        self.__id = Note.id_counter
+        Note.id_counter += 1
+
     def __repr__(self) -> str:
      # Representation useful for developers/debugging
-     content_preview = self.content[:20].replace('\n', '\\n') + ('...' if len(self.content) > 20 else '')
+     content_preview = self.preview[:20].replace('\n', '\\n') + ('...' if self.content_length > 20 else '')
      return f"Note(id={self.__id}, title='{self.title}', content='{content_preview}...', tags={self.tags})"
 
     # --- The __eq__ and __hash__ methods are required for list.remove() to work correctly ---
@@ -290,54 +736,195 @@ class Note:
 # ================ Notebook Class ================
 
 class Notebook:
-    def __init__(self, autosave_callback=None):
-        self.notes : list[Note] = []
-        self.autosave_callback = autosave_callback # Save callback
-        if autosave_callback:
-             self._autosave = autosave_callback # Directly assign if provided
+    KIND   = "notes" # Record list attribute and section name in the data file
+    RECORD = Note
+    PERSISTED_INDEXES = ("_titles", "_tag_index", "_tag_counts", "_title_grams", "_content_grams", "_note_times")
+
+    def __init__(self, autosave_callback=None, notes: list[Note] | None = None, indexes: dict[str, bytes] | None = None):
+        self.notes : list[Note] = notes if notes is not None else [] # In id order
+        self._setup(indexes)
+        if autosave_callback is not None: # Same as subscribing it to the change feed
+            self.events.subscribe(lambda event: autosave_callback(), local_only=True)
+
+    def __getattr__(self, name: str):
+        # Only reached for missing attributes: persisted indexes not unpickled yet
+        return _thaw_index(self, name)
+
+    # --- Only the notes are pickled: indexes and subscribers (e.g. autosave) are runtime state ---
+    def __getstate__(self) -> dict:
+        return {"notes": self.notes}
+
+    def __setstate__(self, state: dict):
+        self.notes = state["notes"]
+        self._setup() # Autosave is subscribed again by load_data_from_file
+
+    def _setup(self, indexes: dict[str, bytes] | None = None):
+        self.events : ev.EventBus = ev.EventBus() # Every change of a stored note is published here
+        self.events.subscribe(self._apply_event)  # The book's own indexes always update first
+        self.events.subscribe(self._publish_snapshot)
+        self._snapshots : snap.SnapshotCell | None = None # Built by the first snapshot() call
+        if indexes is not None and indexes.keys() >= set(self.PERSISTED_INDEXES):
+            self._restore_indexes(indexes)
+        else:
+            self._rebuild_indexes()
+
+    # ================ Snapshots ================
+    # self.notes is the writers' list; readers use snapshot() instead (see AdressBook)
+    def snapshot(self) -> snap.Snapshot:
+        """Returns the current immutable version of the notes (O(1) once built)."""
+        if self._snapshots is None:
+            records = snap.PersistentList.from_records(map(snap.note_view, self.notes))
+            self._snapshots = snap.SnapshotCell(snap.Snapshot(self._version, records))
+        return self._snapshots.current()
+
+    def _publish_snapshot(self, event: ev.Event):
+        if self._snapshots is None:
+            return # Nobody has asked for a snapshot yet
+        records = self._snapshots.current().records
+        if isinstance(event, ev.NoteRemoved):
+            records = records.remove(event.note.id)
+        else:
+            records = records.replace(snap.note_view(event.note))
+        self._snapshots.publish(self._version, records)
+
+    # ================ Index maintenance ================
+    def _rebuild_indexes(self):
+        self._version       : int = 0 # Bumped by every event (invalidates search sessions)
+        self._notes_by_id   : dict[int, Note] = {}
+        self._titles        : dict[str, int] = {}       # lowercased title -> note id (uniqueness)
+        self._tag_index     : dict[str, set[int]] = {}  # tag -> note ids
+        self._tag_counts    : dict[str, int] = {}       # tag -> number of notes (stats() without thawing _tag_index)
+        self._title_grams   : ix.TrigramIndex = ix.TrigramIndex()
+        self._content_grams : ix.TrigramIndex = ix.TrigramIndex()
+        self._note_times    : ix.TimeIndex = ix.TimeIndex()     # modified time -> note ids (recent, ranges)
+        self._frozen        : dict[str, bytes] = {} # Persisted indexes not unpickled yet (see _restore_indexes)
+        for note in self.notes:
+            self._index_note(note)
+
+    def _restore_indexes(self, indexes: dict[str, bytes]):
+        """Same state as _rebuild_indexes, but the persisted indexes are unpickled by their first use."""
+        self._version     = 0
+        self._notes_by_id = {note.id: note for note in self.notes}
+        self._frozen      = {name: indexes[name] for name in self.PERSISTED_INDEXES}
+
+    def _apply_event(self, event: ev.Event):
+        # Updates only what the event touched, then invalidates cached searches
+        if isinstance(event, ev.NoteAdded):
+            self._index_note(event.note)
+        elif isinstance(event, ev.NoteRemoved):
+            self._unindex_note(event.note)
+        elif isinstance(event, ev.NoteRetitled):
+            self._unindex_title(event.note, event.old)
+            self._index_title(event.note, event.new)
+        elif isinstance(event, ev.NoteContentChanged):
+            self._content_grams.remove(event.note.id, event.old.lower())
+            self._content_grams.add(event.note.id, self._content_source(event.note))
+        elif isinstance(event, ev.NoteTagged):
+            self._index_tag(event.note, event.tag)
+        elif isinstance(event, ev.NoteUntagged):
+            self._unindex_tag(event.note, event.tag)
+        if not isinstance(event, (ev.NoteAdded, ev.NoteRemoved)): # Every edit moves the note to its new time
+            self._note_times.add(event.note.id, event.note.modified)
+        self._version += 1
+
+    def _is_stored(self, note: Note) -> bool:
+        # Notes that are not (yet) in this notebook are edited without events
+        return self._notes_by_id.get(note.id) is note
+
+    def _emit(self, note: Note, event: ev.Event):
+        if self._is_stored(note):
+            self.events.emit(event)
+
+    def _index_note(self, note: Note):
+        self._notes_by_id[note.id] = note
+        self._index_title(note, note.title)
+        self._content_grams.add(note.id, self._content_source(note))
+        for tag in note.tags:
+            self._index_tag(note, tag)
+        self._note_times.add(note.id, note.modified)
+
+    def _unindex_note(self, note: Note):
+        self._note_times.remove(note.id)
+        for tag in note.tags:
+            self._unindex_tag(note, tag)
+        self._content_grams.remove(note.id, self._content_text(note))
+        self._unindex_title(note, note.title)
+        del self._notes_by_id[note.id]
+
+    @staticmethod
+    def _scanned_content(note: Note) -> str:
+        # Content for bulk indexing and full scans: they do not evict hot bodies from the LRU
+        body = note._body
+        return body if isinstance(body, str) else cz.unpack(body, remember=False)
+
+    @staticmethod
+    def _content_text(note: Note) -> str:
+        # Lowercased content for the index
+        return Notebook._scanned_content(note).lower()
+
+    @staticmethod
+    def _content_source(note: Note) -> callable:
+        # Resolved when the index flushes: pending notes hold no (decompressed) copy of their text
+        return lambda: Notebook._content_text(note)
+
+    def _index_title(self, note: Note, title: str):
+        self._titles[title.lower()] = note.id
+        self._title_grams.add(note.id, title.lower())
+
+    def _unindex_title(self, note: Note, title: str):
+        if self._titles.get(title.lower()) == note.id:
+            del self._titles[title.lower()]
+        self._title_grams.remove(note.id, title.lower())
+
+    def _index_tag(self, note: Note, tag: str):
+        self._tag_index.setdefault(tag, set()).add(note.id)
+        self._tag_counts[tag] = len(self._tag_index[tag])
+
+    def _unindex_tag(self, note: Note, tag: str):
+        self._tag_index[tag].discard(note.id)
+        if not self._tag_index[tag]:
+            del self._tag_index[tag]
+            del self._tag_counts[tag]
         else:
-             self._autosave = lambda: None # No-op if no callback
+            self._tag_counts[tag] = len(self._tag_index[tag])
 
-    # --- Private method to call autosave ---
-    def _autosave(self):
-        """Calls the autosave callback if it's set."""
-        if self.autosave_callback and callable(self.autosave_callback):
-           self.autosave_callback()
+    def _notes_from_ids(self, ids) -> list[Note]:
+        # Ids grow with insertion order, so sorting keeps the order of self.notes
+        return [self._notes_by_id[i] for i in sorted(ids)]
 
     # ================ Note CRUD methods ================
     # Add note to notebook
     def add_note(self, note: Note):
         # --- Implementing duplicate title checking (case-insensitive) ---
-        title_lower = note.title.lower()
-        for existing_note in self.notes:
-            if existing_note.title.lower() == title_lower:
-                raise NoteError("duplicate_title", title=note.title) # Error key
+        if note.title.lower() in self._titles:
+            raise NoteError("duplicate_title", title=note.title) # Error key
+        note.created = note.modified = time.time()
         self.notes.append(note)
-        self._autosave() # Call autosave
+        self.events.emit(ev.NoteAdded(note)) # Indexes, then autosave
 
     def change_note_title(self, note: Note, new_title: str):
         # --- Implementing new name validation ---
-        if not (Note.MIN_TITLE_LEN <= len(new_title) <= Note.MAX_TITLE_LEN):
-            raise TitleError("invalid_title_length", min=Note.MIN_TITLE_LEN, max=Note.MAX_TITLE_LEN)
+        if val.title_error(new_title):
+            raise TitleError("invalid_title_length", **val.ERROR_KWARGS["invalid_title_length"])
 
         # Check for duplicates (ignoring the current note, case-insensitive)
-        new_title_lower = new_title.lower()
-        for existing_note in self.notes:
-            if existing_note.id != note.id and existing_note.title.lower() == new_title_lower:
-                 raise NoteError("duplicate_title", title=new_title) # Error key
-        note.title = new_title
-        self._autosave() # Call autosave
+        if self._titles.get(new_title.lower(), note.id) != note.id:
+             raise NoteError("duplicate_title", title=new_title) # Error key
+        old_title, note.title = note.title, new_title
+        note.modified = time.time()
+        self._emit(note, ev.NoteRetitled(note, old_title, new_title))
 
     def change_note_content(self, note: Note, new_content: str):
         # No specific validation for content, allow anything including empty
-        note.content = new_content
-        self._autosave() # Call autosave
+        old_content, note.content = note.content, new_content
+        note.modified = time.time()
+        self._emit(note, ev.NoteContentChanged(note, old_content, new_content))
 
     def remove_note(self, note: Note):
         # --- Implementing deletion error handling ---
         try:
             self.notes.remove(note) # Uses Note.__eq__
-            self._autosave() # Call autosave AFTER successful deletion
+            self.events.emit(ev.NoteRemoved(self._notes_by_id.get(note.id, note))) # AFTER successful deletion
         except ValueError:
              # Generate an error with the key if the note is not in the list
             raise NotFoundError("note_not_found", title=note.title) # Error key
@@ -346,10 +933,9 @@ class Notebook:
     def add_tag_to_note(self, note: Note, tag: str):
         # --- Implementing tag validation ---
         tag_clean = tag.strip()  # Remove any leading/trailing spaces
-        if not (Note.MIN_TAG_LEN <= len(tag_clean) <= Note.MAX_TAG_LEN):
-            raise TagError("invalid_tag_length", min=Note.MIN_TAG_LEN, max=Note.MAX_TAG_LEN)
-        if not Note.TAG_PATTERN.match(tag_clean):
-            raise TagError("invalid_tag_format")  # Error key
+        error = val.tag_error(tag_clean)
+        if error:
+            raise TagError(error, **val.ERROR_KWARGS.get(error, {}))  # Error key
 
         tag_lower = tag_clean.lower()  # Convert the tag to lowercase
 
@@ -359,10 +945,10 @@ class Notebook:
             # For consistency, let's raise an error from the model
             raise TagError("duplicate_tag_in_note", tag=tag_lower, title=note.title) # Add message key
 
-        # If the tag is not already in the note, add it
-        note.tags.append(tag_lower)
-        note.tags.sort()  # Sort tags alphabetically for consistency
-        self._autosave() # Call autosave
+        # If the tag is not already in the note, add it (a new sorted list: readers may hold the old one)
+        note.tags = sorted([*note.tags, tag_lower])  # Sort tags alphabetically for consistency
+        note.modified = time.time()
+        self._emit(note, ev.NoteTagged(note, tag_lower))
 
     def remove_tag_from_note(self, note: Note, tag: str):
         # --- Implementing tag removal error handling ---
@@ -371,97 +957,456 @@ class Notebook:
              # Check if the tag exists before deleting
              if tag_lower not in note.tags:
                  raise ValueError # Raise an error if the tag is missing
-             note.tags.remove(tag_lower)
-             self._autosave() # Call autosave AFTER successful deletion
+             note.tags = [existing for existing in note.tags if existing != tag_lower]
+             note.modified = time.time()
+             self._emit(note, ev.NoteUntagged(note, tag_lower)) # AFTER successful deletion
         except ValueError:
             # Generate an error with the key if the tag is not in the note
             raise NotFoundError("tag_not_found_in_note", tag=tag_lower, title=note.title) # Error key
 
+    # ================ Merging saved changes ================
+    # Called by storage inside events.replay(): indexes and snapshots follow, autosave does not
+    def apply_saved(self, saved: list[Note], removed_ids: list[int]):
+        """Applies notes another session saved (ascending ids): changed ones are updated in place."""
+        for note_id in removed_ids:
+            note = self._notes_by_id.get(note_id)
+            if note is not None:
+                self.remove_note(note)
+        for remote in saved:
+            note = self._notes_by_id.get(remote.id)
+            if note is None:
+                if self.notes and self.notes[-1].id > remote.id:
+                    insort(self.notes, remote, key=_by_id) # Keeps self.notes in id order
+                else:
+                    self.notes.append(remote)
+                self.events.emit(ev.NoteAdded(remote))
+                continue
+            # The other session's times first: the events below index the note at its new time
+            retimed = note.modified != remote.modified
+            note.created, note.modified = remote.created, remote.modified
+            if note.title != remote.title:
+                old_title, note.title = note.title, remote.title
+                self._emit(note, ev.NoteRetitled(note, old_title, remote.title))
+            if note.content != remote.content:
+                old_content, note.content = note.content, remote.content
+                self._emit(note, ev.NoteContentChanged(note, old_content, remote.content))
+            if note.tags != remote.tags:
+                old_tags, note.tags = note.tags, list(remote.tags)
+                for tag in old_tags:
+                    if tag not in note.tags:
+                        self._emit(note, ev.NoteUntagged(note, tag))
+                for tag in note.tags:
+                    if tag not in old_tags:
+                        self._emit(note, ev.NoteTagged(note, tag))
+            if retimed:
+                self._note_times.add(note.id, note.modified) # Also when only the time changed
+
+    def reassign_id(self, note: Note):
+        """Moves a stored note to the next free id."""
+        self.remove_note(note)
+        note._take_next_id()
+        self.notes.append(note) # The newest id sorts last
+        self.events.emit(ev.NoteAdded(note))
+
     # ================ Note search methods ================
-    def find_notes(self, part: str) -> list[Note]:
+    @staticmethod
+    def _note_matches(note: Note, part_lower: str) -> bool:
+        # Same fields as 'find note': title, content and tags
+        return (part_lower in note.title.lower() or part_lower in Notebook._content_text(note)
+                or any(part_lower in tag for tag in note.tags))
+
+    def search_session(self) -> "SearchSession":
+        """Returns an incremental search over title, content and tags (see SearchSession)."""
+        return SearchSession(self, lambda part: [note for note in self.snapshot() if self._note_matches(note, part.lower())],
+                             self._note_matches)
+
+    @staticmethod
+    def _grams_ids(part_lower: str, *indexes: ix.TrigramIndex) -> set[int] | None:
+        """Ids of the notes that may contain part_lower in one of the indexed fields (None: too short, all may)."""
+        candidates = [index.candidates(part_lower) for index in indexes]
+        if any(c is None for c in candidates):
+            return None
+        return set().union(*candidates)
+
+    def _grams_scope(self, part_lower: str, *indexes: ix.TrigramIndex) -> list[snap.NoteView]:
+        return self.snapshot().select(self._grams_ids(part_lower, *indexes))
+
+    def find_notes(self, part: str) -> list[snap.NoteView]:
         part_lower = part.lower() # Search case-insensitively
-        return [ note for note in self.notes if part_lower in note.title.lower() or part_lower in note.content.lower() ]
+        notes = self._grams_scope(part_lower, self._title_grams, self._content_grams)
+        return parallel.scan(notes, lambda note: part_lower in note.title.lower() or part_lower in self._content_text(note))
 
-    def find_note_by_title(self, part: str) -> list[Note]:
+    def find_note_candidates(self, part: str) -> list[Note]:
+        """Notes whose title or content may contain part (a trigram superset: the caller verifies)."""
+        # Live notes, not a snapshot: the mention links call this while indexing an event
+        ids = self._grams_ids(part.lower(), self._title_grams, self._content_grams)
+        return list(self.notes) if ids is None else self._notes_from_ids(ids)
+
+    def find_note_by_title(self, part: str) -> list[snap.NoteView]:
         part_lower = part.lower() # Search case-insensitively
-        return [ note for note in self.notes if part_lower in note.title.lower() ]
+        return parallel.scan(self._grams_scope(part_lower, self._title_grams), lambda note: part_lower in note.title.lower())
 
-    def find_note_by_content(self, part: str) -> list[Note]:
+    def find_note_by_content(self, part: str) -> list[snap.NoteView]:
         part_lower = part.lower() # Search case-insensitively
-        return [ note for note in self.notes if part_lower in note.content.lower() ]
+        return parallel.scan(self._grams_scope(part_lower, self._content_grams), lambda note: part_lower in self._content_text(note))
 
-    def find_note_by_tag(self, part: str) -> list[Note]:
+    def find_notes_regex(self, pattern: str) -> list[snap.NoteView]:
+        """Finds notes whose title, content or a tag matches the regular expression (case-insensitive)."""
+        try:
+            regex = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise QueryError("invalid_regex", pattern=pattern, error=str(e))
+        # No index can serve an arbitrary pattern, so this is always a (possibly parallel) full scan
+        return parallel.scan(self.snapshot().select(), lambda note: bool(regex.search(note.title) or regex.search(self._scanned_content(note))
+                                                           or any(regex.search(tag) for tag in note.tags)))
+
+    def _tag_ids(self, part_lower: str) -> set[int]:
+        # Scans the distinct tags (a short list) instead of every note
+        return set().union(*(ids for tag, ids in self._tag_index.items() if part_lower in tag))
+
+    def find_note_by_tag(self, part: str) -> list[snap.NoteView]:
         """Finds notes where any tag contains the search part (case-insensitive)."""
         part_lower = part.lower() # Search case-insensitively
-        # *** FIXED: Search for part within each tag ***
-        return [ note for note in self.notes if any(part_lower in tag for tag in note.tags) ]
+        return self.snapshot().select(self._tag_ids(part_lower))
+
+    # ================ Time queries ================
+    def recent_notes(self, count: int) -> list[snap.NoteView]:
+        """The count most recently written or edited notes, newest first: O(log n + count)."""
+        ids = self._note_times.latest(count)
+        notes = self.snapshot().by_id(ids)
+        return [notes[note_id] for note_id in ids]
+
+    def notes_between(self, first_day: date, last_day: date) -> list[snap.NoteView]:
+        """Notes written or last edited from first_day to last_day (inclusive, local time), oldest first."""
+        start = datetime.combine(first_day, datetime.min.time()).timestamp()
+        end = datetime.combine(last_day + timedelta(days=1), datetime.min.time()).timestamp()
+        ids = self._note_times.between(start, end)
+        notes = self.snapshot().by_id(ids)
+        return [notes[note_id] for note_id in ids]
+
+    # ================ Stats ================
+    def stats(self) -> dict:
+        """Notes per tag (the tag cloud, most used first) from the maintained counts: O(tags)."""
+        tags = sorted(self._tag_counts.items(), key=lambda pair: (-pair[1], pair[0]))
+        return {"notes": len(self.notes), "tags": dict(tags)}
+
+# ================ Incremental Search ================
+class SearchSession:
+    """
+    Search-as-you-type over one book. Substring matching is monotonic: if a new
+    term contains the previous one, its hits are a subset of the previous hits,
+    so only those candidates are re-checked instead of the whole book.
+    Earlier terms stay on a small stack (for backspace), and any mutation of the
+    book invalidates the session so stale candidates are never returned.
+    """
+    MAX_DEPTH = 16
+
+    def __init__(self, source, search: callable, matches: callable):
+        self._source  = source  # AdressBook or Notebook, read for its mutation version
+        self._search  = search  # term -> hits from the whole book
+        self._matches = matches # (item, lowercased term) -> bool
+        self._stack   : list[tuple[str, list]] = [] # (lowercased term, hits), most refined last
+        self._version : int = source._version
+
+    def reset(self):
+        self._stack.clear()
+        self._version = self._source._version
+
+    def refine(self, term: str) -> list:
+        """Returns the hits for term, filtering the closest earlier result set when possible."""
+        if self._version != self._source._version:
+            self.reset() # The book changed since the last keystroke
+        term_lower = term.lower()
+        # Backspace or edits: drop earlier terms that are not contained in the new one
+        while self._stack and self._stack[-1][0] not in term_lower:
+            self._stack.pop()
+        if self._stack and self._stack[-1][0] == term_lower:
+            return self._stack[-1][1]
+
+        if self._stack:
+            results = [item for item in self._stack[-1][1] if self._matches(item, term_lower)]
+        else:
+            results = self._search(term)
+        self._stack.append((term_lower, results))
+        del self._stack[:-self.MAX_DEPTH]
+        return results
+
+# ================ Persisted Indexes ================
+# The side file of a data file keeps every persisted index of both books as its
+# own pickle, stamped with the file generation it was built from. A warm start
+# only reads those pickles: each index is unpickled by the first book method
+# that touches it, and one that is never used is written back as it was read.
+# A cold start (no usable side file) does not index in the foreground: the
+# books hold a Future per index instead, resolved by the background rebuild
+# with the pickles it writes, so the first use waits for that one build.
+def _frozen_pickle(frozen: dict, name: str) -> bytes:
+    blob = frozen[name]
+    return blob.result()[name] if isinstance(blob, Future) else blob
+
+def _thaw_index(book, name: str):
+    frozen = book.__dict__.get("_frozen")
+    if not frozen or name not in frozen:
+        raise AttributeError(f"'{type(book).__name__}' object has no attribute '{name}'")
+    try:
+        index = pickle.loads(_frozen_pickle(frozen, name))
+        del frozen[name]
+    except Exception: # Damaged side file or failed rebuild: index the records from scratch instead
+        version = book._version
+        book._rebuild_indexes()
+        book._version = version
+        return getattr(book, name)
+    setattr(book, name, index)
+    return index
+
+def _export_indexes(book) -> dict[str, bytes]:
+    frozen = book._frozen
+    return {name: _frozen_pickle(frozen, name) if name in frozen else pickle.dumps(getattr(book, name), storage.PROTOCOL)
+            for name in book.PERSISTED_INDEXES}
+
+def _side_file_content(address_book: AdressBook, notebook: Notebook) -> dict[str, tuple[int, dict[str, bytes]]]:
+    return {book.KIND: (len(getattr(book, book.KIND)), _export_indexes(book)) for book in (address_book, notebook)}
+
+def _write_indexes(data_file: storage.DataFile, generation: int, address_book: AdressBook, notebook: Notebook):
+    data_file.write_indexes(generation, ix.LAYOUT, _side_file_content(address_book, notebook))
+
+def _rebuild_indexes_in_background(data_file: storage.DataFile, address_book: AdressBook, notebook: Notebook,
+                                   pending: dict[str, Future]):
+    """
+    Indexes snapshots of the freshly loaded books on a daemon thread, hands
+    the pickles to the books waiting for them (pending: kind -> Future) and
+    saves them for the next start.
+    """
+    generation = data_file.generation
+    contacts, notes = address_book.snapshot(), notebook.snapshot() # Also what the first searches read
+    def rebuild():
+        try:
+            content = _side_file_content(AdressBook(contacts.select()), Notebook(notes=notes.select()))
+        except Exception as error:
+            for future in pending.values():
+                future.set_exception(error) # The books index their records themselves
+            return
+        for kind, future in pending.items():
+            future.set_result(content[kind][1])
+        try:
+            data_file.write_indexes(generation, ix.LAYOUT, content)
+        except Exception:
+            pass # The side file is only a speed-up: the next start tries again
+    thread = _index_rebuilds[data_file.path] = threading.Thread(target=rebuild, name="index-rebuild", daemon=True)
+    thread.start()
 
+def wait_for_index_rebuilds():
+    """Blocks until the background index rebuilds started so far are done (benchmarks, tests)."""
+    for thread in list(_index_rebuilds.values()):
+        thread.join()
 
 # ================ Data Persistence ================
+@contextmanager
+def _gc_paused():
+    # Bulk loads create every record at once: collections in between would only walk them again and again
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+@_gc_paused()
+def _read_books(data_file: storage.DataFile, pending: dict[str, Future] | None = None) -> tuple[AdressBook, Notebook]:
+    """
+    Builds the books from the whole file. Their indexes come from the side file
+    when it matches the loaded generation, else they are built in one pass;
+    with `pending`, a kind without usable indexes gets a Future there instead
+    (resolved by _rebuild_indexes_in_background), so nothing is built here.
+    Raises on damaged data files (a damaged side file only means a rebuild).
+    """
+    _restamped_notes.clear()
+    records, counters = data_file.load() # Empty for a missing file
+    if not all(isinstance(counters.get(kind, 0), int) for kind in (AdressBook.KIND, Notebook.KIND)):
+        return AdressBook(), Notebook() # Data has incorrect types, use defaults
+    # Ids stay unique across every file open in this process (profiles share the counters)
+    Contact.id_counter = max(Contact.id_counter, counters.get(AdressBook.KIND, 0))
+    Note.id_counter = max(Note.id_counter, counters.get(Notebook.KIND, 0))
+    try:
+        saved = data_file.read_indexes(ix.LAYOUT) or {}
+    except Exception:
+        saved = {}
+    indexes = {} # kind -> pickled indexes, for the kinds whose record count still matches
+    for book_class in (AdressBook, Notebook):
+        kind = book_class.KIND
+        count, pickled = saved.get(kind, (None, None))
+        if count == len(records.get(kind, [])):
+            indexes[kind] = pickled
+        elif pending is not None and data_file.generation:
+            pending[kind] = Future()
+            indexes[kind] = dict.fromkeys(book_class.PERSISTED_INDEXES, pending[kind])
+    return (AdressBook(sorted(records.get(AdressBook.KIND, []), key=_by_id), indexes.get(AdressBook.KIND)),
+            Notebook(notes=sorted(records.get(Notebook.KIND, []), key=_by_id), indexes=indexes.get(Notebook.KIND)))
+
 # Load data from file and return AdressBook and Notebook objects
 def load_data_from_file(file_path: str = FILE_PATH) -> tuple[AdressBook, Notebook]:
     """
     Loads the address book, notebook, and ID counters from the file.
     Returns new empty books if the file is not found or corrupted.
-    Also sets up the autosave callback for the loaded notebook.
+    Also subscribes autosave (and the journal, if enabled) to both books, and
+    remembers the file so refresh_data_from_file can merge other sessions' saves.
     """
-    address_book = AdressBook()
-    notebook = Notebook() # Create default empty notebook first
-
+    data_file = storage.DataFile(file_path)
+    pending = {} # kind -> Future of its indexes, when the side file could not provide them
     try:
-        with open(file_path, "rb") as f:
-            data = pickle.load(f)
-            if isinstance(data, tuple) and len(data) == 4:
-                loaded_ab, loaded_nb, contact_counter, note_counter = data
-                if isinstance(loaded_ab, AdressBook) and isinstance(loaded_nb, Notebook) \
-                   and isinstance(contact_counter, int) and isinstance(note_counter, int):
-                    # Restore data and ID counters
-                    address_book = loaded_ab
-                    notebook = loaded_nb # Use loaded notebook
-                    Contact.id_counter = contact_counter
-                    Note.id_counter = note_counter
-                else:
-                    # Data has incorrect types, use defaults but log potentially?
-                    pass # Using default empty books
-            else:
-                 # Data is not the expected tuple, use defaults
-                 pass # Using default empty books
-
-    except FileNotFoundError:
-        # Start fresh, use default empty books
-        pass
+        address_book, notebook = _read_books(data_file, pending)
     except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError, IOError, Exception) as e:
         # Handle various load errors, use defaults
         # Consider logging the error 'e' here
         print(f"[Warning] Error loading data file: {e}. Starting with empty data.") # Simple console warning
+        address_book, notebook = AdressBook(), Notebook()
+        data_file = storage.DataFile(file_path)
+        pending.clear()
 
-    # Save AdressBook and Notebook objects to file
+    # Save AdressBook and Notebook objects to file after every change of either book
     def actual_save():
-        # This function needs access to both address_book and notebook
-        # It's slightly awkward here in the model file.
-        # Ideally, the controller sets this callback after loading.
-        # For now, let's assume save_data_to_file is accessible and works.
+        if _batch_depth:
+            _pending_saves[file_path] = actual_save # Saved once, when the batch ends
+            return
         try:
+            if background_saves:
+                _start_background_save(data_file) # Edits made while one runs go with the next one
+                return
             save_data_to_file(address_book, notebook, file_path)
             # print("Autosave successful.") # Optional debug message
         except Exception as save_error:
             # How to handle autosave errors? Log them? Inform user?
             print(f"[Error] Autosave failed: {save_error}") # Simple console error
 
-    notebook.autosave_callback = actual_save # Set the callback
+    data_file.attach(address_book, notebook) # Tracks local edits before autosave runs
+    if _restamped_notes: # Notes saved before timestamps: the next save stores their load-time stamps
+        data_file.mark_dirty(Notebook.KIND, [note.id for note in _restamped_notes])
+        _restamped_notes.clear()
+    if pending: # Cold start: the books' indexes come from this rebuild
+        _rebuild_indexes_in_background(data_file, address_book, notebook, pending)
+    for book in (address_book, notebook):
+        # Only this session's edits: changes merged from the file are not saved or journaled again
+        book.events.subscribe(lambda event: actual_save(), local_only=True) # After the book's own indexes
+        if ev.journal is not None:
+            book.events.subscribe(ev.journal, local_only=True)
+    _data_files[file_path] = data_file
 
     return address_book, notebook
 
+# Load detached books (no autosave, no refresh): read-only browsing such as cross-profile search
+def read_data_from_file(file_path: str = FILE_PATH) -> tuple[AdressBook, Notebook]:
+    """Loads the books of a file without tracking them. Empty books if the file is missing or damaged."""
+    try:
+        return _read_books(storage.DataFile(file_path))
+    except Exception as e:
+        print(f"[Warning] Error loading data file: {e}. Skipping it.")
+        return AdressBook(), Notebook()
+
 # Save AdressBook and Notebook objects to file
 def save_data_to_file(address_book: AdressBook, notebook: Notebook, file_path: str = FILE_PATH):
     """
     Saves the address book, notebook, and current ID counters to the file.
+    Books loaded from this file first merge other sessions' saves and rewrite
+    only their changed records; any other books replace the file's content.
     Propagates exceptions upwards if saving fails.
     """
     # No try...except here, let controller handle save errors if needed
-    with open(file_path, "wb") as f:
-        data_to_save: tuple = (address_book, notebook, Contact.id_counter, Note.id_counter)
-        pickle.dump(data_to_save, f)
+    data_file = _data_files.get(file_path)
+    if data_file is None or not data_file.tracks(address_book, notebook):
+        data_file = storage.DataFile(file_path)
+    data_file.save(address_book, notebook)
+
+# ================ Batched Changes ================
+@contextmanager
+def batch_changes():
+    """Defers autosave to the end of the block: all the edits made in it are written by one save per file."""
+    global _batch_depth
+    _batch_depth += 1
+    try:
+        yield
+    finally:
+        _batch_depth -= 1
+        if not _batch_depth:
+            pending = list(_pending_saves.values())
+            _pending_saves.clear()
+            for save in pending:
+                save()
+
+# ================ Background Saves ================
+def background_saves_from_env(environ=os.environ) -> bool:
+    return environ.get(BACKGROUND_SAVE_ENV, "") not in ("", "0")
+
+def enable_background_saves() -> bool:
+    """Makes autosave fork a child per save (at most one in flight). False where fork is unavailable."""
+    global background_saves
+    background_saves = storage.DataFile.can_save_in_background()
+    return background_saves
+
+def _start_background_save(data_file: storage.DataFile):
+    wait_for_index_rebuilds() # No fork while the rebuild thread runs (usually only right after a load)
+    try:
+        data_file.save_in_background() # No-op while another background save runs
+    except OSError as e: # fork failed (e.g. not enough memory for the child): save in this process
+        print(f"[Warning] Background save unavailable: {e}. Saving in the foreground.")
+        data_file.save(*data_file.books)
+
+def poll_background_saves():
+    """
+    Collects a finished background save (reporting a failure) and starts the
+    next one for the edits made while it ran. Called before every command.
+    """
+    for file_path, data_file in list(_data_files.items()):
+        try:
+            data_file.poll_background_save()
+        except storage.BackgroundSaveError as e:
+            print(f"[Error] Background save of '{file_path}' failed: {e}. Its changes will be saved again.")
+    if storage.DataFile.background_save_in_flight():
+        return
+    for data_file in list(_data_files.values()):
+        if data_file.has_unsaved_changes():
+            try:
+                _start_background_save(data_file)
+            except Exception as save_error:
+                print(f"[Error] Autosave failed: {save_error}")
+            return
+
+# Merge what other sessions saved since the last look
+def refresh_data_from_file(address_book: AdressBook, notebook: Notebook, file_path: str = FILE_PATH) -> int:
+    """
+    Applies changes other sessions saved to the file into the loaded books and
+    returns how many records changed (0 when the file is untouched: one stat call).
+    """
+    data_file = _data_files.get(file_path)
+    if data_file is None or not data_file.tracks(address_book, notebook):
+        return 0
+    try:
+        return data_file.refresh()
+    except Exception as e:
+        print(f"[Warning] Error reloading data file: {e}. Keeping the data in memory.")
+        return 0
+
+# Stop tracking books loaded from a file (e.g. an evicted profile)
+def close_data_file(address_book: AdressBook, notebook: Notebook, file_path: str = FILE_PATH):
+    """
+    Saves edits a failed autosave left behind and the indexes when the side
+    file is stale, then forgets the file so the books can be freed.
+    Propagates save errors (the books stay tracked).
+    """
+    data_file = _data_files.get(file_path)
+    if data_file is None or not data_file.tracks(address_book, notebook):
+        return
+    try:
+        data_file.poll_background_save(wait=True)
+    except storage.BackgroundSaveError as e:
+        print(f"[Error] Background save of '{file_path}' failed: {e}. Saving in the foreground.")
+    if data_file.has_unsaved_changes():
+        data_file.save(address_book, notebook)
+    if data_file.generation and not data_file.indexes_current():
+        try:
+            _write_indexes(data_file, data_file.generation, address_book, notebook)
+        except Exception as e:
+            print(f"[Warning] Could not save the indexes: {e}. They will be rebuilt on the next start.")
+    del _data_files[file_path]
 
 
 if __name__ == "__main__":
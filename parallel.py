@@ -0,0 +1,97 @@
+# Parallel scan file
+# Splits a full scan of a large record list across forked worker processes.
+# Used by the model whenever no index can narrow a search (short terms, regex),
+# and by storage to encode the shards of a full save.
+#
+# The records are never pickled: the list and the function are stored in a
+# module global right before the pool forks, so every worker reads its chunk from
+# the inherited copy-on-write snapshot and only sends back its (small) result.
+# That is also why each call forks its own pool: a long-lived pool would hold an
+# old snapshot and need the records pickled over to it.
+#
+# A fork copies only the calling thread: a lock another thread holds at that
+# moment stays locked forever in the child. While any other thread runs (such as
+# the model's index rebuild), scans stay serial instead of forking.
+
+import multiprocessing as mp
+import os
+import threading
+
+SCAN_WORKERS_ENV   = "CLI_P_SCAN_WORKERS" # Overrides the worker count (1 disables parallel scans)
+PARALLEL_THRESHOLD = 50_000               # Records below this are scanned in-process (pool start-up costs ~ms)
+CHUNKS_PER_WORKER  = 4                    # Smaller chunks even out workers that hit slow records
+
+_job: tuple[list, callable] | None = None # (records, function) visible to forked workers
+_reported_values: set[str] = set()        # Invalid SCAN_WORKERS_ENV values already warned about
+
+# ================ Worker Side ================
+def _scan_chunk(start: int, stop: int) -> list[int]:
+    records, matches = _job
+    return [position for position in range(start, stop) if matches(records[position])]
+
+def _map_slice(start: int, stop: int):
+    records, func = _job
+    return func(records[start:stop])
+
+# ================ Public API ================
+def worker_count(environ=os.environ) -> int:
+    configured = environ.get(SCAN_WORKERS_ENV)
+    if not configured:
+        return os.cpu_count() or 1
+    try:
+        return max(int(configured), 1)
+    except ValueError: # A typo must not break every search
+        if configured not in _reported_values: # Read by every scan: warn once per value
+            _reported_values.add(configured)
+            print(f"[Warning] {SCAN_WORKERS_ENV}={configured!r} is not a number; using one worker per CPU.")
+        return os.cpu_count() or 1
+
+def can_fork() -> bool:
+    return "fork" in mp.get_all_start_methods()
+
+def fork_is_safe() -> bool:
+    """True when this is the only running thread, so a forked child inherits no lock held elsewhere."""
+    return threading.active_count() == 1
+
+def scan(records: list, matches: callable, threshold: int | None = None) -> list:
+    """
+    Returns [record for record in records if matches(record)] in the original order.
+    Lists of at least `threshold` records are split into chunks scanned by forked
+    workers; without fork support (Windows), with one worker or while other threads
+    run the scan stays serial.
+    """
+    workers = worker_count()
+    threshold = PARALLEL_THRESHOLD if threshold is None else threshold
+    if len(records) < threshold or workers < 2 or not can_fork() or not fork_is_safe():
+        return [record for record in records if matches(record)]
+
+    global _job
+    chunk = -(-len(records) // (workers * CHUNKS_PER_WORKER)) # ceil
+    bounds = [(start, min(start + chunk, len(records))) for start in range(0, len(records), chunk)]
+    _job = (records, matches)
+    try:
+        with mp.get_context("fork").Pool(workers) as pool:
+            positions = pool.starmap(_scan_chunk, bounds)
+    finally:
+        _job = None
+    return [records[position] for chunk_positions in positions for position in chunk_positions]
+
+def map_slices(records: list, bounds: list[tuple[int, int]], func: callable, threshold: int | None = None) -> list:
+    """
+    Returns [func(records[start:stop]) for start, stop in bounds]. When the
+    bounds cover at least `threshold` records, the slices are spread over forked
+    workers (their results are pickled back, so func should return compact data).
+    """
+    workers = worker_count()
+    threshold = PARALLEL_THRESHOLD if threshold is None else threshold
+    if (sum(stop - start for start, stop in bounds) < threshold or len(bounds) < 2 or workers < 2
+            or not can_fork() or not fork_is_safe()):
+        return [func(records[start:stop]) for start, stop in bounds]
+
+    global _job
+    _job = (records, func)
+    try:
+        with mp.get_context("fork").Pool(min(workers, len(bounds))) as pool:
+            return pool.starmap(_map_slice, bounds)
+    finally:
+        _job = None
@@ -0,0 +1,229 @@
+# Profiler file
+# Opt-in latency instrumentation for the commands dispatched by the controller.
+# Nothing is wrapped until enable() is called, so a normal run pays only for
+# one no-op context manager per command.
+
+import cProfile
+import heapq
+import json
+import os
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+PROFILE_ENV          = "CLI_P_PROFILE"           # Any non-empty value enables profiling
+PROFILE_OUT_ENV      = "CLI_P_PROFILE_OUT"       # Path for the JSON report
+PROFILE_CPROFILE_ENV = "CLI_P_PROFILE_CPROFILE"  # Keep cProfile stats for the N slowest commands
+
+CATEGORIES  = ("wall", "model", "render", "autosave") # Reported per command
+PERCENTILES = (50, 95, 99)
+
+enabled: bool = False
+out_path: str | None = None
+cprofile_top: int = 0
+
+_NULL_CONTEXT = nullcontext()
+_stats: dict[str, dict[str, "LatencyHistogram"]] = {} # label -> category -> histogram
+_frames: list["_Frame"] = []                           # Stack of active timed calls
+_current: "_CommandTimer | None" = None
+_slowest: list[tuple[float, int, str, cProfile.Profile]] = [] # Min-heap of the N slowest commands
+_sequence: int = 0
+
+# ================ HDR-style Histogram ================
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations in microseconds (HDR-histogram layout).
+    Values below 128us are exact; above that every power of two is split into
+    64 linear sub-buckets, so any reported percentile is within ~1.5%.
+    """
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKET_HALF = 1 << (SUB_BUCKET_BITS - 1)
+
+    def __init__(self):
+        self.counts : dict[int, int] = {}
+        self.total  : int = 0
+        self.max_us : int = 0
+
+    @classmethod
+    def _bucket_index(cls, value: int) -> int:
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return shift * cls.SUB_BUCKET_HALF + (value >> shift)
+
+    @classmethod
+    def _bucket_value(cls, index: int) -> float:
+        """Returns the midpoint of a bucket in microseconds."""
+        if index < 2 * cls.SUB_BUCKET_HALF:
+            return float(index)
+        shift = index // cls.SUB_BUCKET_HALF - 1
+        lower = (index - shift * cls.SUB_BUCKET_HALF) << shift
+        return lower + ((1 << shift) - 1) / 2
+
+    def record(self, seconds: float):
+        value = max(int(seconds * 1_000_000), 0)
+        index = self._bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.max_us = max(self.max_us, value)
+
+    def percentile(self, percent: float) -> float:
+        """Returns the value (in microseconds) at the given percentile."""
+        if not self.total:
+            return 0.0
+        rank = max(1, -(-self.total * percent // 100)) # ceil without floats
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._bucket_value(index), float(self.max_us))
+        return float(self.max_us)
+
+# ================ Timing Frames ================
+class _Frame:
+    __slots__ = ("category", "start", "child")
+
+    def __init__(self, category: str):
+        self.category = category
+        self.start    = time.perf_counter()
+        self.child    = 0.0 # Time spent in nested timed calls
+
+class _CommandTimer:
+    """Context manager that times one dispatched command."""
+    def __init__(self, label: str):
+        self.label   = label
+        self.totals  : dict[str, float] = dict.fromkeys(CATEGORIES, 0.0)
+        self.input   = 0.0 # Time spent waiting for the user, excluded from wall time
+        self.profile : cProfile.Profile | None = cProfile.Profile() if cprofile_top > 0 else None
+
+    def __enter__(self):
+        global _current
+        _current = self
+        self.start = time.perf_counter()
+        if self.profile:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _current, _sequence
+        if self.profile:
+            self.profile.disable()
+        _current = None
+        self.totals["wall"] = max(time.perf_counter() - self.start - self.input, 0.0)
+
+        histograms = _stats.setdefault(self.label, {c: LatencyHistogram() for c in CATEGORIES})
+        for category, seconds in self.totals.items():
+            histograms[category].record(seconds)
+
+        if self.profile:
+            _sequence += 1
+            entry = (self.totals["wall"], _sequence, self.label, self.profile)
+            if len(_slowest) < cprofile_top:
+                heapq.heappush(_slowest, entry)
+            elif entry > _slowest[0]:
+                heapq.heapreplace(_slowest, entry)
+        return False
+
+def _timed(category: str, func):
+    """Wraps func so its exclusive time is charged to category of the current command."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current is None:
+            return func(*args, **kwargs)
+        frame = _Frame(category)
+        _frames.append(frame)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _frames.pop()
+            elapsed = time.perf_counter() - frame.start
+            if _frames:
+                _frames[-1].child += elapsed
+            command = _current
+            if command is not None:
+                if category == "input":
+                    command.input += elapsed
+                else:
+                    command.totals[category] += elapsed - frame.child
+    wrapper.__profiled__ = True
+    return wrapper
+
+def _wrap_attribute(owner, name: str, category: str):
+    func = getattr(owner, name)
+    if callable(func) and not getattr(func, "__profiled__", False):
+        setattr(owner, name, _timed(category, func))
+
+# ================ Public API ================
+def command(label: str | None):
+    """Returns the context manager the controller wraps each dispatched command in."""
+    if not enabled:
+        return _NULL_CONTEXT
+    return _CommandTimer(label or "<empty>")
+
+def _cprofile_top_from_env(environ) -> int:
+    configured = environ.get(PROFILE_CPROFILE_ENV) or "0"
+    try:
+        return max(int(configured), 0)
+    except ValueError: # A typo must not stop the app from starting
+        print(f"[Warning] {PROFILE_CPROFILE_ENV}={configured!r} is not a number; cProfile stays off.")
+        return 0
+
+def configure_from_env(environ=os.environ) -> dict:
+    """Reads the profiling options from the environment (used when no CLI flag is given)."""
+    return {
+        "enable"       : bool(environ.get(PROFILE_ENV)),
+        "out_path"     : environ.get(PROFILE_OUT_ENV) or None,
+        "cprofile_top" : _cprofile_top_from_env(environ),
+    }
+
+def enable(model_module, view_module, out: str | None = None, cprofile_n: int = 0):
+    """Wraps model methods, view renderers and the save function with timers."""
+    global enabled, out_path, cprofile_top
+    enabled, out_path, cprofile_top = True, out, max(cprofile_n, 0)
+
+    for cls in (model_module.AdressBook, model_module.Notebook):
+        for name, attr in list(vars(cls).items()):
+            if not name.startswith("_") and callable(attr):
+                _wrap_attribute(cls, name, "model")
+    _wrap_attribute(model_module, "save_data_to_file", "autosave")
+
+    for name in dir(view_module):
+        if name.startswith("display_"):
+            _wrap_attribute(view_module, name, "render")
+    _wrap_attribute(view_module, "get_input", "input")
+    _wrap_attribute(view_module, "get_confirmation", "input")
+
+def build_report() -> dict:
+    """Returns {label: {"count": n, category: {"p50": ms, ...}}} for every command seen."""
+    report = {}
+    for label, histograms in sorted(_stats.items()):
+        row = {"count": histograms["wall"].total}
+        for category in CATEGORIES:
+            histogram = histograms[category]
+            row[category] = {f"p{p}": histogram.percentile(p) / 1000 for p in PERCENTILES}
+            row[category]["max"] = histogram.max_us / 1000
+        report[label] = row
+    return report
+
+def dump_slowest_profiles(directory: str = ".") -> list[tuple[str, float, str]]:
+    """Writes the cProfile stats of the slowest commands, returns (label, wall_ms, path) rows."""
+    written = []
+    for rank, (wall, _, label, profile) in enumerate(sorted(_slowest, reverse=True), start=1):
+        path = os.path.join(directory, f"profile_slowest_{rank}.prof")
+        profile.dump_stats(path)
+        written.append((label, wall * 1000, path))
+    return written
+
+def finish(view_module):
+    """Prints the report (and dumps it to out_path / .prof files if configured)."""
+    if not enabled:
+        return
+    report = build_report()
+    view_module.display_profile_report(report)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        view_module.display_info("profile_report_saved", path=out_path)
+    if cprofile_top:
+        directory = os.path.dirname(out_path) if out_path else "."
+        view_module.display_slowest_profiles(dump_slowest_profiles(directory or "."))
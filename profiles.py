@@ -0,0 +1,118 @@
+# Profiles file
+# Several independent address book + notebook pairs ("profiles", e.g. one per
+# team) in one process. The default profile keeps using model.FILE_PATH; every
+# other profile lives in PROFILE_DIR/<name>.pkl.
+#
+# Books are loaded on first use and kept in a small LRU: switching back to a
+# recent profile is free, and the least recently used one is flushed and
+# dropped once the cache is full. Cross-profile search never fills the cache:
+# profiles that are not loaded are read one at a time and released.
+
+import os
+import re
+from collections import OrderedDict
+
+import model as m
+import query
+
+DEFAULT_PROFILE    = "default"
+PROFILE_DIR        = "profiles"
+PROFILE_SUFFIX     = ".pkl"
+PROFILE_CACHE_ENV  = "CLI_P_PROFILE_CACHE" # Overrides how many profiles stay loaded
+DEFAULT_CACHE_SIZE = 4
+PROFILE_NAME_REGEX = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+# ================ Names and Files ================
+def validate_name(name: str) -> str:
+    if not PROFILE_NAME_REGEX.match(name):
+        raise m.ProfileError("invalid_profile_name", name=name)
+    return name
+
+def profile_path(name: str) -> str:
+    if name == DEFAULT_PROFILE:
+        return m.FILE_PATH
+    return os.path.join(PROFILE_DIR, name + PROFILE_SUFFIX)
+
+def list_profiles() -> list[str]:
+    """The default profile, then every saved profile by name."""
+    try:
+        files = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        files = []
+    names = (f[:-len(PROFILE_SUFFIX)] for f in files if f.endswith(PROFILE_SUFFIX))
+    return [DEFAULT_PROFILE, *sorted(n for n in names if n != DEFAULT_PROFILE and PROFILE_NAME_REGEX.match(n))]
+
+def cache_size_from_env(environ=os.environ) -> int:
+    configured = environ.get(PROFILE_CACHE_ENV)
+    if not configured:
+        return DEFAULT_CACHE_SIZE
+    try:
+        return max(int(configured), 1)
+    except ValueError:
+        print(f"[Warning] {PROFILE_CACHE_ENV}={configured!r} is not a number; keeping {DEFAULT_CACHE_SIZE} profiles loaded.")
+        return DEFAULT_CACHE_SIZE
+
+# ================ Profile Cache ================
+class ProfileCache:
+    """Loaded profiles, most recently used last; holds at most `capacity` of them."""
+    def __init__(self, capacity: int | None = None):
+        self.capacity = capacity if capacity is not None else cache_size_from_env()
+        self._books   : OrderedDict[str, tuple[m.AdressBook, m.Notebook]] = OrderedDict()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._books
+
+    def loaded(self) -> list[str]:
+        return list(self._books)
+
+    def peek(self, name: str) -> tuple[m.AdressBook, m.Notebook] | None:
+        """Books of a loaded profile, without touching the LRU order."""
+        return self._books.get(name)
+
+    def get(self, name: str) -> tuple[m.AdressBook, m.Notebook]:
+        """Books of the profile: cached ones are refreshed from disk, others loaded (evicting the oldest)."""
+        validate_name(name)
+        books = self._books.get(name)
+        if books is not None:
+            self._books.move_to_end(name)
+            m.refresh_data_from_file(*books, profile_path(name))
+            return books
+        if name != DEFAULT_PROFILE:
+            os.makedirs(PROFILE_DIR, exist_ok=True) # The first autosave creates the file
+        books = self._books[name] = m.load_data_from_file(profile_path(name))
+        self._evict()
+        return books
+
+    def _evict(self):
+        for name in list(self._books)[:-1]: # Never the profile just used
+            if len(self._books) <= self.capacity:
+                break
+            try:
+                m.close_data_file(*self._books[name], profile_path(name))
+            except Exception as save_error: # Keep the books rather than lose unsaved edits
+                print(f"[Error] Could not flush profile '{name}': {save_error}")
+                continue
+            del self._books[name]
+
+    def close_all(self):
+        """Flushes and drops every loaded profile (on exit)."""
+        for name in list(self._books):
+            try:
+                m.close_data_file(*self._books[name], profile_path(name))
+            except Exception as save_error:
+                print(f"[Error] Could not flush profile '{name}': {save_error}")
+        self._books.clear()
+
+# ================ Cross-Profile Search ================
+def search_profiles(cache: ProfileCache, term: str):
+    """
+    Yields (profile, hits) for every profile with matches, one profile at a
+    time: loaded profiles are searched in place, the others are read detached
+    and released before the next one is read.
+    """
+    for name in list_profiles():
+        books = cache.peek(name) or m.read_data_from_file(profile_path(name))
+        hits = query.search_all(*books, term)
+        del books # Detached books are freed here; the hits keep only their records
+        if hits:
+            yield name, hits
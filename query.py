@@ -0,0 +1,462 @@
+# Query file
+# Small structured query language for 'find' with an index-aware planner
+#
+#   Notes:    tag:work title:plan "exact phrase" -tag:old content:budget
+#   Contacts: name:ivan phone:067* phone:*4567 email:corp.ua birthday:<30d birthday:14.02
+#
+# Bare words and "quoted phrases" match any searchable field. A leading '-'
+# negates a term. All terms must match (AND).
+# The planner asks every positive term for the size of its index lookup and
+# drives the query from the most selective one; the remaining terms are only
+# checked on those candidates. Without any usable index the store is scanned once.
+
+import re
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from operator import attrgetter
+
+import events as ev
+import indexes as ix
+import model as m
+import parallel
+import snapshots as snap
+
+TOKEN_REGEX    = re.compile(r'(-?)(?:([a-zA-Z]+):)?(?:"([^"]*)"|(\S+))')
+BIRTHDAY_RANGE = re.compile(r"^<(\d{1,3})d$")        # birthday:<30d  (today .. today + 30 days)
+BIRTHDAY_DAY   = re.compile(r"^(\d{1,2})\.(\d{1,2})$") # birthday:14.02 (day.month)
+
+# ================ Predicates ================
+class Predicate(ABC):
+    """One query term. Subclasses know their index (if any) and how to verify an item."""
+    def __init__(self, value: str, negated: bool = False):
+        self.value   = value.lower()
+        self.negated = negated
+
+    def estimate(self, book) -> int | None:
+        """Size of the index lookup for this term, None when no index applies."""
+        return None
+
+    @abstractmethod
+    def candidates(self, book) -> set[int]:
+        """Ids that may match (a superset is fine, every term is verified afterwards)."""
+
+    @abstractmethod
+    def matches(self, item) -> bool:
+        """Whether the item satisfies the term (negation is applied by the caller)."""
+
+    def describe(self) -> str:
+        return f"{'-' if self.negated else ''}{type(self).__name__}({self.value!r})"
+
+class _GramsPredicate(Predicate):
+    """Substring term backed by one or more trigram indexes of the book."""
+    index_names: tuple[str, ...] = ()
+
+    def _indexes(self, book):
+        return [getattr(book, name) for name in self.index_names]
+
+    def estimate(self, book) -> int | None:
+        estimates = [index.estimate(self.value) for index in self._indexes(book)]
+        return None if not estimates or None in estimates else sum(estimates)
+
+    def candidates(self, book) -> set[int]:
+        return set().union(*(index.candidates(self.value) for index in self._indexes(book)))
+
+# --- Note terms ---
+class NoteTitle(_GramsPredicate):
+    index_names = ("_title_grams",)
+
+    def matches(self, note) -> bool:
+        return self.value in note.title.lower()
+
+class NoteContent(_GramsPredicate):
+    index_names = ("_content_grams",)
+
+    def matches(self, note) -> bool:
+        return self.value in m.Notebook._content_text(note)
+
+class NoteText(_GramsPredicate):
+    """Bare word or phrase: title, content or any tag (same fields as before the query syntax)."""
+    index_names = ("_title_grams", "_content_grams")
+
+    def estimate(self, book) -> int | None:
+        estimate = super().estimate(book)
+        return None if estimate is None else estimate + len(book._tag_ids(self.value))
+
+    def candidates(self, book) -> set[int]:
+        return super().candidates(book) | book._tag_ids(self.value)
+
+    def matches(self, note) -> bool:
+        return m.Notebook._note_matches(note, self.value)
+
+class NoteTag(Predicate):
+    """tag:work is an exact tag, tag:proj* matches tags starting with 'proj'."""
+    def _tags(self, book) -> list[str]:
+        if self.value.endswith("*"):
+            prefix = self.value[:-1]
+            return [tag for tag in book._tag_index if tag.startswith(prefix)]
+        return [self.value] if self.value in book._tag_index else []
+
+    def estimate(self, book) -> int:
+        return sum(len(book._tag_index[tag]) for tag in self._tags(book))
+
+    def candidates(self, book) -> set[int]:
+        return set().union(*(book._tag_index[tag] for tag in self._tags(book)))
+
+    def matches(self, note) -> bool:
+        if self.value.endswith("*"):
+            return any(tag.startswith(self.value[:-1]) for tag in note.tags)
+        return self.value in note.tags
+
+# --- Contact terms ---
+class ContactText(_GramsPredicate):
+    """Bare word or phrase: name, phones or emails (like find_contacts)."""
+    index_names = ("_text_grams",)
+
+    def matches(self, contact) -> bool:
+        return any(self.value in field for field in m.AdressBook._contact_search_fields(contact))
+
+class ContactName(_GramsPredicate):
+    index_names = ("_text_grams",) # Names are part of the indexed contact text
+
+    def matches(self, contact) -> bool:
+        return self.value in contact.name.lower()
+
+class ContactEmail(_GramsPredicate):
+    index_names = ("_text_grams",)
+
+    def matches(self, contact) -> bool:
+        return any(self.value in email.lower() for email in contact.emails)
+
+class ContactPhone(_GramsPredicate):
+    """phone:067* is a prefix, phone:*4567 a suffix (digit tries), anything else a substring."""
+    index_names = ("_text_grams",)
+
+    def __init__(self, value: str, negated: bool = False):
+        super().__init__(value, negated)
+        self.mode = "prefix" if value.endswith("*") else "suffix" if value.startswith("*") else "substring"
+        self.digits = value.strip("*")
+
+    def estimate(self, book) -> int | None:
+        if self.mode == "prefix":
+            return book._phone_prefix.count_prefix(self.digits)
+        if self.mode == "suffix":
+            return book._phone_suffix.count_prefix(self.digits[::-1])
+        return super().estimate(book)
+
+    def candidates(self, book) -> set[int]:
+        if self.mode == "prefix":
+            return book._phone_prefix.prefix(self.digits)
+        if self.mode == "suffix":
+            return book._phone_suffix.prefix(self.digits[::-1])
+        return super().candidates(book)
+
+    def matches(self, contact) -> bool:
+        if self.mode == "prefix":
+            return any(phone.startswith(self.digits) for phone in contact.phones)
+        if self.mode == "suffix":
+            return any(phone.endswith(self.digits) for phone in contact.phones)
+        return any(self.digits in phone for phone in contact.phones)
+
+class ContactBirthday(Predicate):
+    """birthday:<30d (within the next 30 days, today included) or birthday:14.02 (that day)."""
+    def __init__(self, value: str, negated: bool = False):
+        super().__init__(value, negated)
+        range_match, day_match = BIRTHDAY_RANGE.match(self.value), BIRTHDAY_DAY.match(self.value)
+        if range_match:
+            today = date.today()
+            window = (today + timedelta(days=offset) for offset in range(int(range_match.group(1)) + 1))
+            self.days = {(day.month, day.day) for day in window}
+        elif day_match:
+            day, month = int(day_match.group(1)), int(day_match.group(2))
+            try:
+                date(2000, month, day) # Leap year, so 29.02 is accepted
+            except ValueError:
+                raise m.QueryError("invalid_query_value", term=f"birthday:{value}")
+            self.days = {(month, day)}
+        else:
+            raise m.QueryError("invalid_query_value", term=f"birthday:{value}")
+
+    def estimate(self, book) -> int:
+        return sum(len(book._birthdays.get(day, ())) for day in self.days)
+
+    def candidates(self, book) -> set[int]:
+        return set().union(*(book._birthdays.get(day, set()) for day in self.days))
+
+    def matches(self, contact) -> bool:
+        return contact.birthday is not None and (contact.birthday.month, contact.birthday.day) in self.days
+
+NOTE_FIELDS    = {"": NoteText, "title": NoteTitle, "content": NoteContent, "tag": NoteTag}
+CONTACT_FIELDS = {"": ContactText, "name": ContactName, "phone": ContactPhone,
+                  "email": ContactEmail, "birthday": ContactBirthday}
+
+# ================ Parsing ================
+def parse(query: str, fields: dict) -> list[Predicate]:
+    """Splits a query into predicates. Unknown 'field:' prefixes are searched as plain text."""
+    predicates = []
+    for match in TOKEN_REGEX.finditer(query):
+        negated, field, quoted, word = match.groups()
+        field = (field or "").lower()
+        value = quoted if quoted is not None else word
+        if field not in fields:
+            value = match.group(0)[len(negated):] if not quoted else value
+            field = ""
+        if value:
+            predicates.append(fields[field](value, negated=bool(negated)))
+    return predicates
+
+# ================ Planner ================
+class QueryPlan:
+    """Driver term (served by an index) plus the terms verified on its candidates."""
+    def __init__(self, predicates: list[Predicate], book):
+        self.predicates = predicates
+        self.driver: Predicate | None = None
+        self.estimate: int | None = None
+        for predicate in predicates:
+            if predicate.negated:
+                continue # "not X" can not narrow the candidates
+            estimate = predicate.estimate(book)
+            if estimate is not None and (self.estimate is None or estimate < self.estimate):
+                self.driver, self.estimate = predicate, estimate
+
+    def explain(self) -> str:
+        terms = ", ".join(p.describe() for p in self.predicates)
+        if self.driver is None:
+            return f"full scan, verify [{terms}]"
+        return f"index {self.driver.describe()} (~{self.estimate} candidates), verify [{terms}]"
+
+    def items(self, book) -> list:
+        """The records to verify, read from the book's current snapshot (all of them without a driver)."""
+        return book.snapshot().select(None if self.driver is None else self.driver.candidates(book))
+
+    def execute(self, book) -> list:
+        return parallel.scan(self.items(book), lambda item: all(p.matches(item) != p.negated for p in self.predicates))
+
+def plan_notes(notebook: m.Notebook, query: str) -> QueryPlan:
+    return QueryPlan(parse(query, NOTE_FIELDS), notebook)
+
+def plan_contacts(address_book: m.AdressBook, query: str) -> QueryPlan:
+    return QueryPlan(parse(query, CONTACT_FIELDS), address_book)
+
+def search_notes(notebook: m.Notebook, query: str) -> list[snap.NoteView]:
+    return plan_notes(notebook, query).execute(notebook)
+
+def search_contacts(address_book: m.AdressBook, query: str) -> list[snap.ContactView]:
+    return plan_contacts(address_book, query).execute(address_book)
+
+# ================ Unified Search ================
+# 'search <term>' looks through contacts and notes at once, best matches first.
+# The command reads a SearchIndex: one TermIndex over the searched fields of
+# both books, kept up to date from both change feeds, so each word of the term
+# is one lookup of the postings of the words containing it, whichever book they
+# come from. Only terms spanning a word break (ukr.net, "release plan") are
+# checked on the text, and only for the items holding all of their words.
+# search_all ranks the same way without an index, for books searched once
+# (other profiles): one query plan per book, then each candidate is verified.
+
+TIE = ix.TermIndex.TIE
+
+# Field weights (name/title 3, tag/phone/email 2, content 1) multiply the match
+# quality. The tie code of a field is its position in FIELD_NAMES: on equal
+# scores the later field is reported.
+FIELD_NAMES = {"contact": ("email", "phone", "name"), "note": ("content", "tag", "title")}
+KIND_BITS   = {"contact": 0, "note": 1} # Item key in the shared TermIndex: id << 1 | kind bit
+
+def _item_key(kind: str, item_id: int) -> int:
+    return item_id << 1 | KIND_BITS[kind]
+
+class SearchHit:
+    """One ranked result of the unified search."""
+    __slots__ = ("kind", "item", "score", "field")
+
+    def __init__(self, kind: str, item, score: int, field: str):
+        self.kind  = kind  # "contact" or "note"
+        self.item  = item
+        self.score = score
+        self.field = field # Field with the best match, shown next to the result
+
+    def __repr__(self) -> str:
+        return f"SearchHit({self.kind}, {self.item!r}, score={self.score}, field={self.field})"
+
+def _match_quality(text: str, part: str) -> int:
+    """4 whole field, 3 field start, 2 word start, 1 inside a word, 0 no match (text is lowercased)."""
+    position = text.find(part)
+    if position <= 0:
+        return 0 if position < 0 else 4 if text == part else 3
+    while position > 0:
+        if not text[position - 1].isalnum():
+            return 2
+        position = text.find(part, position + 1)
+    return 1
+
+def _contact_fields(contact: m.Contact) -> list[tuple[int, int, str]]:
+    fields = [(3, 2, contact.name.lower())]
+    fields += [(2, 1, phone) for phone in contact.phones]
+    fields += [(2, 0, email.lower()) for email in contact.emails]
+    return fields
+
+def _note_fields(note: m.Note) -> list[tuple[int, int, str]]:
+    fields = [(3, 2, note.title.lower())]
+    fields += [(2, 1, tag) for tag in note.tags]
+    fields.append((1, 0, m.Notebook._content_text(note)))
+    return fields
+
+SEARCHED_FIELDS = {"contact": _contact_fields, "note": _note_fields}
+
+def _best_rank(texts: list[tuple[int, int, str]], part: str) -> int:
+    """Best weight x quality x TIE + tie code of part across the fields, 0 when it matches none."""
+    best = 0
+    for weight, code, text in texts:
+        if weight * 4 * TIE + code > best: # 4 is the best possible quality
+            quality = _match_quality(text, part)
+            if quality:
+                best = max(best, weight * quality * TIE + code)
+    return best
+
+def _rank(kind: str, records: list, parts: list[tuple[str, bool]], indexed: list[dict | None]) -> list[SearchHit]:
+    """
+    Verifies and scores the records in one pass: every positive term adds its
+    best field rank (no match drops the record), a negated term that matches
+    anywhere drops it. indexed holds the ranks of the terms a TermIndex served
+    (by item key); the others are checked on the record's fields.
+    """
+    fields, names, bit = SEARCHED_FIELDS[kind], FIELD_NAMES[kind], KIND_BITS[kind]
+    terms = [(part, negated, ranks) for (part, negated), ranks in zip(parts, indexed)]
+    hits = []
+    for record in records:
+        key, texts = record.id << 1 | bit, None # _item_key(), inlined: this loop runs per candidate
+        score = best = 0
+        for part, negated, ranks in terms:
+            if ranks is not None:
+                rank = ranks.get(key, 0)
+            else:
+                texts = texts or fields(record)
+                rank = _best_rank(texts, part)
+            if (rank > 0) == negated:
+                break
+            score += rank // TIE
+            if rank > best:
+                best = rank
+        else:
+            hits.append(SearchHit(kind, record, score, names[best % TIE if best else -1]))
+    return hits
+
+def _sorted_hits(hits: list[SearchHit]) -> list[SearchHit]:
+    hits.sort(key=attrgetter("score"), reverse=True) # Stable: contacts before notes, id order within
+    return hits
+
+def _parts(term: str) -> list[tuple[str, bool]]:
+    return [(predicate.value, predicate.negated) for predicate in parse(term, {"": ContactText})]
+
+def search_all(address_book: m.AdressBook, notebook: m.Notebook, term: str) -> list[SearchHit]:
+    """
+    Returns contacts and notes matching every word of term (quoted phrases and
+    -negation work as in 'find'), best matches first, without a SearchIndex:
+    each book's query plan gives the candidates, which are verified and ranked.
+    """
+    parts = _parts(term)
+    unindexed = [None] * len(parts)
+    contacts = QueryPlan(parse(term, {"": ContactText}), address_book).items(address_book)
+    notes = QueryPlan(parse(term, {"": NoteText}), notebook).items(notebook)
+    return _sorted_hits(_rank("contact", contacts, parts, unindexed) + _rank("note", notes, parts, unindexed))
+
+# ================ Search Index ================
+class SearchIndex:
+    """
+    Shared term index of one address book + notebook pair, following both
+    books' change feeds. search() returns the hits search_all would.
+    """
+    def __init__(self, address_book: m.AdressBook, notebook: m.Notebook):
+        self.address_book = address_book
+        self.notebook     = notebook
+        self._terms       : ix.TermIndex = ix.TermIndex()
+        for contact in address_book.contacts:
+            self._terms.add(_item_key("contact", contact.id), _contact_fields(contact))
+        for note in notebook.notes:
+            self._terms.add(_item_key("note", note.id), _note_fields(note))
+        self._unsubscribe = [address_book.events.subscribe(self._on_contact_event),
+                             notebook.events.subscribe(self._on_note_event)]
+
+    def close(self):
+        """Stops following the books (the index is not updated any more)."""
+        for unsubscribe in self._unsubscribe:
+            unsubscribe()
+        self._unsubscribe = []
+
+    def _on_contact_event(self, event: ev.Event):
+        if isinstance(event, ev.ContactChanged) and event.field == "birthday":
+            return # Not a searched field
+        key = _item_key("contact", event.contact.id)
+        self._terms.remove(key)
+        if not isinstance(event, ev.ContactRemoved):
+            self._terms.add(key, _contact_fields(event.contact))
+
+    def _on_note_event(self, event: ev.Event):
+        key = _item_key("note", event.note.id)
+        self._terms.remove(key)
+        if not isinstance(event, ev.NoteRemoved):
+            self._terms.add(key, _note_fields(event.note))
+
+    def _narrow(self, part: str, ranks: dict | None, candidates: set | None) -> set | None:
+        # Items holding part (ranks) or every space-free piece of a phrase (a superset, verified later)
+        if ranks is not None:
+            found = ranks.keys()
+        else:
+            pieces = part.split()
+            if not pieces:
+                return candidates # Only spaces: nothing to look up
+            found = set.intersection(*(self._terms.items(piece) for piece in pieces))
+        return set(found) if candidates is None else candidates.intersection(found)
+
+    def _books(self) -> tuple:
+        return (("contact", self.address_book), ("note", self.notebook))
+
+    @staticmethod
+    def _split_ids(keys) -> tuple[list[int], list[int]]:
+        ids = ([], []) # Indexed by kind bit
+        for key in keys:
+            ids[key & 1].append(key >> 1)
+        return ids
+
+    def _search_indexed(self, parts: list[tuple[str, bool]], indexed: list[dict]) -> list[SearchHit]:
+        # Every term was served by the index: the postings give the scores, records are read for the hits only
+        positive = sorted((ranks for (_, negated), ranks in zip(parts, indexed) if not negated), key=len)
+        scores = positive[0] # Item key -> score x TIE + tie code of its best field
+        if len(positive) > 1:
+            scores = {}
+            for key, rank in positive[0].items():
+                ranks = [rank]
+                for other in positive[1:]:
+                    if key not in other:
+                        break
+                    ranks.append(other[key])
+                else:
+                    scores[key] = sum(rank // TIE for rank in ranks) * TIE + max(ranks) % TIE
+        excluded = set().union(*(ranks.keys() for (_, negated), ranks in zip(parts, indexed) if negated))
+        ids = self._split_ids(key for key in scores if key not in excluded)
+        hits = []
+        for kind, book in self._books():
+            names, bit = FIELD_NAMES[kind], KIND_BITS[kind]
+            for record in book.snapshot().select(ids[bit]):
+                value = scores[record.id << 1 | bit]
+                hits.append(SearchHit(kind, record, value // TIE, names[value % TIE]))
+        return _sorted_hits(hits)
+
+    def search(self, term: str) -> list[SearchHit]:
+        """Contacts and notes matching every word of term, best matches first (see search_all)."""
+        parts = _parts(term)
+        indexed = [self._terms.ranks(part) if self._terms.serves(part) else None for part, _ in parts]
+        if None not in indexed and not all(negated for _, negated in parts):
+            return self._search_indexed(parts, indexed)
+
+        candidates = None
+        for (part, negated), ranks in zip(parts, indexed):
+            if not negated:
+                candidates = self._narrow(part, ranks, candidates)
+        for (part, negated), ranks in zip(parts, indexed):
+            if negated and ranks is not None and candidates is not None:
+                candidates.difference_update(ranks.keys()) # Exact: these items contain the term
+        ids = (None, None) if candidates is None else self._split_ids(candidates)
+        hits = []
+        for kind, book in self._books():
+            hits += _rank(kind, book.snapshot().select(ids[KIND_BITS[kind]]), parts, indexed)
+        return _sorted_hits(hits)
@@ -0,0 +1,250 @@
+# Replay file
+# Records every answer typed at a prompt and feeds recorded (or synthesized)
+# sessions back through the full controller + model + view stack as fast as it
+# can, to load-test the application offline.
+#
+# A session is a JSON-lines file with one {"time", "prompt", "input"} object
+# per answered prompt (time: seconds since the recording started). Recording
+# wraps view.get_input, so the menu commands and the questions asked by the
+# input handlers are captured alike. Replaying swaps view.get_input for the
+# script, runs controller.run() in a scratch directory (on a copy of the data)
+# with its output silenced or captured, and times every dispatched command with
+# the profiler.
+#
+# Usage:
+#   python main.py --record session.jsonl           # record while using the app
+#   python replay.py session.jsonl                   # replay it on an empty scratch file
+#   python replay.py session.jsonl --data data.pkl --repeat 20
+#   python replay.py --synthesize 500 --dataset 10000 --out report.json
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from functools import wraps
+
+import bench
+import controller as c
+import model as m
+import profiler as prof
+import storage
+import view as v
+
+RECORD_ENV     = "CLI_P_RECORD" # Path of the session recording (empty: no recording)
+EXIT_COMMANDS  = {"exit", "quit", "q"}
+EXIT_ATTEMPTS  = 3              # "exit" answers fed after the script ends before the replay is cut short
+SEED           = 2024
+
+# ================ Recording ================
+class Recorder:
+    """Appends one JSON line per answered prompt."""
+    def __init__(self, path: str):
+        self.path  = path
+        self.start = time.perf_counter()
+        open(path, "w", encoding="utf-8").close() # One file per session
+
+    def __call__(self, prompt_key: str, answer: str):
+        record = {"time": round(time.perf_counter() - self.start, 3), "prompt": prompt_key, "input": answer}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def record_path_from_env(environ=os.environ) -> str | None:
+    return environ.get(RECORD_ENV) or None
+
+def start_recording(view_module, path: str) -> Recorder:
+    """Records every answer view_module.get_input returns (get_confirmation asks through it too)."""
+    recorder = Recorder(path)
+    get_input = view_module.get_input
+
+    @wraps(get_input)
+    def recording_get_input(prompt_key: str, path_info: str = "", **prompt_kwargs) -> str:
+        answer = get_input(prompt_key, path_info, **prompt_kwargs)
+        recorder(prompt_key, answer)
+        return answer
+
+    view_module.get_input = recording_get_input
+    return recorder
+
+def load_session(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ================ Synthesized Sessions ================
+def synthesize_session(commands: int, seed: int = SEED) -> list[dict]:
+    """
+    A read-heavy mix of commands as a user would type them: finds, searches,
+    live searches, birthday lookups, and new contacts and notes. 'add'/'find'
+    leave the user in their menu, so each is followed by 'menu'.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    steps = []
+
+    def ask(prompt_key: str, answer: str):
+        steps.append({"time": 0.0, "prompt": prompt_key, "input": answer})
+
+    def name_term() -> str:
+        return rng.choice(bench.FIRST_NAMES if rng.random() < 0.5 else bench.LAST_NAMES)[:rng.randint(3, 8)]
+
+    for i in range(commands):
+        kind = rng.choices(["find contact", "find note", "search", "live", "birthdays", "add contact", "add note"],
+                           weights=[25, 20, 15, 10, 10, 10, 10])[0]
+        if kind == "find contact":
+            ask("command_prompt", "find contact")
+            ask("prompt_enter_search_term", name_term())
+            ask("prompt_find_type", "menu")
+        elif kind == "find note":
+            ask("command_prompt", "find note")
+            ask("prompt_enter_search_term", rng.choice([rng.choice(bench.WORDS), f"tag:{rng.choice(bench.TAGS)}"]))
+            ask("prompt_find_type", "menu")
+        elif kind == "search":
+            ask("command_prompt", f"search {rng.choice([name_term(), rng.choice(bench.WORDS)])}")
+        elif kind == "live":
+            ask("command_prompt", f"live {rng.choice(['contact', 'note'])}")
+            word = rng.choice(bench.FIRST_NAMES + bench.WORDS).lower()
+            for length in range(2, min(len(word), 5) + 1): # Typing a word letter by letter
+                ask("prompt_live_search_term", word[:length])
+            ask("prompt_live_search_term", "")
+        elif kind == "birthdays":
+            ask("command_prompt", "birthdays")
+            ask("prompt_enter_days", str(rng.choice([7, 30, 90, 365])))
+        elif kind == "add contact":
+            name = f"{rng.choice(bench.FIRST_NAMES)} Replay {bench._letters_suffix(i).capitalize()}"
+            ask("command_prompt", "add contact")
+            ask("prompt_enter_name", name)
+            ask("prompt_enter_phones", f"0{rng.choice('5679')}{rng.randint(0, 99_999_999):08d}")
+            ask("prompt_enter_emails", f"replay.{bench._letters_suffix(i)}@mail.com" if rng.random() < 0.5 else "")
+            birthday = today - timedelta(days=rng.randint(365 * 18, 365 * 80))
+            ask("prompt_enter_birthday", birthday.strftime("%d.%m.%Y") if rng.random() < 0.7 else "")
+            ask("prompt_add_type", "menu")
+        else:
+            ask("command_prompt", "add note")
+            ask("prompt_enter_title", f"{rng.choice(bench.WORDS).capitalize()} replay #{i}")
+            ask("prompt_enter_content", " ".join(rng.choice(bench.WORDS) for _ in range(rng.randint(5, 60))))
+            ask("prompt_enter_tags", " ".join(rng.sample(bench.TAGS, rng.randint(0, 3))))
+            ask("prompt_add_type", "menu")
+    return steps
+
+def repeat_session(steps: list[dict], times: int) -> list[dict]:
+    """The session `times` times in a row (its final exit, if any, only at the very end)."""
+    body, ending = list(steps), {"time": 0.0, "prompt": "command_prompt", "input": "exit"}
+    if body and body[-1]["input"].lower() in EXIT_COMMANDS:
+        ending = body.pop()
+    return body * times + [ending]
+
+# ================ Replaying ================
+class ReplayFinished(Exception):
+    """The script ran out and the session still did not exit."""
+
+class ScriptedInput:
+    """Stands in for view.get_input: answers every prompt with the next recorded answer."""
+    def __init__(self, steps: list[dict]):
+        self._steps     = iter(steps)
+        self.answered   : int = 0
+        self.mismatches : int = 0   # Prompts that differ from the recorded one (the session diverged)
+        self.started    : float | None = None # Time of the first prompt: the initial load is not a command
+        self._extra     : int = 0
+
+    def __call__(self, prompt_key: str, path_info: str = "", **prompt_kwargs) -> str:
+        if self.started is None:
+            self.started = time.perf_counter()
+        step = next(self._steps, None)
+        if step is None:
+            self._extra += 1
+            if self._extra > EXIT_ATTEMPTS:
+                raise ReplayFinished()
+            return "exit"
+        self.answered += 1
+        self.mismatches += step["prompt"] != prompt_key
+        return step["input"]
+
+def replay(steps: list[dict], data_path: str | None = None, dataset: int = 0, capture: str | None = None) -> dict:
+    """
+    Runs the session through controller.run() in a scratch directory, on a copy
+    of data_path (or `dataset` synthetic contacts and notes, or nothing).
+    Returns the summary: commands, seconds, commands per second, prompt
+    mismatches and the profiler's per-command latency report.
+    """
+    scratch = tempfile.mkdtemp(prefix="cli-p-replay-")
+    scratch_data = os.path.join(scratch, m.FILE_PATH)
+    if data_path:
+        storage.copy_data_file(data_path, scratch_data)
+    elif dataset:
+        m.save_data_to_file(*bench.build_dataset(dataset, dataset), scratch_data)
+
+    script = ScriptedInput(steps)
+    original_get_input, v.get_input = v.get_input, script
+    prof.enable(m, v) # After the swap: the script's own time is charged to "input", not to the commands
+    cwd = os.getcwd()
+    output = open(capture, "w", encoding="utf-8") if capture else open(os.devnull, "w")
+    try:
+        os.chdir(scratch) # The default profile's data.pkl and the profiles/ directory
+        with output, contextlib.redirect_stdout(output):
+            try:
+                c.run()
+            except ReplayFinished:
+                pass
+        finished = time.perf_counter()
+        m.wait_for_index_rebuilds()
+    finally:
+        v.get_input = original_get_input
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = prof.build_report()
+    commands = sum(row["count"] for row in report.values())
+    seconds = finished - (script.started or finished)
+    return {
+        "commands"           : commands,
+        "answers"            : script.answered,
+        "seconds"            : seconds,
+        "commands_per_second": commands / seconds if seconds else 0.0,
+        "prompt_mismatches"  : script.mismatches,
+        "latency"            : report,
+    }
+
+# ================ Entry Point ================
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded (or synthesized) session and report throughput and latency.")
+    parser.add_argument("session", nargs="?", help="Session recorded with main.py --record.")
+    parser.add_argument("--synthesize", type=int, metavar="N", help="Replay N synthesized commands instead.")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the synthesized session.")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Replay the session this many times in a row (synthesized: that many times more distinct commands).")
+    parser.add_argument("--data", metavar="PATH", help="Start from a copy of this data file (default: empty books).")
+    parser.add_argument("--dataset", type=int, default=0, metavar="N",
+                        help="Without --data, start from N synthetic contacts and N notes.")
+    parser.add_argument("--capture", metavar="PATH", help="Write the application's output to PATH instead of discarding it.")
+    parser.add_argument("--out", metavar="PATH", help="Also dump the summary as JSON to PATH.")
+    args = parser.parse_args(argv)
+    if (args.session is None) == (args.synthesize is None):
+        parser.error("give either a session file or --synthesize N")
+
+    repeat = max(args.repeat, 1)
+    if args.session:
+        steps = repeat_session(load_session(args.session), repeat) # Repeated adds meet the duplicate checks
+    else:
+        steps = repeat_session(synthesize_session(args.synthesize * repeat, args.seed), 1)
+    summary = replay(steps, args.data, args.dataset, args.capture)
+
+    v.display_profile_report(summary["latency"])
+    print(f"{summary['commands']} commands ({summary['answers']} answers) in {summary['seconds']:.3f} s: "
+          f"{summary['commands_per_second']:.1f} commands/s")
+    if summary["prompt_mismatches"]:
+        print(f"Warning: {summary['prompt_mismatches']} answer(s) were given at a different prompt than recorded "
+              "(the data differs from the recording's), so the replay diverged.", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+            f.write("\n")
+        print(f"Summary written to {args.out}.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+# Snapshots file
+# Copy-on-write, versioned read views of the books.
+#
+# A book publishes an immutable Snapshot after every change (driven by its event
+# bus). Readers take the current one in O(1) and may iterate it for as long as
+# they like while writers keep publishing: nothing a reader holds is ever
+# mutated. A new version shares all untouched chunks with the previous one, so
+# publishing costs O(CHUNK + n / CHUNK) instead of a full copy, and versions
+# nobody references any more are freed by the normal reference counting.
+
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from operator import attrgetter
+
+import compression as cz
+
+# Frozen record views (same attribute names as Contact/Note, so the view renders them)
+ContactView = namedtuple("ContactView", ["id", "name", "phones", "emails", "birthday"])
+
+class NoteView(namedtuple("NoteView", ["id", "title", "body", "preview", "content_length", "tags", "created", "modified"])):
+    """Shares the note's packed body: content is decompressed only when read."""
+    __slots__ = ()
+
+    @property
+    def content(self) -> str:
+        return cz.unpack(self.body)
+
+    @property
+    def _body(self) -> str | bytes:
+        return self.body # Same attribute as Note, for code that indexes notes or their views
+
+def contact_view(contact) -> ContactView:
+    return ContactView(contact.id, contact.name, tuple(contact.phones), tuple(contact.emails), contact.birthday)
+
+def note_view(note) -> NoteView:
+    return NoteView(note.id, note.title, note._body, note.preview, note.content_length, tuple(note.tags),
+                    note.created, note.modified)
+
+_record_id = attrgetter("id")
+
+# ================ Persistent List ================
+class PersistentList:
+    """
+    Immutable sequence of records ordered by ascending id, stored as a tuple of
+    chunk tuples. Updates return a new list that reuses every untouched chunk.
+    """
+    CHUNK = 128 # Records per chunk: bounds the copy done by one update
+
+    __slots__ = ("_chunks", "_lasts", "_size")
+
+    def __init__(self, chunks: tuple = (), size: int | None = None):
+        self._chunks : tuple[tuple, ...] = chunks
+        self._lasts  : tuple[int, ...] = tuple(chunk[-1].id for chunk in chunks) # Last id per chunk
+        self._size   : int = sum(map(len, chunks)) if size is None else size
+
+    @classmethod
+    def from_records(cls, records) -> "PersistentList":
+        records = tuple(records)
+        return cls(tuple(records[i:i + cls.CHUNK] for i in range(0, len(records), cls.CHUNK)), len(records))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def _locate(self, record_id: int) -> tuple[int, int] | None:
+        """(chunk index, position in chunk) of record_id, or None."""
+        index = bisect_left(self._lasts, record_id)
+        if index == len(self._chunks):
+            return None
+        chunk = self._chunks[index]
+        position = bisect_left(chunk, record_id, key=_record_id)
+        return (index, position) if position < len(chunk) and chunk[position].id == record_id else None
+
+    def get(self, record_id: int):
+        location = self._locate(record_id)
+        return None if location is None else self._chunks[location[0]][location[1]]
+
+    def select(self, ids) -> list:
+        """The records whose id is in ids, in id order (ids with no record are skipped)."""
+        members = ids if isinstance(ids, (set, frozenset)) else set(ids)
+        wanted, records, start = sorted(members), [], 0
+        for chunk, last in zip(self._chunks, self._lasts):
+            end = bisect_right(wanted, last, start) # wanted[start:end] can only be in this chunk
+            if end - start > len(chunk) // 8: # Dense: one pass over the chunk beats a bisect per id
+                records += [record for record in chunk if record.id in members]
+            else:
+                for record_id in wanted[start:end]:
+                    record = chunk[bisect_left(chunk, record_id, key=_record_id)]
+                    if record.id == record_id:
+                        records.append(record)
+            start = end
+            if start == len(wanted):
+                break
+        return records
+
+    def append(self, record) -> "PersistentList":
+        """Adds a record whose id is larger than every stored id."""
+        chunks = self._chunks
+        if chunks and len(chunks[-1]) < self.CHUNK:
+            chunks = chunks[:-1] + (chunks[-1] + (record,),)
+        else:
+            chunks = chunks + ((record,),)
+        return PersistentList(chunks, self._size + 1)
+
+    def insert(self, record) -> "PersistentList":
+        """
+        Adds a record with a new id at its place in id order (records merged from
+        another session can be older than everything appended since).
+
+        >>> Rec = namedtuple("Rec", ["id"])
+        >>> records = PersistentList.from_records([Rec(0), Rec(2)]).insert(Rec(1))
+        >>> [record.id for record in records], records.get(2)
+        ([0, 1, 2], Rec(id=2))
+        >>> [record.id for record in records.remove(1)], records.remove(1).get(1)
+        ([0, 2], None)
+        """
+        index = bisect_left(self._lasts, record.id)
+        if index == len(self._chunks):
+            return self.append(record)
+        chunk = self._chunks[index]
+        position = bisect_left(chunk, record.id, key=_record_id)
+        new_chunk = chunk[:position] + (record,) + chunk[position:]
+        if len(new_chunk) > self.CHUNK: # Split so one update still copies at most a chunk
+            middle = (new_chunk[:len(new_chunk) // 2], new_chunk[len(new_chunk) // 2:])
+        else:
+            middle = (new_chunk,)
+        return PersistentList(self._chunks[:index] + middle + self._chunks[index + 1:], self._size + 1)
+
+    def replace(self, record) -> "PersistentList":
+        """Swaps the stored record with the same id (inserts it if the id is new)."""
+        location = self._locate(record.id)
+        if location is None:
+            return self.insert(record)
+        index, position = location
+        chunk = self._chunks[index]
+        new_chunk = chunk[:position] + (record,) + chunk[position + 1:]
+        return PersistentList(self._chunks[:index] + (new_chunk,) + self._chunks[index + 1:], self._size)
+
+    def remove(self, record_id: int) -> "PersistentList":
+        location = self._locate(record_id)
+        if location is None:
+            return self
+        index, position = location
+        chunk = self._chunks[index]
+        new_chunk = chunk[:position] + chunk[position + 1:]
+        middle = (new_chunk,) if new_chunk else ()
+        return PersistentList(self._chunks[:index] + middle + self._chunks[index + 1:], self._size - 1)
+
+# ================ Versions ================
+class Snapshot:
+    """One published version of a book: read it freely, it never changes."""
+    __slots__ = ("version", "records")
+
+    def __init__(self, version: int, records: PersistentList):
+        self.version = version
+        self.records = records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def select(self, ids=None) -> list:
+        """The records of ids in id order, or all of them when ids is None (no index narrowed the search)."""
+        return list(self.records) if ids is None else self.records.select(ids)
+
+    def by_id(self, ids) -> dict:
+        """id -> record for ids, for callers that keep an index's own order."""
+        return {record.id: record for record in self.records.select(ids)}
+
+class SnapshotCell:
+    """
+    Holds the current Snapshot of one book. Readers call current() (a single
+    attribute read); the writer replaces it with publish(). The cell only keeps
+    the current version: older ones live exactly as long as a reader holds them.
+    """
+    def __init__(self, snapshot: Snapshot):
+        self._current : Snapshot = snapshot
+
+    def current(self) -> Snapshot:
+        return self._current
+
+    def publish(self, version: int, records: PersistentList) -> Snapshot:
+        self._current = Snapshot(version, records)
+        return self._current
@@ -0,0 +1,699 @@
+# Storage file
+# On-disk format of data.pkl, shared safely by several CLI sessions.
+#
+# Layout: data.pkl is a small manifest (a fixed header with magic, format,
+# generation and directory offset/length, then the pickled directory: the id
+# counters and, per kind, its shards). Records live in shard files in the
+# "data.pkl.shards" directory: shard N of a kind holds the ids in
+# [N * SHARD_IDS, (N + 1) * SHARD_IDS), as a table of three parallel arrays
+# (record ids, versions, blob sizes) followed by one pickled blob per record.
+#
+# Each save bumps the file generation. Only shards with edited records are
+# written again (under a new name carrying the generation, re-pickling just the
+# edited records), stamping those records with the generation; every other shard
+# is shared with the previous manifest. A session that reflects generation G
+# only reads the shards written after G, and only unpickles their records whose
+# version is above G. Full saves encode the shards on forked workers.
+#
+# Saves run under an advisory lock (a ".lock" file next to the data file), first
+# merge whatever another session saved since our last look, then replace the
+# manifest atomically, so readers never need the lock. Shard files only the two
+# latest manifests refer to are kept; a reader that falls further behind retries.
+#
+# The books' indexes are derived data, kept in a ".idx" side file stamped with
+# the generation they were built for; a file with any other stamp is ignored.
+#
+# Background saves (Linux/POSIX, like Redis BGSAVE): the parent takes the lock
+# and merges, then forks; the child writes the file from its copy-on-write image
+# of the books, fsyncs, renames it into place and reports back through a pipe,
+# while the parent keeps serving commands. At most one is in flight per process.
+
+import gc
+import os
+import pickle
+import shutil
+import signal
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import ExitStack
+from itertools import accumulate
+from operator import attrgetter
+
+import parallel
+
+try:
+    import fcntl # POSIX advisory locks
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+MAGIC          = b"CLIPDATA"
+FORMAT_VERSION = 3       # 1: one pickle of (address_book, notebook, contact_counter, note_counter); 2: records inside data.pkl
+HEADER         = struct.Struct("<8sHQQQ") # magic, format, generation, directory offset, directory length
+SHARD_IDS      = 4096    # Ids per shard: a record's shard is id // SHARD_IDS, so records never move between shards
+SHARD_SUFFIX   = ".shards" # Directory of the shard files, next to the data file
+SHARD_HEADER   = struct.Struct("<Q") # Length of the pickled (ids, versions, sizes) table that follows
+READ_RETRIES   = 3       # Lock-free reads retried when a save removed a shard file before we opened it
+PROTOCOL       = pickle.HIGHEST_PROTOCOL
+LOCK_SUFFIX    = ".lock"
+INDEX_SUFFIX   = ".idx"
+INDEX_MAGIC    = b"CLIPINDX"
+INDEX_HEADER   = struct.Struct("<8sHQ") # magic, index layout, generation of the data file
+
+class StorageError(ValueError):
+    """The data file exists but is not in a format this version can read."""
+    pass
+
+class BackgroundSaveError(OSError):
+    """A background save did not complete; its records are dirty again."""
+    pass
+
+_record_id = attrgetter("id")
+
+# Manifest entry: a shard file, its number and the generation that wrote it
+ShardRef = namedtuple("ShardRef", ["file", "number", "generation"])
+
+# A run of record blobs in a buffer: they start at `offset`, in `ids` order
+Section = namedtuple("Section", ["offset", "ids", "versions", "sizes"])
+
+def _starts(section: Section) -> list[int]:
+    """Absolute offset of every blob in the section, plus the section end."""
+    return list(accumulate(section.sizes, initial=section.offset))
+
+def _unpickle(section: Section, data: bytes, positions=None) -> list:
+    """The section's records (all of them, or the ones at positions)."""
+    starts = _starts(section)
+    with memoryview(data) as view:
+        return [pickle.loads(view[starts[p]:starts[p + 1]])
+                for p in (range(len(section.ids)) if positions is None else positions)]
+
+def _encode(records: list) -> list[bytes]:
+    return [pickle.dumps(record, PROTOCOL) for record in records]
+
+def _shard_bounds(stored: list) -> list[tuple[int, int, int]]:
+    """(shard number, start, stop) of every non-empty shard of an id-ordered record list."""
+    bounds, start = [], 0
+    while start < len(stored):
+        number = stored[start].id // SHARD_IDS
+        stop = bisect_left(stored, (number + 1) * SHARD_IDS, lo=start, key=_record_id)
+        bounds.append((number, start, stop))
+        start = stop
+    return bounds
+
+# The process umask, read once at import (os.umask can only be read by setting it)
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+def _copy_mode(temp_path: str, like_path: str):
+    """
+    Gives a mkstemp file (created 0600) the permissions of like_path, or the
+    umask default of a new file when like_path does not exist yet.
+    """
+    try:
+        mode = os.stat(like_path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(temp_path, mode)
+
+def _fsync_directory(directory: str):
+    """Makes the names created or replaced in directory durable (POSIX: Windows cannot open directories)."""
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# ================ Locking ================
+class FileLock:
+    """Exclusive advisory lock held on a side file for the duration of a with block."""
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self._file = open(self.path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1) # Retries for ~10 s, then raises OSError
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is None:
+            return # Handed over
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def hand_over(self):
+        """
+        Closes our descriptor without unlocking (POSIX): a forked child shares
+        the open lock file and keeps the lock until it exits.
+        """
+        self._file.close()
+        self._file = None
+
+# ================ File Format ================
+def _read_directory(f) -> dict | None:
+    """
+    The directory of a data file: format, generation, counters and, per kind,
+    "shards" (format 3) or one "sections" entry (format 2, records inside the
+    data file). None for a format 1 file.
+    """
+    f.seek(0)
+    raw = f.read(HEADER.size)
+    if not raw.startswith(MAGIC):
+        return None
+    if len(raw) < HEADER.size:
+        raise StorageError("truncated header")
+    _, version, generation, offset, length = HEADER.unpack(raw)
+    if version not in (2, FORMAT_VERSION):
+        raise StorageError(f"unsupported format version {version}")
+    f.seek(offset)
+    directory = pickle.loads(f.read(length))
+    directory["format"], directory["generation"] = version, generation
+    if version == 2:
+        directory["sections"] = {kind: Section(*fields) for kind, fields in directory["sections"].items()}
+    else:
+        directory["shards"] = {kind: [ShardRef(*ref) for ref in refs] for kind, refs in directory["shards"].items()}
+    return directory
+
+def _load_legacy(f) -> tuple[dict[str, list], dict[str, int]]:
+    """Reads a format 1 file: (records by kind, id counters by kind)."""
+    f.seek(0)
+    data = pickle.load(f)
+    if not (isinstance(data, tuple) and len(data) == 4):
+        raise StorageError("unexpected data layout")
+    address_book, notebook, contact_counter, note_counter = data
+    return ({"contacts": list(address_book.contacts), "notes": list(notebook.notes)},
+            {"contacts": contact_counter, "notes": note_counter})
+
+# ================ Data File ================
+class DataFile:
+    """
+    One session's view of a data file. Books are duck-typed: book.KIND names the
+    record list attribute ("contacts"/"notes", kept in id order), book.RECORD is
+    the record class (owner of id_counter) and the book implements apply_saved()
+    and reassign_id().
+    """
+    def __init__(self, path: str):
+        self.path        = path
+        self._books      : tuple = ()             # Books whose local edits are tracked (see attach)
+        self._generation : int = 0                # File generation our books reflect
+        self._counters   : dict[str, int] = {}    # Id counters of that generation (ids above are new since)
+        self._dirty      : dict[str, set[int]] = {} # kind -> ids edited here since the last save
+        self._stat       : tuple | None = None    # (mtime_ns, size, inode) at our last look
+        self.index_generation : int = 0           # Generation the index side file was last read or written for
+        self._saving     : dict[str, set[int]] | None = None # Dirty ids handed to the background save in flight
+        self._child      : int = 0                # Its process id
+        self._report_fd  : int = -1               # Read end of the pipe it reports through
+
+    # --- Loading ---
+    def load(self) -> tuple[dict[str, list], dict[str, int]]:
+        """
+        Reads the whole file: returns (records by kind in id order, id counters
+        by kind). Missing file: empty result. Raises StorageError/pickle errors on damage.
+        """
+        for attempt in range(READ_RETRIES):
+            try:
+                return self._load()
+            except FileNotFoundError: # A save removed a shard of the manifest we read: read the new one
+                if attempt == READ_RETRIES - 1:
+                    raise
+
+    def _load(self) -> tuple[dict[str, list], dict[str, int]]:
+        self._generation, self._counters, self._stat = 0, {}, None
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return {}, {}
+        with f:
+            stat = self._fingerprint(f)
+            directory = _read_directory(f)
+            if directory is None:
+                self._stat = stat
+                return _load_legacy(f) # Generation 0: the first save rewrites every record
+            if directory["format"] == 2:
+                f.seek(0)
+                data = f.read(max((section.offset + sum(section.sizes) for section in directory["sections"].values()), default=0))
+                records = {kind: _unpickle(section, data) for kind, section in directory["sections"].items()}
+        if directory["format"] != 2:
+            records = {}
+            with ExitStack() as files:
+                opened = {kind: self._open_shards(files, refs) for kind, refs in directory["shards"].items()}
+                for kind, shard_files in opened.items():
+                    records[kind] = []
+                    for shard_file in shard_files:
+                        records[kind] += _unpickle(*self._read_shard(shard_file))
+        self._generation, self._counters, self._stat = directory["generation"], directory["counters"], stat
+        return records, directory["counters"]
+
+    def _shard_path(self, name: str) -> str:
+        return os.path.join(self.path + SHARD_SUFFIX, name)
+
+    def _open_shards(self, files: ExitStack, refs: list[ShardRef]) -> list:
+        """
+        Opens the shard files before any is read: an open file outlives its
+        removal by a later save, so only these few opens race with other sessions.
+        """
+        return [files.enter_context(open(self._shard_path(ref.file), "rb")) for ref in refs]
+
+    @staticmethod
+    def _read_shard(f) -> tuple[Section, bytes]:
+        """The shard's table (offsets into the returned bytes) and the shard file's bytes."""
+        data = f.read()
+        (length,) = SHARD_HEADER.unpack_from(data)
+        offset = SHARD_HEADER.size + length
+        ids, versions, sizes = pickle.loads(data[SHARD_HEADER.size:offset])
+        return Section(offset, ids, versions, sizes), data
+
+    def attach(self, *books):
+        """Starts tracking the local edits of the books loaded from this file."""
+        self._books = books
+        for book in books:
+            self._dirty[book.KIND] = set()
+            book.events.subscribe(self._mark_dirty(book.KIND), local_only=True)
+
+    @property
+    def generation(self) -> int:
+        """File generation the books reflect (0: nothing saved in format 2 or later yet)."""
+        return self._generation
+
+    @property
+    def books(self) -> tuple:
+        """The attached books."""
+        return self._books
+
+    def tracks(self, *books) -> bool:
+        return len(books) == len(self._books) and all(a is b for a, b in zip(books, self._books))
+
+    def has_unsaved_changes(self) -> bool:
+        return any(self._dirty.values())
+
+    def mark_dirty(self, kind: str, ids):
+        """Saves these records with the next save although no event changed them (e.g. migrated records)."""
+        self._dirty[kind].update(ids)
+
+    def _mark_dirty(self, kind: str) -> callable:
+        dirty = self._dirty[kind]
+        def mark(event):
+            record = getattr(event, "contact", None) or getattr(event, "note", None)
+            dirty.add(record.id)
+        return mark
+
+    @staticmethod
+    def _fingerprint(f) -> tuple:
+        st = os.fstat(f.fileno())
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    # --- Index side file ---
+    def read_indexes(self, layout: int) -> dict | None:
+        """Indexes saved for the loaded generation and this layout, None if missing or stale."""
+        if self._generation == 0:
+            return None
+        try:
+            f = open(self.path + INDEX_SUFFIX, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            raw = f.read(INDEX_HEADER.size)
+            if len(raw) < INDEX_HEADER.size or INDEX_HEADER.unpack(raw) != (INDEX_MAGIC, layout, self._generation):
+                return None
+            indexes = pickle.load(f)
+        self.index_generation = self._generation
+        return indexes
+
+    def write_indexes(self, generation: int, layout: int, indexes: dict):
+        """Replaces the side file with indexes built for `generation` (atomic; safe from any thread)."""
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, layout, generation))
+                pickle.dump(indexes, f, PROTOCOL)
+            _copy_mode(temp_path, self.path) # Readable by whoever may read the data file
+            os.replace(temp_path, self.path + INDEX_SUFFIX)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.index_generation = max(self.index_generation, generation)
+
+    def indexes_current(self) -> bool:
+        return self.index_generation == self._generation
+
+    # --- Incremental reload ---
+    def refresh(self) -> int:
+        """
+        Merges what other sessions saved since our last look into the attached
+        books. Costs one stat() when nothing changed. Returns the number of
+        records added, changed or removed.
+        """
+        if not self._books or self._saving is not None:
+            return 0 # Our own background save is about to replace the file: merge after it
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        if (st.st_mtime_ns, st.st_size, st.st_ino) == self._stat:
+            return 0
+        for attempt in range(READ_RETRIES):
+            try:
+                with open(self.path, "rb") as f:
+                    return self._merge(f)
+            except FileNotFoundError: # The file or one of its shards went away meanwhile: look again
+                if attempt == READ_RETRIES - 1:
+                    raise
+
+    def _merge(self, f) -> int:
+        """Applies the file behind f to the books; records edited here since the last save keep our version."""
+        stat = self._fingerprint(f)
+        directory = _read_directory(f)
+        if directory is None or directory["format"] == 2 or directory["generation"] == self._generation:
+            self._stat = stat
+            return 0 # Older formats are only ever replaced, and an equal generation is our own save
+        # Read everything first: if a shard vanishes meanwhile, the books are left untouched
+        incoming = {}
+        with ExitStack() as files:
+            opened = {}
+            for book in self._books:
+                refs = {ref.number: ref for ref in directory["shards"].get(book.KIND, [])}
+                fresh = [ref for ref in refs.values() if ref.generation > self._generation] # Written since our look
+                opened[book.KIND] = (refs, fresh, self._open_shards(files, fresh))
+            for book in self._books:
+                kind = book.KIND
+                dirty, new_ids = self._dirty[kind], self._counters.get(kind, 0)
+                refs, fresh, shard_files = opened[kind]
+                changed, saved = {}, [] # changed: shard number -> ids it holds now, for the fresh shards
+                for ref, shard_file in zip(fresh, shard_files):
+                    section, data = self._read_shard(shard_file)
+                    changed[ref.number] = set(section.ids)
+                    positions = [position for position, (record_id, version) in enumerate(zip(section.ids, section.versions))
+                                 if version > self._generation and (record_id not in dirty or record_id >= new_ids)]
+                    saved += _unpickle(section, data, positions)
+                incoming[kind] = (refs, changed, saved)
+        merged = 0
+        for book in self._books:
+            kind = book.KIND
+            refs, changed, saved = incoming[kind]
+            stored, dirty = getattr(book, kind), self._dirty[kind]
+            book.RECORD.id_counter = max(book.RECORD.id_counter, directory["counters"].get(kind, 0))
+            with book.events.replay():
+                # Ids we created since our last look that another session saved first: ours move to fresh ids
+                for record_id in sorted(dirty):
+                    if record_id >= self._counters.get(kind, 0) and record_id in changed.get(record_id // SHARD_IDS, ()):
+                        dirty.discard(record_id)
+                        index = bisect_left(stored, record_id, key=_record_id)
+                        if index < len(stored) and stored[index].id == record_id: # Not already deleted here
+                            book.reassign_id(stored[index])
+                            dirty.add(stored[index].id)
+                saved = [record for record in saved if record.id not in dirty]
+                removed = [record.id for record in stored if record.id not in dirty and self._gone(record.id, refs, changed)]
+                book.apply_saved(saved, removed)
+            merged += len(saved) + len(removed)
+        self._generation, self._counters, self._stat = directory["generation"], directory["counters"], stat
+        return merged
+
+    @staticmethod
+    def _gone(record_id: int, refs: dict[int, ShardRef], changed: dict[int, set[int]]) -> bool:
+        """Whether a record we had saved is no longer in the file (shards not written since still hold it)."""
+        number = record_id // SHARD_IDS
+        return number not in refs or (number in changed and record_id not in changed[number])
+
+    # --- Saving ---
+    def save(self, *books):
+        """
+        Writes the books under the file lock. For the attached books, other
+        sessions' saves are merged first and only the records edited here are
+        pickled again; any other books replace the file's content.
+        """
+        if self._saving is not None:
+            try:
+                self.poll_background_save(wait=True) # Its outcome decides which records are still dirty
+            except BackgroundSaveError:
+                pass # Its records are dirty again: this save writes them
+        with FileLock(self.path + LOCK_SUFFIX):
+            tracked = self.tracks(*books)
+            if tracked:
+                self._merge_file()
+            self._rewrite(books, tracked)
+            for dirty in self._dirty.values():
+                dirty.clear()
+
+    def _merge_file(self):
+        try:
+            with open(self.path, "rb") as f:
+                self._merge(f)
+        except FileNotFoundError:
+            pass
+
+    def _rewrite(self, books, tracked: bool, durable: bool = False):
+        """Writes the next generation (under the lock): tracked books rewrite only their dirty shards."""
+        generation, previous = self._generation, {}
+        try:
+            with open(self.path, "rb") as f:
+                directory = _read_directory(f)
+            if directory is not None:
+                generation = max(generation, directory["generation"])
+                previous = directory.get("shards", {}) # Format 2 files have no shards to reuse
+        except FileNotFoundError:
+            pass
+        if generation == 0: # A new file: generations restart, so an old side file could look current
+            try:
+                os.remove(self.path + INDEX_SUFFIX)
+            except FileNotFoundError:
+                pass
+        self._write(books, generation + 1, previous if tracked else {}, previous, durable)
+
+    # --- Background saving ---
+    _in_flight: "DataFile | None" = None # The one DataFile of the process with a background save running
+
+    @staticmethod
+    def can_save_in_background() -> bool:
+        return fcntl is not None and hasattr(os, "fork")
+
+    @staticmethod
+    def background_save_in_flight() -> bool:
+        return DataFile._in_flight is not None
+
+    def save_in_background(self) -> bool:
+        """
+        Saves the attached books from a forked child. Returns False without
+        starting anything when a background save is already in flight (edits
+        made meanwhile stay dirty for the next one). Raises OSError when it
+        cannot fork, or must not because other threads are running.
+        """
+        if DataFile._in_flight is not None:
+            return False
+        if not parallel.fork_is_safe(): # The child could inherit a lock another thread holds
+            raise OSError("other threads are running, not forking")
+        lock = FileLock(self.path + LOCK_SUFFIX)
+        with lock:
+            self._merge_file()
+            read_fd, write_fd = os.pipe()
+            try:
+                pid = os.fork()
+            except OSError:
+                os.close(read_fd)
+                os.close(write_fd)
+                raise
+            if pid == 0: # Child: never returns
+                os.close(read_fd)
+                self._save_in_child(write_fd)
+            os.close(write_fd)
+            lock.hand_over() # The child unlocks by exiting
+        self._child, self._report_fd = pid, read_fd
+        self._saving = {kind: set(dirty) for kind, dirty in self._dirty.items()}
+        for dirty in self._dirty.values():
+            dirty.clear()
+        DataFile._in_flight = self
+        return True
+
+    def _save_in_child(self, report_fd: int):
+        gc.disable() # A collection would touch every object and un-share the copy-on-write pages
+        signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C at the parent's prompt must not cut the save short
+        status = 1
+        try:
+            try:
+                self._rewrite(self._books, True, durable=True)
+                report, status = ("ok", self._generation, self._counters, self._stat), 0
+            except BaseException as error:
+                report = ("error", f"{type(error).__name__}: {error}")
+            with os.fdopen(report_fd, "wb") as pipe:
+                pipe.write(pickle.dumps(report, PROTOCOL))
+        finally:
+            os._exit(status) # Skip the parent's atexit handlers and buffered output
+
+    def poll_background_save(self, wait: bool = False) -> bool:
+        """
+        Collects our background save: True once it finished (False while none
+        is in flight or it is still running). A failed save puts its records
+        back into the dirty sets and raises BackgroundSaveError.
+        """
+        if self._saving is None:
+            return False
+        pid, status = os.waitpid(self._child, 0 if wait else os.WNOHANG)
+        if pid == 0:
+            return False
+        with os.fdopen(self._report_fd, "rb") as pipe:
+            raw = pipe.read()
+        saving, self._saving, DataFile._in_flight = self._saving, None, None
+        report = pickle.loads(raw) if raw else ("error", f"child exited with status {status}")
+        if report[0] != "ok":
+            for kind, ids in saving.items():
+                self._dirty[kind] |= ids
+            raise BackgroundSaveError(report[1])
+        self._generation, self._counters, self._stat = report[1:]
+        return True
+
+    def _write(self, books, generation: int, reusable: dict[str, list[ShardRef]],
+               previous: dict[str, list[ShardRef]], durable: bool = False):
+        """
+        Writes the shards that changed, then replaces the manifest. reusable:
+        the current shards of the books that may be kept; previous: every shard
+        of the file being replaced (kept on disk for readers still using it).
+        """
+        os.makedirs(self.path + SHARD_SUFFIX, exist_ok=True)
+        shards, counters = {}, {}
+        for book in books:
+            kind = book.KIND
+            stored = getattr(book, kind)
+            if kind in reusable:
+                refs = self._write_dirty_shards(kind, stored, reusable[kind], self._dirty[kind], generation, durable)
+            else: # Nothing to reuse: every record is new in this generation
+                refs = self._write_all_shards(kind, stored, generation, durable)
+            shards[kind] = [tuple(ref) for ref in refs]
+            counters[kind] = book.RECORD.id_counter
+        table = pickle.dumps({"counters": counters, "shards": shards}, PROTOCOL)
+        directory, name = os.path.split(os.path.abspath(self.path))
+        if durable: # The new shard files must exist after a crash before a manifest names them
+            _fsync_directory(self.path + SHARD_SUFFIX)
+        fd, temp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory) # Unique: never shared with another writer
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, generation, HEADER.size, len(table)))
+                f.write(table)
+                if durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            _copy_mode(temp_path, self.path)
+            os.replace(temp_path, self.path) # Atomic: readers see the old or the new manifest, never a mix
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        if durable:
+            _fsync_directory(directory) # The rename itself survives a crash
+        self._generation, self._counters = generation, counters
+        with open(self.path, "rb") as f:
+            self._stat = self._fingerprint(f)
+        self._remove_unused_shards(shards, previous)
+
+    def _write_all_shards(self, kind: str, stored: list, generation: int, durable: bool) -> list[ShardRef]:
+        bounds = _shard_bounds(stored)
+        encoded = parallel.map_slices(stored, [(start, stop) for _, start, stop in bounds], _encode)
+        refs = []
+        for (number, start, stop), blobs in zip(bounds, encoded):
+            ids = array("q", map(_record_id, stored[start:stop]))
+            versions = array("q", [generation]) * len(blobs)
+            refs.append(self._write_shard(kind, number, generation, ids, versions, array("q", map(len, blobs)), blobs, durable))
+        return refs
+
+    def _write_dirty_shards(self, kind: str, stored: list, refs: list[ShardRef], dirty: set[int],
+                            generation: int, durable: bool) -> list[ShardRef]:
+        """The kind's shards with the dirty records spliced in: untouched shards are kept as they are."""
+        touched = {}
+        for record_id in dirty:
+            touched.setdefault(record_id // SHARD_IDS, set()).add(record_id)
+        by_number = {ref.number: ref for ref in refs}
+        written = []
+        for number in sorted(by_number.keys() | touched.keys()):
+            ref = by_number.get(number)
+            if number not in touched:
+                written.append(ref)
+                continue
+            if ref is None:
+                section, data = Section(0, array("q"), array("q"), array("q")), b""
+            else: # Under the lock: no save removes it meanwhile
+                with open(self._shard_path(ref.file), "rb") as f:
+                    section, data = self._read_shard(f)
+            with memoryview(data) as view:
+                ids, versions, sizes, blobs = self._splice(stored, section, view, touched[number], generation)
+                if ids: # A shard whose records were all deleted is dropped
+                    written.append(self._write_shard(kind, number, generation, ids, versions, sizes, blobs, durable))
+        return written
+
+    def _write_shard(self, kind: str, number: int, generation: int, ids: array, versions: array,
+                     sizes: array, blobs: list, durable: bool) -> ShardRef:
+        name = f"{kind}-{number:06d}-{generation}.bin" # Never reused: readers of older manifests keep their files
+        table = pickle.dumps((ids, versions, sizes), PROTOCOL)
+        with open(self._shard_path(name), "wb") as f:
+            f.write(SHARD_HEADER.pack(len(table)))
+            f.write(table)
+            f.writelines(blobs)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        return ShardRef(name, number, generation)
+
+    def _remove_unused_shards(self, shards: dict[str, list[tuple]], previous: dict[str, list[ShardRef]]):
+        keep = {ref[0] for refs in (*shards.values(), *previous.values()) for ref in refs}
+        for name in os.listdir(self.path + SHARD_SUFFIX):
+            if name not in keep:
+                try:
+                    os.remove(self._shard_path(name))
+                except OSError:
+                    pass # Removed by another session's save, or still open elsewhere: the next save retries
+
+    @staticmethod
+    def _splice(stored: list, section: Section, view: memoryview, dirty: set[int], generation: int) -> tuple:
+        """
+        New (ids, versions, sizes, blobs) of a section: the file's records with
+        the dirty ones re-pickled, inserted or dropped. Runs of untouched records
+        are copied as single byte ranges.
+        """
+        starts = _starts(section)
+        ids, versions, sizes, blobs = array("q"), array("q"), array("q"), []
+        copied = 0 # Old records before this position are already copied or replaced
+        for record_id in sorted(dirty):
+            position = bisect_left(section.ids, record_id)
+            if position > copied:
+                ids += section.ids[copied:position]
+                versions += section.versions[copied:position]
+                sizes += section.sizes[copied:position]
+                blobs.append(view[starts[copied]:starts[position]])
+            found = position < len(section.ids) and section.ids[position] == record_id
+            copied = max(copied, position + found)
+            index = bisect_left(stored, record_id, key=_record_id)
+            if index < len(stored) and stored[index].id == record_id: # Still here (not deleted)
+                blob = pickle.dumps(stored[index], PROTOCOL)
+                ids.append(record_id)
+                versions.append(generation)
+                sizes.append(len(blob))
+                blobs.append(blob)
+        if copied < len(section.ids):
+            ids += section.ids[copied:]
+            versions += section.versions[copied:]
+            sizes += section.sizes[copied:]
+            blobs.append(view[starts[copied]:starts[-1]])
+        return ids, versions, sizes, blobs
+
+# ================ Copies ================
+def copy_data_file(source: str, target: str):
+    """Copies a data file with its shards and index side file (under the source's lock, so the copy is consistent)."""
+    with FileLock(source + LOCK_SUFFIX):
+        shutil.copyfile(source, target)
+        if os.path.isdir(source + SHARD_SUFFIX):
+            shutil.copytree(source + SHARD_SUFFIX, target + SHARD_SUFFIX, dirs_exist_ok=True)
+        if os.path.exists(source + INDEX_SUFFIX):
+            shutil.copyfile(source + INDEX_SUFFIX, target + INDEX_SUFFIX)
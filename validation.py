@@ -0,0 +1,103 @@
+# Validation file
+# The field rules of contacts and notes in one place, shared by the model, the
+# controller and anything that imports records in bulk.
+#
+# The *_error functions check one value and return its error key (a
+# view.MESSAGES key) or None. The validate_* batch functions check a whole list
+# in one pass with precompiled patterns and one set for duplicates, and return
+# (accepted, rejected): rejected holds an (item, error key) pair per bad item.
+# Nothing is raised per item, so validating a large import allocates neither
+# exceptions nor throwaway records; the model turns keys into its exceptions.
+
+import re
+from datetime import date
+
+NAME_PATTERN  = re.compile(r"^[a-zA-Zа-яА-ЯіІїЇєЄґҐʼ'-]+( [a-zA-Zа-яА-ЯіІїЇєЄґҐʼ'-]+)*$")
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+TAG_PATTERN   = re.compile(r"^[a-zA-Z0-9_]+$") # Letters, digits and underscore
+PHONE_DIGITS  = 10
+MIN_TITLE_LEN = 2
+MAX_TITLE_LEN = 128
+MIN_TAG_LEN   = 2
+MAX_TAG_LEN   = 16
+MIN_BIRTH_YEAR = 1900
+
+# Message arguments of the error keys that need more than the item itself
+ERROR_KWARGS: dict[str, dict] = {
+    "invalid_title_length": {"min": MIN_TITLE_LEN, "max": MAX_TITLE_LEN},
+    "invalid_tag_length"  : {"min": MIN_TAG_LEN, "max": MAX_TAG_LEN},
+}
+
+# ================ Single Values ================
+def name_error(name: str) -> str | None:
+    return None if NAME_PATTERN.fullmatch(name) else "invalid_name_format"
+
+def phone_error(phone: str) -> str | None:
+    # isdecimal() accepts exactly the characters regex \d does, without running a pattern
+    return None if len(phone) == PHONE_DIGITS and phone.isdecimal() else "invalid_phone_format"
+
+def email_error(email: str) -> str | None:
+    return None if EMAIL_PATTERN.fullmatch(email.lower()) else "invalid_email_format"
+
+def title_error(title: str) -> str | None:
+    return None if MIN_TITLE_LEN <= len(title) <= MAX_TITLE_LEN else "invalid_title_length"
+
+def tag_error(tag: str) -> str | None:
+    """Error key of an already stripped tag."""
+    if not MIN_TAG_LEN <= len(tag) <= MAX_TAG_LEN:
+        return "invalid_tag_length"
+    return None if TAG_PATTERN.fullmatch(tag) else "invalid_tag_format"
+
+def birthday_error(birthday: date | None) -> str | None:
+    """Error key of a parsed birthday (None clears it, so it is valid)."""
+    if birthday is None:
+        return None
+    if not isinstance(birthday, date):
+        return "invalid_birthday_object"
+    return None if MIN_BIRTH_YEAR <= birthday.year and birthday <= date.today() else "invalid_birthday_range"
+
+# ================ Batches ================
+def validate_phones(phones, existing=()) -> tuple[list[str], list[tuple[str, str]]]:
+    """Phones in input order; repeats of `existing` or of an earlier item are duplicates."""
+    accepted, rejected, seen = [], [], set(existing)
+    for phone in phones:
+        if len(phone) != PHONE_DIGITS or not phone.isdecimal():
+            rejected.append((phone, "invalid_phone_format"))
+        elif phone in seen:
+            rejected.append((phone, "duplicate_phone"))
+        else:
+            seen.add(phone)
+            accepted.append(phone)
+    return accepted, rejected
+
+def validate_emails(emails, existing=()) -> tuple[list[str], list[tuple[str, str]]]:
+    """Emails as typed (original case); duplicates are found case-insensitively."""
+    accepted, rejected, seen = [], [], {email.lower() for email in existing}
+    fullmatch = EMAIL_PATTERN.fullmatch
+    for email in emails:
+        folded = email.lower()
+        if not fullmatch(folded):
+            rejected.append((email, "invalid_email_format"))
+        elif folded in seen:
+            rejected.append((email, "duplicate_email"))
+        else:
+            seen.add(folded)
+            accepted.append(email)
+    return accepted, rejected
+
+def validate_tags(tags, existing=()) -> tuple[list[str], list[tuple[str, str]]]:
+    """Tags stripped and lowercased (the stored form); rejected items are given as typed."""
+    accepted, rejected, seen = [], [], set(existing)
+    fullmatch = TAG_PATTERN.fullmatch
+    for tag in tags:
+        clean = tag.strip()
+        if not MIN_TAG_LEN <= len(clean) <= MAX_TAG_LEN:
+            rejected.append((tag, "invalid_tag_length"))
+        elif not fullmatch(clean):
+            rejected.append((tag, "invalid_tag_format"))
+        elif (folded := clean.lower()) in seen:
+            rejected.append((tag, "duplicate_tag_in_note"))
+        else:
+            seen.add(folded)
+            accepted.append(folded)
+    return accepted, rejected
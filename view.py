@@ -1,7 +1,7 @@
 # View file by MVC pattern
 # This file contains the view of the app
 
-from datetime import date
+from datetime import date, datetime
 
 # ================ ANSI Color Codes ================
 # (Can be expanded or made OS-dependent if needed)
@@ -32,12 +32,14 @@ MESSAGES: dict[str, str] = {
     "input_cancelled"          : f"{YELLOW}Input cancelled.{RESET}",
     "already_at_main_menu"     : f"{YELLOW}You are already at the main menu.{RESET}",
     "invalid_command_for_state": f"{RED}❌ Command not applicable in this context. Type 'help' or 'menu'.{RESET}",
+    "data_reloaded"            : f"{CYAN}🔄 Loaded {{count}} change(s) saved by another session.{RESET}",
 
     # --- Input Prompts (Keys used by Controller, value is the specific question/prompt part) ---
     "prompt_add_type"          : "Add 'contact' or 'note'?",
     "prompt_change_type"       : "Change 'contact' or 'note'?",
     "prompt_remove_type"       : "Remove 'contact' or 'note'?",
     "prompt_find_type"         : "Find 'contact' or 'note'?",
+    "prompt_search_term"       : "Search contacts and notes",
     "prompt_enter_name"        : "Enter contact name",
     "prompt_enter_phones"      : "Enter phone numbers (10 digits, space-separated)",
     "prompt_enter_emails"      : "Enter email addresses (space-separated)",
@@ -46,7 +48,9 @@ MESSAGES: dict[str, str] = {
     "prompt_enter_content"     : "Enter note content (press Enter twice to finish)", # Example for multiline
     "prompt_enter_tags"        : "Enter tags (space-separated, letters/numbers/_)",
     "prompt_enter_search_term" : "Enter search term",
+    "prompt_live_search_term"  : "Refine search (empty line to stop)",
     "prompt_enter_days"        : "Enter number of days for upcoming birthdays (1-365)",
+    "confirm_dedupe"           : "Apply {merges} merge(s), removing {contacts} duplicate contact(s)? (yes/no)",
     "prompt_select_index_to_change" : "Enter number of item to change",
     "prompt_select_index_to_remove" : "Enter number of item to remove",
     "prompt_what_to_change_contact" : "What to change? (name, phone, email, birthday, menu)", # Simplified
@@ -69,11 +73,13 @@ MESSAGES: dict[str, str] = {
     "email_changed"   : f"{GREEN}✅ Email changed to '{{email}}' for contact '{{name}}'.{RESET}",
     "email_removed"   : f"{GREEN}✅ Email removed from contact '{{name}}'.{RESET}",
     "birthday_set"    : f"{GREEN}✅ Birthday set to {{birthday}} for contact '{{name}}'.{RESET}",
+    "profile_switched": f"{GREEN}📂 Using profile '{{profile}}' ({{contacts}} contacts, {{notes}} notes).{RESET}",
     "birthday_removed": f"{GREEN}✅ Birthday removed for contact '{{name}}'.{RESET}",
     "title_changed"   : f"{GREEN}✅ Note title changed to '{{title}}'.{RESET}",
     "content_changed" : f"{GREEN}✅ Note content updated for '{{title}}'.{RESET}",
     "tag_added"       : f"{GREEN}✅ Tag '{{tag}}' added to note '{{title}}'.{RESET}",
     "tag_removed"     : f"{GREEN}✅ Tag '{{tag}}' removed from note '{{title}}'.{RESET}",
+    "contacts_merged" : f"{GREEN}🔗 Applied {{merges}} merge(s), {{contacts}} duplicate contact(s) removed.{RESET}",
 
     # --- Info/Title Messages ---
     "no_contacts_found"     : f"{YELLOW}📭 No contacts found.{RESET}",
@@ -85,12 +91,33 @@ MESSAGES: dict[str, str] = {
     "help_title"            : f"{BLUE}🔧 Available commands:{RESET}", # Changed key from help_intro
     "contacts_found_title"  : "Contacts found: {count}",
     "notes_found_title"     : "Notes found: {count}",
+    "live_results_title"    : "Matches: {count} (showing {shown})",
+    "search_results_title"  : "Results: {count} ({contacts} contacts, {notes} notes)",
+    "no_search_results"     : f"{YELLOW}📭 Nothing found in contacts or notes.{RESET}",
+    "profile_results_title" : f"{BLUE}📂 Profile '{{profile}}':{RESET}",
+    "profiles_title"        : f"{BLUE}📂 Profiles:{RESET}",
+    "profile_line"          : "  {marker} {name}{loaded}",
+    "profile_loaded_mark"   : f" {CYAN}(loaded){RESET}",
+    "mentions_title"        : "Notes mentioning {name}: {count}",
+    "recent_notes_title"    : "Most recent notes: {count}",
+    "notes_between_title"   : "Notes written or edited from {first} to {last}: {count}",
+    "no_duplicates"         : f"{YELLOW}📭 No duplicate contacts found.{RESET}",
+    "no_mergeable_duplicates": f"{YELLOW}📭 Nothing to merge automatically.{RESET}",
+    "merge_preview_title"   : f"{BLUE}🔗 Planned merges: {{count}}{RESET}",
+    "merge_preview_line"    : "{index}. Keep {cyan}{name}{reset} ← {others} ({phones} phone(s), {emails} email(s))",
+    "merge_preview_more"    : "... and {count} more merge(s).",
+    "merge_conflicts_title" : f"{YELLOW}⚠️ Not merged, their birthdays differ: {{count}} group(s){RESET}",
+    "merge_conflict_line"   : "{index}. {contacts}",
+    "merge_conflicts_more"  : "... and {count} more group(s).",
+    "domain_counts_title"   : f"{BLUE}📧 Email domains: {{count}}{RESET}",
+    "domain_counts_line"    : "{cyan}{domain}{reset}: {contacts} contact(s)",
 
     # --- Warning Messages ---
     "field_required"   : f"{YELLOW}⚠️ This field is required!{RESET}",
     "confirm_deletion" : f"{YELLOW}⚠️ Are you sure you want to delete this entry?{RESET}", # Maybe add item info
     "duplicate_entry"  : f"{YELLOW}⚠️ This entry already exists.{RESET}", # Generic, specific below
     "tags_already_exist": f"{YELLOW}⚠️ Tag(s) {{tags_repeat}} already exist in the note.{RESET}", # Example for tag warning
+    "ambiguous_contact" : "⚠️ {count} contacts match: enter the full name of one of them.",
 
     # --- Error Messages (using keys from Model Exceptions where possible) ---
     "not_found"                : f"{RED}❌ Entry not found.{RESET}", # Generic
@@ -108,6 +135,11 @@ MESSAGES: dict[str, str] = {
     "invalid_choice"           : f"{RED}❌ Invalid choice. Please try again.{RESET}",
     "invalid_yes_no"           : f"{RED}❌ Please enter 'yes' or 'no'.{RESET}",
     "invalid_type"             : f"{RED}❌ Invalid type. Enter 'contact' or 'note'.{RESET}",
+    "invalid_query_value"      : f"{RED}❌ Invalid search term '{{term}}'.{RESET}",
+    "invalid_regex"            : f"{RED}❌ Invalid pattern /{{pattern}}/: {{error}}.{RESET}",
+    "invalid_profile_name"     : f"{RED}❌ Invalid profile name '{{name}}'. Use 1-32 letters, digits, '_' or '-'.{RESET}",
+    "invalid_notes_query"      : f"{RED}❌ Invalid query. Enter 'notes for <contact name>' or 'notes between <DD.MM.YYYY> <DD.MM.YYYY>'.{RESET}",
+    "invalid_stats_type"       : f"{RED}❌ Invalid report. Enter 'stats' or 'stats memory'.{RESET}",
     "message_formatting_error" : f"{RED}❌ Error formatting message '{{key}}': Missing key {{error_key}}.{RESET}",
     "generic_formatting_error" : f"{RED}❌ Error formatting message '{{key}}': {{error}}{RESET}",
 
@@ -147,13 +179,43 @@ MESSAGES: dict[str, str] = {
     # --- Note Display ---
     "notes_list_title"      : f"{BLUE}📒 Notes List:{RESET}",
     "note_item_detailed"    : "{bold_index}. Title: {green_title}{reset}",
+    "note_times_detailed"   : "     Modified: {modified} (created {created})",
     "note_tags_detailed"    : "     Tags: {yellow_tags}{reset}",
     "note_content_detailed" : "     Content: {content_preview}",
 
+    # --- Unified Search Display ---
+    "search_hit_contact" : f"{{index}}. {CYAN}[contact]{RESET} {{name}} {{details}}",
+    "search_hit_note"    : f"{{index}}. {GREEN}[note]{RESET} {{title}} {{details}}",
+    "search_hit_field"   : f"{YELLOW}(matched {{field}}){RESET}",
+
     # --- Birthday Display ---
     "birthdays_found_title"         : f"{BLUE}🎉 Upcoming Birthdays:{RESET}",
     "birthday_celebration_adjusted" : "{name}'s birthday is on {bday} ({bday_weekday}), celebrating on {celeb_day} ({celeb_weekday}).",
     "birthday_celebration_on_day"   : "{name}'s birthday is on {bday} ({bday_weekday}).",
+
+    # --- Stats Report ---
+    "stats_tags_title"    : f"{BLUE}🏷️ Tags: {{count}} across {{notes}} notes{RESET}",
+    "stats_no_tags"       : "No tagged notes yet.",
+    "stats_more_tags"     : "... and {count} more tag(s).",
+    "stats_months_title"  : f"{BLUE}🎂 Contacts per birth month ({{contacts}} contacts):{RESET}",
+    "stats_missing_title" : f"{BLUE}📋 Incomplete contacts:{RESET}",
+    "stats_missing_line"  : "Without {field}: {count}",
+
+    # --- Memory Report ---
+    "memory_report_title"     : f"{BLUE}🧠 Memory footprint per component:{RESET}",
+    "memory_report_total"     : "Total: {total} ({contacts} contacts, {notes} notes)",
+    "memory_report_per_item"  : "Per contact: {per_contact}, per note: {per_note}; 1M more contacts ≈ {million_contacts}",
+    "memory_tracing_title"    : f"{BLUE}🔬 tracemalloc:{RESET}",
+    "memory_tracing_current"  : "Traced now: {current}, peak: {peak}",
+    "memory_tracing_operation": "{name}: last peak {last}, max peak {max} above memory in use",
+    "memory_tracing_off"      : f"{YELLOW}Start with --trace-memory to see load/save peaks.{RESET}",
+
+    # --- Profiling Report ---
+    "profile_report_title"    : f"{BLUE}⏱️ Command latency (ms, wall excludes input wait):{RESET}",
+    "profile_no_commands"     : f"{YELLOW}⏱️ No commands were profiled.{RESET}",
+    "profile_report_saved"    : f"{GREEN}💾 Profiling report saved to {{path}}.{RESET}",
+    "profile_slowest_title"   : f"{BLUE}🐢 cProfile stats of the slowest commands:{RESET}",
+    "profile_slowest_item"    : "{rank}. {label} ({wall:.3f} ms): {path}",
 }
 
 # ================ Display Functions ================
@@ -261,8 +323,8 @@ def display_contacts(contacts: list, show_indices: bool = True):
 
     # print(SEPARATOR_LINE) # Removed bottom line, separator is between items now
 
-def display_notes(notes: list, show_indices: bool = True):
-    """Displays a list of notes with optional 1-based indexing."""
+def display_notes(notes: list, show_indices: bool = True, show_times: bool = False):
+    """Displays a list of notes with optional 1-based indexing (and their modification times)."""
     if not notes:
         display_info("no_notes_found")
         return
@@ -273,13 +335,15 @@ def display_notes(notes: list, show_indices: bool = True):
         idx_str = f"{BOLD}{index}{RESET}. " if show_indices else ""
         # Correctly pass kwargs for formatting
         print(_get_message("note_item_detailed", bold_index=idx_str.strip(), green_title=f"{GREEN}{note.title}{RESET}", reset=RESET))
+        if show_times:
+            print(_get_message("note_times_detailed", modified=format_time(note.modified), created=format_time(note.created)))
 
         if note.tags:
             tags_str = " ".join([f"#{tag}" for tag in note.tags])
             # Pass tags_str as a kwarg, ensure color is applied
             print(_get_message("note_tags_detailed", yellow_tags=f"{YELLOW}{tags_str}{RESET}", reset=RESET))
-        if note.content:
-            content_preview = note.content[:100].replace('\n', '\n' + ' ' * 5) + ('...' if len(note.content) > 100 else '')
+        if note.content_length: # The stored preview: listing never decompresses a note body
+            content_preview = note.preview[:100].replace('\n', '\n' + ' ' * 5) + ('...' if note.content_length > 100 else '')
             # Pass content_preview as a kwarg
             print(_get_message("note_content_detailed", content_preview=content_preview))
 
@@ -287,6 +351,67 @@ def display_notes(notes: list, show_indices: bool = True):
 
     # print(SEPARATOR_LINE) # Removed bottom line
 
+def display_search_results(hits: list):
+    """Displays the ranked hits of the unified search, one type-tagged line each."""
+    if not hits:
+        display_info("no_search_results")
+        return
+
+    contacts = sum(1 for hit in hits if hit.kind == "contact")
+    display_info("search_results_title", count=len(hits), contacts=contacts, notes=len(hits) - contacts)
+    print(SEPARATOR_LINE)
+    for index, hit in enumerate(hits, start=1):
+        matched = _get_message("search_hit_field", field=hit.field)
+        if hit.kind == "contact":
+            details = ", ".join(hit.item.phones[:2] + hit.item.emails[:1])
+            print(_get_message("search_hit_contact", index=index, name=hit.item.name,
+                               details=f"{details} {matched}" if details else matched))
+        else:
+            tags = " ".join(f"#{tag}" for tag in hit.item.tags)
+            print(_get_message("search_hit_note", index=index, title=hit.item.title,
+                               details=f"{tags} {matched}" if tags else matched))
+    print(SEPARATOR_LINE)
+
+def display_merge_preview(merges: list, limit: int):
+    """Lists the first `limit` planned dedupe merges: the kept contact and the ones merged into it."""
+    display_info("merge_preview_title", count=len(merges))
+    print(SEPARATOR_LINE)
+    for index, merge in enumerate(merges[:limit], start=1):
+        print(_get_message("merge_preview_line", index=index, name=merge.keep.name,
+                           others=", ".join(contact.name for contact in merge.drop),
+                           phones=len(merge.phones), emails=len(merge.emails)))
+    if len(merges) > limit:
+        print(_get_message("merge_preview_more", count=len(merges) - limit))
+    print(SEPARATOR_LINE)
+
+def display_merge_conflicts(conflicts: list, limit: int):
+    """Lists the first `limit` duplicate groups that dedupe leaves alone because their birthdays differ."""
+    display_warning("merge_conflicts_title", count=len(conflicts))
+    print(SEPARATOR_LINE)
+    for index, cluster in enumerate(conflicts[:limit], start=1):
+        contacts = ", ".join(f"{CYAN}{contact.name}{RESET} ({contact.birthday.strftime('%d.%m.%Y') if contact.birthday else '-'})"
+                             for contact in cluster)
+        print(_get_message("merge_conflict_line", index=index, contacts=contacts))
+    if len(conflicts) > limit:
+        print(_get_message("merge_conflicts_more", count=len(conflicts) - limit))
+    print(SEPARATOR_LINE)
+
+def display_domain_counts(counts: dict[str, int]):
+    """Lists the email domains of a '@domain' search with their contact counts."""
+    if not counts:
+        return # display_contacts reports the empty result
+    display_info("domain_counts_title", count=len(counts))
+    for domain, contacts in counts.items():
+        print(_get_message("domain_counts_line", domain=domain, contacts=contacts))
+    print(SEPARATOR_LINE)
+
+def display_profiles(names: list[str], current: str, loaded: list[str]):
+    """Lists the profiles: the current one is marked, loaded ones are flagged."""
+    display_info("profiles_title")
+    for name in names if current in names else [*names, current]: # A new profile has no file yet
+        print(_get_message("profile_line", marker="*" if name == current else " ", name=name,
+                           loaded=MESSAGES["profile_loaded_mark"] if name in loaded else ""))
+
 def display_birthdays(birthday_results: list[tuple]): # Type hint fixed
     """Displays upcoming birthdays with celebration dates."""
     if not birthday_results:
@@ -367,6 +492,97 @@ def display_help(command_map: dict | None = None): # command structure as an arg
     print(SEPARATOR_LINE)
 
 
+def format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%d.%m.%Y %H:%M")
+
+def format_bytes(size: float) -> str:
+    """Formats a byte count with a binary unit (e.g. '1.5 MiB')."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def _bar(count: int, largest: int, width: int = 30) -> str:
+    return "█" * max(round(width * count / largest), 1 if count else 0) if largest else ""
+
+def display_data_stats(contact_stats: dict, note_stats: dict, tag_limit: int = 20):
+    """Displays the tag cloud (top tag_limit tags), contacts per birth month and missing contact fields."""
+    tags = note_stats["tags"]
+    display_info("stats_tags_title", count=len(tags), notes=note_stats["notes"])
+    print(SEPARATOR_LINE)
+    if not tags:
+        print(_get_message("stats_no_tags"))
+    top = list(tags.items())[:tag_limit]
+    width = max((len(tag) for tag, _ in top), default=0)
+    for tag, count in top:
+        print(f"  {CYAN}{tag:<{width}}{RESET} {count:>7} {_bar(count, top[0][1])}")
+    if len(tags) > tag_limit:
+        print(_get_message("stats_more_tags", count=len(tags) - tag_limit))
+
+    months = contact_stats["birth_months"]
+    display_info("stats_months_title", contacts=contact_stats["contacts"])
+    print(SEPARATOR_LINE)
+    largest = max(months.values(), default=0)
+    for month, count in months.items():
+        print(f"  {date(2000, month, 1).strftime('%b')} {count:>7} {_bar(count, largest)}")
+
+    display_info("stats_missing_title")
+    print(SEPARATOR_LINE)
+    for field, count in contact_stats["missing"].items():
+        print("  " + _get_message("stats_missing_line", field=field, count=count))
+    print(SEPARATOR_LINE)
+
+def display_memory_report(footprint: dict, tracing: dict | None = None):
+    """Displays the per-component memory footprint and, if available, tracemalloc peaks."""
+    display_info("memory_report_title")
+    print(SEPARATOR_LINE)
+    width = max(len(name) for name in footprint["components"])
+    for name, size in footprint["components"].items():
+        print(f"  {CYAN}{name:<{width}}{RESET} {format_bytes(size):>12}")
+    print(SEPARATOR_LINE)
+    print(_get_message("memory_report_total", total=format_bytes(footprint["total"]),
+                       contacts=footprint["contacts"], notes=footprint["notes"]))
+    print(_get_message("memory_report_per_item",
+                       per_contact=format_bytes(footprint["bytes_per_contact"]),
+                       per_note=format_bytes(footprint["bytes_per_note"]),
+                       million_contacts=format_bytes(footprint["bytes_per_contact"] * 1_000_000)))
+
+    if tracing is None:
+        print(_get_message("memory_tracing_off"))
+        return
+    display_info("memory_tracing_title")
+    print(_get_message("memory_tracing_current", current=format_bytes(tracing["current"]),
+                       peak=format_bytes(tracing["peak"])))
+    for name, values in tracing["operations"].items():
+        print("  " + _get_message("memory_tracing_operation", name=name,
+                                  last=format_bytes(values["last"]), max=format_bytes(values["max"])))
+
+def display_profile_report(report: dict):
+    """Displays p50/p95/p99 latencies per command and time category."""
+    if not report:
+        display_info("profile_no_commands")
+        return
+
+    display_info("profile_report_title")
+    categories = [key for key in next(iter(report.values())) if key != "count"]
+    label_width = max(len("command"), *(len(label) for label in report))
+    header = f"  {'command':<{label_width}} {'count':>6}" + "".join(f" {c + ' p50/p95/p99':>26}" for c in categories)
+    print(SEPARATOR_LINE)
+    print(f"{BOLD}{header}{RESET}")
+    for label, row in report.items():
+        cells = "".join(f" {row[c]['p50']:>8.3f}/{row[c]['p95']:>8.3f}/{row[c]['p99']:>8.3f}" for c in categories)
+        print(f"  {CYAN}{label:<{label_width}}{RESET} {row['count']:>6}{cells}")
+    print(SEPARATOR_LINE)
+
+def display_slowest_profiles(rows: list[tuple[str, float, str]]):
+    """Lists the .prof files written for the slowest commands."""
+    if not rows:
+        return
+    display_info("profile_slowest_title")
+    for rank, (label, wall, path) in enumerate(rows, start=1):
+        print(f"  {_get_message('profile_slowest_item', rank=rank, label=label, wall=wall, path=path)}")
+
+
 # ================ Input Functions ================
 
 def get_input(prompt_key: str, path_info: str = "", **prompt_kwargs) -> str: